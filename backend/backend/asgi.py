@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Живая лента результатов (courses.live) держит SSE-потоки без отдельного
+# потока на каждый только здесь; её можно обслуживать отдельным процессом
+# uvicorn, направив на него .../results/stream/
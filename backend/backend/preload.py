@@ -0,0 +1,74 @@
+"""
+Подготовка процесса к первому запросу.
+
+Всё, что Django и DRF иначе делают лениво на первых запросах каждого
+воркера и что потом общее для всех запросов: импорт модулей приложений,
+вьюх и сериализаторов, заполнение URL-резолвера, кэши _meta моделей (поля,
+обратные связи), импорт классов из настроек DRF и хэшеров паролей.
+
+Поля сериализаторов не строятся: DRF строит их заново для каждого
+экземпляра.
+
+Вызывается из backend.wsgi, так что при запуске с предзагрузкой (gunicorn
+--preload backend.wsgi) работа выполняется один раз в мастере, а воркеры
+получают её готовой после fork.
+
+Соединения с БД, открытые при подготовке, закрываются: после fork их нельзя
+делить между процессами.
+"""
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.db import connections
+from django.urls import get_resolver
+from django.utils.module_loading import module_has_submodule
+from rest_framework.settings import api_settings
+
+
+def _populate_urls():
+    # Импортирует urlconf со всеми вьюхами, заполняет reverse_dict и
+    # компилирует регулярные выражения маршрутов, включая вложенные include()
+    get_resolver().reverse_dict
+
+
+def _import_serializers():
+    for config in apps.get_app_configs():
+        # Только свои приложения: сторонние импортирует сам DRF
+        if config.path.startswith(str(settings.BASE_DIR)) and module_has_submodule(config.module, 'serializers'):
+            import_module(config.name + '.serializers')
+
+
+def _warm_models():
+    # Кэши Options живут в классе модели: список полей с обратными связями
+    # (дерево связей строится обходом всех моделей) и карта имён для get_field
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.fields_map
+
+
+def _load_drf_settings():
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+                 'EXCEPTION_HANDLER'):
+        getattr(api_settings, name)
+
+
+def _load_hashers():
+    get_hashers()
+
+
+def preload():
+    """
+    Возвращает {шаг: секунды}.
+    """
+    timings = {}
+    for name, step in (('urls', _populate_urls), ('serializers', _import_serializers), ('models', _warm_models),
+                       ('drf settings', _load_drf_settings), ('hashers', _load_hashers)):
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    connections.close_all()
+    return timings
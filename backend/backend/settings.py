@@ -56,6 +56,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.throttling.RateLimitHeadersMiddleware',
+    'users.hashing.HashingBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -111,6 +113,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хэширование паролей (users.hashing). Стоимость PBKDF2 задаётся числом
+# итераций; пароли со старым значением перехэшируются при следующем входе.
+PASSWORD_HASHERS = [
+    'users.hashing.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = 1_000_000
+
+# Хэшер считает PBKDF2 в пуле процессов (вход, регистрация, смена пароля):
+# не больше WORKERS + QUEUE операций одновременно, остальные сразу получают
+# 503 с Retry-After. WORKERS = 0 - хэширование прямо в запросе.
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 32
+PASSWORD_HASHING_TIMEOUT = 10
+PASSWORD_HASHING_RETRY_AFTER = 2
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -134,6 +155,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset']
 
 # Django REST Framework
 REST_FRAMEWORK = {
@@ -143,6 +165,30 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'users.throttling.RoleRateThrottle',
+    ],
+    # HashingBusy из хэшера паролей -> 503 с Retry-After
+    'EXCEPTION_HANDLER': 'users.hashing.exception_handler',
+}
+
+# Ограничение частоты запросов (users.throttling): бюджеты по группам
+# маршрутов и ролям. Нет бюджета - нет ограничения (например, у admin).
+# Счётчики хранятся в памяти процесса; при нескольких воркерах общий бюджет
+# даёт 'users.throttling.CacheStore' с кэшем THROTTLE_CACHE.
+THROTTLE_STORE = 'users.throttling.LocalStore'
+THROTTLE_CACHE = 'default'
+THROTTLE_ROUTE_GROUPS = {
+    'auth': ['user-login', 'user-register', 'change-password'],
+    'submit': ['submit-test-result', 'test-attempt-start', 'test-attempt-finish'],
+    'results': ['get-test-results', 'stream-test-results', 'export-test-results'],
+}
+ROLE_THROTTLE_RATES = {
+    'read': {'anon': '120/m', 'student': '600/m', 'teacher': '1200/m'},
+    'write': {'anon': '30/m', 'student': '120/m', 'teacher': '300/m'},
+    'auth': {'anon': '60/m', 'student': '10/m', 'teacher': '10/m', 'admin': '10/m'},
+    'submit': {'student': '20/m', 'teacher': '60/m'},
+    'results': {'student': '30/m', 'teacher': '120/m'},
 }
 
 # JWT Settings
@@ -177,3 +223,59 @@ AUTH_USER_MODEL = 'users.User'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Кэш. Автосохранение попыток тестов (courses.attempts) и кэш ответов
+# (courses.payloads) рассчитаны на общий для всех воркеров бэкенд, например
+# 'django.core.cache.backends.redis.RedisCache' с LOCATION 'redis://...'.
+# С LocMemCache кэш ответов выключен (см. PAYLOAD_CACHE_ALLOW_LOCAL), а
+# автосохранения сразу пишутся в базу.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Попытки тестов: как часто сбрасывать ответы из кэша в БД и сколько секунд
+# после истечения времени ещё принимать ответы
+TEST_ATTEMPT_FLUSH_INTERVAL = 30
+TEST_ATTEMPT_GRACE_SECONDS = 30
+
+# Живая лента результатов тестов: брокер событий (для нескольких воркеров на
+# PostgreSQL - courses.live.PostgresBackend) и длительность одного SSE-потока.
+# Долгие потоки работают только под ASGI (uvicorn backend.asgi:application),
+# под WSGI лента отдаёт снимок и клиент переподключается.
+TEST_RESULTS_FEED_BACKEND = 'courses.live.LocalBackend'
+TEST_RESULTS_FEED_SECONDS = 300
+
+# Результаты теста с ?until= без ?since= отдаются только за столько дней до until
+TEST_RESULTS_WINDOW_DAYS = 365
+
+# Как часто процесс перечитывает таблицы лидеров, изменённые другими воркерами
+LEADERBOARD_CACHE_SECONDS = 60
+
+# Кэш ответов курсов, уроков и тестов (courses.payloads). Адрес нужен команде
+# warm_cache, чтобы URL файлов в заранее построенных ответах совпадали с
+# ответами на реальные запросы. С PAYLOAD_WARMUP_ON_MIGRATE кэш прогревается
+# после migrate (удобно как шаг деплоя). PAYLOAD_CACHE_ALLOW_LOCAL включает кэш
+# ответов и с LocMemCache - только для одного процесса (runserver).
+PAYLOAD_CACHE_SECONDS = 600
+PAYLOAD_CACHE_ALLOW_LOCAL = False
+PAYLOAD_CACHE_BASE_URL = 'http://localhost:8000'
+PAYLOAD_WARMUP_ON_MIGRATE = False
+PAYLOAD_WARMUP_WORKERS = 4
+
+# Хранилища. Видео уроков и секций хранятся по хэшу содержимого
+# (courses.storage): одинаковые файлы лежат один раз, а их URL неизменяемы,
+# так что /media/videos/ можно отдавать с Cache-Control: immutable.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'videos': {
+        'BACKEND': 'courses.storage.ContentAddressedStorage',
+        'OPTIONS': {'directory': 'videos'},
+    },
+}
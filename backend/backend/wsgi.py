@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Готовим процесс к первому запросу. С gunicorn --preload это происходит
+# один раз в мастере до fork воркеров
+from backend.preload import preload  # noqa: E402
+
+preload()
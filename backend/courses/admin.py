@@ -1,3 +1,271 @@
+"""
+Админка курсов, тестов и результатов, рассчитанная на большие таблицы.
+
+- Число строк списка оценивается планировщиком (EstimatedCountPaginator),
+  а "всего N" без фильтров не считается (show_full_result_count).
+- Связанные объекты из __str__ и list_display читаются одним JOIN
+  (list_select_related), а внешние ключи в формах - поля raw_id, а не
+  выпадающие списки на всю таблицу.
+- Поиск идёт по индексам: число ищется точным совпадением по id и
+  внешним ключам (id_search_fields), текст - по полям из exact_search_fields,
+  началу длинных текстов (prefix_search_fields) или search_fields. Индексы
+  под поиск без учёта регистра - в миграции 0014_admin_search_indexes.
+- Вопросы теста и ответы вопроса редактируются inline и сохраняются
+  bulk-операциями (BulkInlineMixin).
+"""
 from django.contrib import admin
+from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Left, Upper
+from django.forms import Textarea
+
+from . import attempts, counters, media, payloads, rendering
+from .models import (
+    Answer, Course, Enrollment, LeaderboardEntry, Lesson, MediaBlob, Question, ReviewItem, Section, Test,
+    TestAttempt, TestResult,
+)
+from .paginators import EstimatedCountPaginator
+
+
+def _any_of(fields, value):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{field: value})
+    return condition
+
+
+# Сколько первых символов prefix_search_fields покрывает индекс
+SEARCH_PREFIX_LENGTH = 100
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    # Числовой запрос ищется точным совпадением по этим полям
+    id_search_fields = ('id',)
+    # Если заданы, текстовый запрос ищется точным совпадением по ним, а не через search_fields
+    exact_search_fields = ()
+    # Длинные тексты: запрос ищется по началу без учёта регистра через
+    # выражение UPPER(LEFT(поле, SEARCH_PREFIX_LENGTH)), по которому есть индекс
+    prefix_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.isdigit():
+            return queryset.filter(_any_of(self.id_search_fields, int(term))), False
+        if term and self.exact_search_fields:
+            return queryset.filter(_any_of(self.exact_search_fields, term)), False
+        if term and self.prefix_search_fields:
+            return self._prefix_search(queryset, term), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def _prefix_search(self, queryset, term):
+        condition = Q()
+        for field in self.prefix_search_fields:
+            alias = '{}_search_prefix'.format(field)
+            queryset = queryset.alias(**{alias: Upper(Left(field, SEARCH_PREFIX_LENGTH))})
+            prefix = Q(**{alias + '__startswith': term[:SEARCH_PREFIX_LENGTH].upper()})
+            if len(term) > SEARCH_PREFIX_LENGTH:
+                prefix &= Q(**{field + '__istartswith': term})
+            condition |= prefix
+        return queryset.filter(condition)
+
+
+class BulkInlineMixin:
+    """
+    Сохраняет inline-формсеты одним bulk_create для новых строк, одним
+    bulk_update для изменённых и одним DELETE для удалённых. bulk_create и
+    bulk_update не посылают сигналов: HTML секций и ссылки на видео
+    обновляются здесь же, а счётчики, кэш ответов и списки вопросов попыток -
+    в bulk_saved().
+    """
+
+    def save_formset(self, request, form, formset, change):
+        model = formset.model
+        with counters.deferred():
+            formset.save(commit=False)
+            if formset.deleted_objects:
+                model.objects.filter(pk__in=[obj.pk for obj in formset.deleted_objects]).delete()
+            if formset.new_objects:
+                _prepare(model, formset.new_objects)
+                model.objects.bulk_create(formset.new_objects)
+            changed = [obj for obj, _ in formset.changed_objects]
+            if changed:
+                fields = _prepare(model, changed, {name for _, names in formset.changed_objects for name in names})
+                model.objects.bulk_update(changed, sorted(fields))
+            if model in media.MODELS:
+                media.bulk_saved(formset.new_objects,
+                                 [obj for obj, names in formset.changed_objects if 'video' in names])
+            self.bulk_saved(form.instance, formset)
+
+    def bulk_saved(self, parent, formset):
+        pass
+
+
+def _prepare(model, objects, fields=None):
+    """
+    То, что при save() делают pre_save-обработчики: HTML секций, а для
+    bulk_update (fields - изменённые поля) ещё и запись загруженных файлов,
+    bulk_create её делает сам. Возвращает поля для bulk_update.
+    """
+    creating = fields is None
+    fields = set(fields or ())
+    if model is Section and (creating or 'content' in fields):
+        for obj in objects:
+            rendering.apply(obj)
+        fields |= {'content_html', 'content_hash'}
+    if not creating:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and field.name in fields:
+                for obj in objects:
+                    field.pre_save(obj, add=False)
+    return fields
+
+
+class QuestionInline(admin.TabularInline):
+    model = Question
+    fields = ('text',)
+    extra = 0
+    show_change_link = True
+    formfield_overrides = {models.TextField: {'widget': Textarea(attrs={'rows': 2, 'cols': 80})}}
+
+
+class SectionInline(admin.StackedInline):
+    model = Section
+    fields = ('title', 'order', 'content', 'video')
+    extra = 0
+    show_change_link = True
+
+
+class AnswerInline(admin.TabularInline):
+    model = Answer
+    fields = ('text', 'is_correct')
+    extra = 2
+
+
+@admin.register(Course)
+class CourseAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'author', 'lessons_count', 'tests_count', 'created_at')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
+    search_fields = ('^title',)
+    id_search_fields = ('id', 'author_id')
+    readonly_fields = ('lessons_count', 'tests_count', 'created_at', 'updated_at')
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'course', 'created_at')
+    list_select_related = ('user', 'course')
+    raw_id_fields = ('user', 'course')
+    search_fields = ('user__username',)
+    id_search_fields = ('id', 'user_id', 'course_id')
+    exact_search_fields = ('user__username',)
+
+
+@admin.register(Lesson)
+class LessonAdmin(BulkInlineMixin, LargeTableAdmin):
+    list_display = ('id', 'title', 'course', 'order', 'sections_count', 'tests_count')
+    list_select_related = ('course',)
+    raw_id_fields = ('course',)
+    search_fields = ('^title',)
+    id_search_fields = ('id', 'course_id')
+    readonly_fields = ('sections_count', 'tests_count', 'created_at', 'updated_at')
+    inlines = [SectionInline]
+
+    def bulk_saved(self, parent, formset):
+        counters.adjust(Lesson, parent.pk, 'sections_count', len(formset.new_objects))
+        payloads.invalidate(course_id=parent.course_id)
+
+
+@admin.register(Section)
+class SectionAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'lesson', 'order')
+    list_select_related = ('lesson',)
+    raw_id_fields = ('lesson',)
+    search_fields = ('^title',)
+    id_search_fields = ('id', 'lesson_id')
+
+
+@admin.register(Test)
+class TestAdmin(BulkInlineMixin, LargeTableAdmin):
+    list_display = ('id', 'title', 'course', 'lesson', 'time_limit', 'questions_count', 'results_count')
+    list_select_related = ('course', 'lesson')
+    raw_id_fields = ('course', 'lesson')
+    search_fields = ('^title',)
+    id_search_fields = ('id', 'course_id', 'lesson_id')
+    readonly_fields = ('questions_count', 'results_count')
+    inlines = [QuestionInline]
+
+    def bulk_saved(self, parent, formset):
+        counters.adjust(Test, parent.pk, 'questions_count', len(formset.new_objects))
+        payloads.invalidate(test_id=parent.pk)
+        attempts.invalidate_questions([parent.pk])
+
+
+@admin.register(Question)
+class QuestionAdmin(BulkInlineMixin, LargeTableAdmin):
+    list_display = ('id', '__str__', 'test')
+    list_select_related = ('test',)
+    raw_id_fields = ('test',)
+    search_fields = ('^text',)
+    prefix_search_fields = ('text',)
+    id_search_fields = ('id', 'test_id')
+    inlines = [AnswerInline]
+
+    def bulk_saved(self, parent, formset):
+        payloads.invalidate(test_id=parent.test_id)
+
+
+@admin.register(TestResult)
+class TestResultAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'test', 'score', 'created_at')
+    list_select_related = ('user', 'test')
+    raw_id_fields = ('user', 'test')
+    # Фильтр по дате ограничивает created_at, и PostgreSQL читает только нужные секции
+    list_filter = (('created_at', admin.DateFieldListFilter),)
+    search_fields = ('user__username',)
+    search_help_text = 'id результата, пользователя или теста, либо точное имя пользователя'
+    id_search_fields = ('id', 'user_id', 'test_id')
+    exact_search_fields = ('user__username',)
+    ordering = ('-id',)
+
+
+@admin.register(TestAttempt)
+class TestAttemptAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'test', 'started_at', 'expires_at', 'finished_at', 'result_id')
+    list_select_related = ('user', 'test')
+    raw_id_fields = ('user', 'test')
+    search_fields = ('user__username',)
+    id_search_fields = ('id', 'user_id', 'test_id')
+    exact_search_fields = ('user__username',)
+    ordering = ('-id',)
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'course', 'test', 'score', 'achieved_at')
+    list_select_related = ('user', 'course', 'test')
+    raw_id_fields = ('user', 'course', 'test')
+    search_fields = ('user__username',)
+    id_search_fields = ('id', 'user_id', 'course_id', 'test_id')
+    exact_search_fields = ('user__username',)
+
+
+@admin.register(ReviewItem)
+class ReviewItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'question', 'due_at', 'interval', 'repetitions', 'lapses')
+    list_select_related = ('user', 'question')
+    raw_id_fields = ('user', 'question')
+    search_fields = ('user__username',)
+    id_search_fields = ('id', 'user_id', 'question_id')
+    exact_search_fields = ('user__username',)
+
 
-# Register your models here.
+@admin.register(MediaBlob)
+class MediaBlobAdmin(LargeTableAdmin):
+    list_display = ('name', 'refcount', 'updated_at')
+    search_fields = ('^name',)
+    # Счётчики ссылок ведёт courses.media
+    readonly_fields = ('name', 'refcount', 'updated_at')
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate, pre_migrate
+        from . import checks  # noqa: F401
+        from . import attempts, counters, leaderboard, live, media, payloads, rendering, reviews, search
+        attempts.connect()
+        counters.connect()
+        leaderboard.connect()
+        live.connect()
+        media.connect()
+        payloads.connect()
+        rendering.connect()
+        reviews.connect()
+        pre_migrate.connect(search.drop_search_triggers, sender=self)
+        post_migrate.connect(search.restore_search_index, sender=self)
+        post_migrate.connect(payloads.warm_after_migrate, sender=self)
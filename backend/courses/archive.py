@@ -0,0 +1,312 @@
+"""
+Экспорт и импорт курса в потоковом архиве.
+
+Архив - это tar, в котором первым идёт manifest.jsonl (по одной JSON-записи
+на строку: course, lesson, section, test, question, answer), а за ним
+необязательные медиафайлы media/<имя в хранилище>. Экспорт отдаёт архив
+кусками и никогда не держит файлы в памяти целиком; импорт читает tar
+последовательно и вставляет записи пачками через bulk_create.
+
+Имя видео в манифесте при импорте - только ссылка на медиафайл того же
+архива: видео остаётся у урока или секции, лишь если в архиве есть файл
+media/<это имя>, и получает имя, под которым файл сохранило хранилище (по
+хэшу содержимого). Чужие файлы хранилища архив так задеть не может.
+"""
+import json
+import tarfile
+import tempfile
+import time
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Case, CharField, Q, Value, When
+
+from . import counters, media, rendering
+from .storage import video_storage
+from .models import Course, Lesson, Section, Test, Question, Answer
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.jsonl'
+MEDIA_PREFIX = 'media/'
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+# Манифест держим в памяти, пока он меньше этого размера, дальше - на диске
+MANIFEST_SPOOL_SIZE = 4 * 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+# --- Экспорт ---
+
+def _manifest_records(course):
+    yield {'type': 'archive', 'version': ARCHIVE_VERSION}
+    yield {'type': 'course', 'title': course.title, 'description': course.description}
+    lessons = Lesson.objects.filter(course=course).order_by('order', 'id')
+    for row in lessons.values('id', 'title', 'description', 'video', 'order').iterator(chunk_size=BATCH_SIZE):
+        yield {'type': 'lesson', **row}
+    sections = Section.objects.filter(lesson__course=course).order_by('id')
+    for row in sections.values('id', 'lesson', 'title', 'content', 'video', 'order').iterator(chunk_size=BATCH_SIZE):
+        yield {'type': 'section', **row}
+    tests = Test.objects.filter(Q(lesson__course=course) | Q(course=course)).order_by('id')
+    for row in tests.values('id', 'lesson', 'course', 'title', 'description', 'time_limit').iterator(chunk_size=BATCH_SIZE):
+        row['final'] = row.pop('course') is not None
+        yield {'type': 'test', **row}
+    questions = Question.objects.filter(Q(test__lesson__course=course) | Q(test__course=course)).order_by('id')
+    for row in questions.values('id', 'test', 'text').iterator(chunk_size=BATCH_SIZE):
+        yield {'type': 'question', **row}
+    answers = Answer.objects.filter(
+        Q(question__test__lesson__course=course) | Q(question__test__course=course)).order_by('id')
+    for row in answers.values('question', 'text', 'is_correct').iterator(chunk_size=BATCH_SIZE):
+        yield {'type': 'answer', **row}
+
+
+def _media_names(course):
+    names = set(Lesson.objects.filter(course=course).exclude(video='').exclude(video=None)
+                .values_list('video', flat=True))
+    names.update(Section.objects.filter(lesson__course=course).exclude(video='').exclude(video=None)
+                 .values_list('video', flat=True))
+    return sorted(names)
+
+
+def _tar_member(name, size, chunks):
+    # Пишем заголовок и данные tar-записи сами, чтобы отдавать файл кусками,
+    # а не копировать его целиком в буфер, как делает tarfile.addfile.
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    written = 0
+    for chunk in chunks:
+        written += len(chunk)
+        yield chunk
+    if written != size:
+        raise ArchiveError('{} changed while exporting'.format(name))
+    remainder = size % tarfile.BLOCKSIZE
+    if remainder:
+        yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+
+def _file_chunks(fileobj):
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def export_course(course, include_media=False):
+    """
+    Генератор байтовых кусков tar-архива курса. Подходит для
+    StreamingHttpResponse и для записи в файл.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_SIZE) as manifest:
+        for record in _manifest_records(course):
+            manifest.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+            manifest.write(b'\n')
+        size = manifest.tell()
+        manifest.seek(0)
+        yield from _tar_member(MANIFEST_NAME, size, _file_chunks(manifest))
+
+    if include_media:
+        storage = video_storage()
+        for name in _media_names(course):
+            if not storage.exists(name):
+                continue
+            with storage.open(name, 'rb') as media_file:
+                yield from _tar_member(MEDIA_PREFIX + name, storage.size(name), _file_chunks(media_file))
+
+    # Конец архива - два пустых блока
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+# --- Импорт ---
+
+class _Importer:
+    def __init__(self, author, title=None):
+        self.author = author
+        self.title = title
+        self.course = None
+        self.lesson_ids = {}
+        self.test_ids = {}
+        self.question_ids = {}
+        # Имена видео из манифеста и {имя в архиве: сохранённое имя}
+        self.videos = set()
+        self.media = {}
+        self.pending = []
+        self.pending_type = None
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind == 'archive':
+            if record.get('version') != ARCHIVE_VERSION:
+                raise ArchiveError('Unsupported archive version: {}'.format(record.get('version')))
+            return
+        if kind == 'course':
+            if self.course is not None:
+                raise ArchiveError('Archive contains more than one course')
+            self.course = Course.objects.create(
+                title=self.title or record['title'],
+                description=record.get('description', ''),
+                author=self.author,
+            )
+            return
+        if self.course is None:
+            raise ArchiveError('Course record must precede {} records'.format(kind))
+        if kind not in self.builders:
+            raise ArchiveError('Unknown record type: {}'.format(kind))
+        if kind != self.pending_type:
+            self.flush()
+            self.pending_type = kind
+        self.pending.append(record)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        records, self.pending = self.pending, []
+        self.builders[self.pending_type](self, records)
+
+    def _ref(self, mapping, record, key):
+        try:
+            return mapping[record[key]]
+        except KeyError:
+            raise ArchiveError('{} {} references unknown {} {}'.format(
+                record['type'], record.get('id', ''), key, record.get(key)))
+
+    def _video(self, record):
+        name = record.get('video') or None
+        if name:
+            self.videos.add(name)
+        return name
+
+    def _lessons(self, records):
+        created = Lesson.objects.bulk_create([
+            Lesson(course=self.course, title=r['title'], description=r.get('description', ''),
+                   video=self._video(r), order=r.get('order', 0))
+            for r in records
+        ])
+        self.lesson_ids.update((r['id'], obj.id) for r, obj in zip(records, created))
+
+    def _sections(self, records):
+        sections = [
+            Section(lesson_id=self._ref(self.lesson_ids, r, 'lesson'), title=r['title'],
+                    content=r.get('content', ''), video=self._video(r), order=r.get('order', 0))
+            for r in records
+        ]
+        # bulk_create минует pre_save, поэтому HTML рисуется здесь
+        for section in sections:
+            rendering.apply(section)
+        Section.objects.bulk_create(sections)
+
+    def _tests(self, records):
+        created = Test.objects.bulk_create([
+            Test(lesson_id=self._ref(self.lesson_ids, r, 'lesson') if r.get('lesson') else None,
+                 course=self.course if r.get('final') else None,
+                 title=r['title'], description=r.get('description', ''), time_limit=r.get('time_limit'))
+            for r in records
+        ])
+        self.test_ids.update((r['id'], obj.id) for r, obj in zip(records, created))
+
+    def _questions(self, records):
+        created = Question.objects.bulk_create([
+            Question(test_id=self._ref(self.test_ids, r, 'test'), text=r['text'])
+            for r in records
+        ])
+        self.question_ids.update((r['id'], obj.id) for r, obj in zip(records, created))
+
+    def _answers(self, records):
+        Answer.objects.bulk_create([
+            Answer(question_id=self._ref(self.question_ids, r, 'question'), text=r['text'],
+                   is_correct=bool(r.get('is_correct')))
+            for r in records
+        ])
+
+    builders = {
+        'lesson': _lessons,
+        'section': _sections,
+        'test': _tests,
+        'question': _questions,
+        'answer': _answers,
+    }
+
+    def add_media(self, name, fileobj):
+        """
+        Сохраняет медиафайл, на который ссылается манифест. Возвращает
+        сохранённое имя или None, если файл пропущен.
+        """
+        if name not in self.videos or name in self.media:
+            return None
+        self.media[name] = video_storage().save(name, File(fileobj, name=name))
+        return self.media[name]
+
+    def link_media(self):
+        # Одним UPDATE на таблицу: замены не накладываются друг на друга, а
+        # видео без файла в архиве сбрасываются
+        video = Case(*[When(video=name, then=Value(saved)) for name, saved in self.media.items()],
+                     default=Value(None), output_field=CharField())
+        Lesson.objects.filter(course=self.course).exclude(video=None).update(video=video)
+        Section.objects.filter(lesson__course=self.course).exclude(video=None).update(video=video)
+
+
+def import_course(fileobj, author, title=None):
+    """
+    Читает архив из fileobj (tar, можно сжатый) и создаёт новый курс.
+    Вся работа с БД идёт в одной транзакции; при ошибке уже сохранённые
+    медиафайлы удаляются.
+    """
+    saved_media = []
+    try:
+        with transaction.atomic(), tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            importer = _Importer(author, title=title)
+            manifest_seen = False
+            for member in archive:
+                if not member.isfile():
+                    continue
+                if member.name == MANIFEST_NAME:
+                    # В потоковом режиме tarfile не умеет seekable(), поэтому
+                    # читаем байтовые строки и декодируем их сами
+                    for line_number, line in enumerate(archive.extractfile(member), start=1):
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line.decode('utf-8'))
+                        except ValueError:
+                            raise ArchiveError('Invalid JSON on manifest line {}'.format(line_number))
+                        importer.add(record)
+                    importer.flush()
+                    manifest_seen = True
+                elif member.name.startswith(MEDIA_PREFIX):
+                    if not manifest_seen:
+                        raise ArchiveError('{} must precede media files'.format(MANIFEST_NAME))
+                    name = member.name[len(MEDIA_PREFIX):]
+                    if not name or name.startswith('/') or '..' in name.split('/'):
+                        raise ArchiveError('Unsafe media path: {}'.format(member.name))
+                    saved = importer.add_media(name, archive.extractfile(member))
+                    if saved:
+                        saved_media.append(saved)
+            if importer.course is None:
+                raise ArchiveError('Archive has no course record')
+            importer.link_media()
+            counters.recount_course(importer.course)
+            media.retain_course(importer.course)
+            importer.course.refresh_from_db()
+            return importer.course
+    except tarfile.TarError as exc:
+        _delete_media(saved_media)
+        raise ArchiveError('Invalid archive: {}'.format(exc))
+    except KeyError as exc:
+        _delete_media(saved_media)
+        raise ArchiveError('Manifest record is missing field {}'.format(exc))
+    except Exception:
+        _delete_media(saved_media)
+        raise
+
+
+def _delete_media(names):
+    # Хранилище удалит файл, только если на него нет других ссылок
+    storage = video_storage()
+    for name in names:
+        storage.delete(name)
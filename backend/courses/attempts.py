@@ -0,0 +1,199 @@
+"""
+Серверные попытки прохождения теста с автосохранением ответов.
+
+С общим кэшем (Redis, Memcached) каждое автосохранение пишется только в
+кэш (по ключу на вопрос, чтобы параллельные сохранения разных вопросов не
+затирали друг друга). В базу ответы сбрасываются одним UPDATE не чаще, чем
+раз в TEST_ATTEMPT_FLUSH_INTERVAL секунд, и обязательно при завершении
+попытки. С LocMemCache буфер виден только своему воркеру, поэтому каждый
+ответ сразу пишется в базу под блокировкой строки попытки.
+
+Список вопросов теста кэшируется в общем кэше и сбрасывается при сохранении
+и удалении вопросов (сигналы и question_bank). С LocMemCache сброс не дошёл
+бы до других воркеров, поэтому список каждый раз читается из базы.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .exports import correct_answers_by_question, grade_answers
+from .models import Question, TestAttempt, TestResult, rows_deleted
+from .payloads import is_local
+
+FLUSH_INTERVAL = getattr(settings, 'TEST_ATTEMPT_FLUSH_INTERVAL', 30)
+# Сколько секунд после expires_at ещё принимаются ответы (задержки сети)
+GRACE_SECONDS = getattr(settings, 'TEST_ATTEMPT_GRACE_SECONDS', 30)
+# Время жизни ключей попытки в кэше
+CACHE_TIMEOUT = getattr(settings, 'TEST_ATTEMPT_CACHE_TIMEOUT', 24 * 60 * 60)
+QUESTIONS_CACHE_TIMEOUT = 5 * 60
+
+
+class AttemptError(Exception):
+    pass
+
+
+def _answer_key(attempt_id, question_id):
+    return 'test-attempt:{}:q:{}'.format(attempt_id, question_id)
+
+
+def _flushed_key(attempt_id):
+    return 'test-attempt:{}:flushed'.format(attempt_id)
+
+
+def _questions_key(test_id):
+    return 'test-questions:{}'.format(test_id)
+
+
+def question_ids(test_id):
+    if is_local():
+        return list(Question.objects.filter(test_id=test_id).values_list('id', flat=True))
+    key = _questions_key(test_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Question.objects.filter(test_id=test_id).values_list('id', flat=True))
+        cache.set(key, ids, QUESTIONS_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_questions(test_ids):
+    """
+    Сбрасывает закэшированные списки вопросов тестов после коммита.
+    """
+    keys = [_questions_key(test_id) for test_id in set(test_ids) if test_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _on_question_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_questions([instance.test_id])
+
+
+def _on_rows_deleted(sender, rows, **kwargs):
+    if sender is Question:
+        invalidate_questions([row['test_id'] for row in rows])
+
+
+def connect():
+    post_save.connect(_on_question_save, sender=Question, dispatch_uid='attempts-question-save')
+    rows_deleted.connect(_on_rows_deleted, dispatch_uid='attempts-rows-deleted')
+
+
+def start_attempt(user, test):
+    """
+    Возвращает (attempt, created): незавершённую и не истёкшую попытку
+    пользователя по тесту или новую.
+    """
+    now = timezone.now()
+    active = (
+        TestAttempt.objects.filter(user=user, test=test, finished_at__isnull=True)
+        .order_by('-started_at').first()
+    )
+    if active is not None and (active.expires_at is None or active.expires_at > now):
+        return active, False
+    expires_at = now + timedelta(minutes=test.time_limit) if test.time_limit else None
+    return TestAttempt.objects.create(user=user, test=test, expires_at=expires_at), True
+
+
+def _check_open(attempt):
+    if attempt.finished_at is not None:
+        raise AttemptError('Attempt is already finished')
+    if attempt.expires_at is not None and timezone.now() > attempt.expires_at + timedelta(seconds=GRACE_SECONDS):
+        raise AttemptError('Attempt time is over')
+
+
+def current_answers(attempt):
+    """
+    Ответы попытки: сохранённые в базе, поверх них - более свежие из кэша.
+    """
+    answers = dict(attempt.answers or {})
+    if is_local():
+        return answers
+    ids = question_ids(attempt.test_id)
+    cached = cache.get_many([_answer_key(attempt.id, question_id) for question_id in ids])
+    for question_id in ids:
+        value = cached.get(_answer_key(attempt.id, question_id))
+        if value is not None:
+            answers[str(question_id)] = value
+    return answers
+
+
+def flush(attempt):
+    answers = current_answers(attempt)
+    now = timezone.now()
+    TestAttempt.objects.filter(pk=attempt.pk).update(answers=answers, saved_at=now)
+    attempt.answers = answers
+    attempt.saved_at = now
+    cache.set(_flushed_key(attempt.id), time.time(), CACHE_TIMEOUT)
+
+
+def save_answer(attempt, question_id, answer_ids):
+    """
+    Автосохранение ответа на вопрос. Возвращает True, если при этом
+    накопленные ответы были сброшены в базу.
+    """
+    _check_open(attempt)
+    if question_id not in question_ids(attempt.test_id):
+        raise AttemptError('Question {} does not belong to this test'.format(question_id))
+    if not isinstance(answer_ids, list):
+        raise AttemptError('answers must be a list of answer ids')
+    try:
+        answer_ids = [int(answer_id) for answer_id in answer_ids]
+    except (TypeError, ValueError):
+        raise AttemptError('answers must be a list of answer ids')
+    if is_local():
+        _write_through(attempt, question_id, answer_ids)
+        return True
+    cache.set(_answer_key(attempt.id, question_id), answer_ids, CACHE_TIMEOUT)
+
+    # Сбрасываем в базу только если с прошлого сброса прошло FLUSH_INTERVAL;
+    # cache.add атомарно пропускает ровно один запрос на интервал.
+    last_flush = cache.get(_flushed_key(attempt.id))
+    if last_flush is not None and time.time() - last_flush < FLUSH_INTERVAL:
+        return False
+    if not cache.add('test-attempt:{}:flush-lock'.format(attempt.id), 1, FLUSH_INTERVAL):
+        return False
+    flush(attempt)
+    return True
+
+
+def _write_through(attempt, question_id, answer_ids):
+    with transaction.atomic():
+        locked = TestAttempt.objects.select_for_update().only('answers', 'finished_at').get(pk=attempt.pk)
+        if locked.finished_at is not None:
+            raise AttemptError('Attempt is already finished')
+        answers = dict(locked.answers or {})
+        answers[str(question_id)] = answer_ids
+        now = timezone.now()
+        TestAttempt.objects.filter(pk=attempt.pk).update(answers=answers, saved_at=now)
+    attempt.answers = answers
+    attempt.saved_at = now
+
+
+def finish_attempt(attempt):
+    """
+    Завершает попытку: считает score по сохранённым ответам и создаёт TestResult.
+    """
+    with transaction.atomic():
+        attempt = TestAttempt.objects.select_for_update().get(pk=attempt.pk)
+        _check_open(attempt)
+        answers = current_answers(attempt)
+        graded = grade_answers(correct_answers_by_question(attempt.test_id), answers)
+        result = TestResult.objects.create(
+            user_id=attempt.user_id,
+            test_id=attempt.test_id,
+            score=sum(graded.values()),
+            answers=answers,
+        )
+        attempt.answers = answers
+        attempt.finished_at = attempt.saved_at = timezone.now()
+        attempt.result_id = result.id
+        attempt.save(update_fields=['answers', 'finished_at', 'saved_at', 'result_id'])
+    keys = [_answer_key(attempt.id, question_id) for question_id in question_ids(attempt.test_id)]
+    cache.delete_many(keys + [_flushed_key(attempt.id), 'test-attempt:{}:flush-lock'.format(attempt.id)])
+    return attempt, result
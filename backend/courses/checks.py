@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from . import payloads
+
+
+@register(Tags.caches)
+def check_payload_cache(app_configs, **kwargs):
+    if payloads.is_local() and getattr(settings, 'PAYLOAD_CACHE_ALLOW_LOCAL', False):
+        return [Warning(
+            'PAYLOAD_CACHE_ALLOW_LOCAL is set with a local-memory cache.',
+            hint='Each worker keeps its own payload versions and serves stale courses and tests after edits '
+                 'made in another worker. Use a shared cache backend or run a single process.',
+            id='courses.W001',
+        )]
+    return []
@@ -0,0 +1,75 @@
+"""
+Глубокое копирование курса со всеми уроками, секциями, тестами, вопросами и ответами.
+
+Каждая таблица копируется через bulk_create пачками по BATCH_SIZE строк,
+так что число INSERT-ов на таблицу определяется числом пачек, а не объектов.
+Видео не дублируются: новые записи ссылаются на те же файлы.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters, media
+from .models import Course, Lesson, Section, Test, Question, Answer
+
+BATCH_SIZE = 500
+
+
+def _bulk_copy(model, objects):
+    return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def copy_course(course, author=None, title=None):
+    """
+    Копирует course целиком в одной транзакции и возвращает новый курс.
+    """
+    with transaction.atomic():
+        new_course = Course.objects.create(
+            title=title or course.title,
+            description=course.description,
+            author=author or course.author,
+        )
+
+        lessons = list(Lesson.objects.filter(course=course).order_by('order', 'id'))
+        new_lessons = _bulk_copy(Lesson, [
+            Lesson(course=new_course, title=lesson.title, description=lesson.description,
+                   video=lesson.video.name or None, order=lesson.order)
+            for lesson in lessons
+        ])
+        lesson_ids = {old.id: new.id for old, new in zip(lessons, new_lessons)}
+
+        sections = Section.objects.filter(lesson__course=course).order_by('id')
+        _bulk_copy(Section, [
+            Section(lesson_id=lesson_ids[section.lesson_id], title=section.title, content=section.content,
+                    content_html=section.content_html, content_hash=section.content_hash,
+                    video=section.video.name or None, order=section.order)
+            for section in sections.iterator(chunk_size=BATCH_SIZE)
+        ])
+
+        tests = list(Test.objects.filter(Q(lesson__course=course) | Q(course=course)).order_by('id'))
+        new_tests = _bulk_copy(Test, [
+            Test(lesson_id=lesson_ids.get(test.lesson_id), course=new_course if test.course_id else None,
+                 title=test.title, description=test.description, time_limit=test.time_limit)
+            for test in tests
+        ])
+        test_ids = {old.id: new.id for old, new in zip(tests, new_tests)}
+
+        questions = list(Question.objects.filter(
+            Q(test__lesson__course=course) | Q(test__course=course)).order_by('id'))
+        new_questions = _bulk_copy(Question, [
+            Question(test_id=test_ids[question.test_id], text=question.text)
+            for question in questions
+        ])
+        question_ids = {old.id: new.id for old, new in zip(questions, new_questions)}
+
+        answers = Answer.objects.filter(
+            Q(question__test__lesson__course=course) | Q(question__test__course=course)).order_by('id')
+        _bulk_copy(Answer, [
+            Answer(question_id=question_ids[answer.question_id], text=answer.text, is_correct=answer.is_correct)
+            for answer in answers.iterator(chunk_size=BATCH_SIZE)
+        ])
+        # bulk_create не посылает сигналы, поэтому счётчики считаем разом
+        counters.recount_course(new_course)
+        # Видео общие с исходным курсом: bulk_create не шлёт сигналов, ссылки добавляем сами
+        media.retain_course(new_course)
+        new_course.refresh_from_db()
+    return new_course
@@ -0,0 +1,185 @@
+"""
+Денормализованные счётчики на Course, Lesson и Test.
+
+Каждый счётчик живёт у непосредственного родителя:
+    Course.lessons_count   - уроки курса
+    Course.tests_count     - итоговые тесты курса
+    Lesson.sections_count  - секции урока
+    Lesson.tests_count     - тесты урока
+    Test.questions_count   - вопросы теста
+    Test.results_count     - попытки (TestResult)
+
+При создании и удалении объектов счётчики меняются атомарно через F().
+Внутри deferred() изменения копятся и применяются одним UPDATE на объект при
+выходе, что важно для каскадных и массовых удалений. bulk_create сигналов не
+посылает, поэтому такие места вызывают recount_course() или adjust() сами.
+
+Секции, вопросы и результаты удаляются без post_delete (см. rows_deleted в
+courses.models), чтобы каскадное удаление курса или теста шло одним DELETE.
+После их удаления счётчик пересчитывается у родителей удалённых строк.
+Результаты удаляемого пользователя уходят каскадом мимо rows_deleted, а их
+тесты остаются, поэтому тесты запоминаются в pre_delete пользователя и
+пересчитываются в post_delete.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from users.models import User
+
+from . import payloads
+from .models import Course, Lesson, Section, Test, Question, TestResult, rows_deleted
+
+_state = threading.local()
+
+
+def adjust(model, pk, field, delta):
+    if pk is None or not delta:
+        return
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending[(model, pk, field)] += delta
+        return
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def _flush(pending):
+    updates = defaultdict(dict)
+    for (model, pk, field), delta in pending.items():
+        if delta:
+            updates[(model, pk)][field] = F(field) + delta
+    for (model, pk), fields in updates.items():
+        model.objects.filter(pk=pk).update(**fields)
+
+
+@contextmanager
+def deferred():
+    """
+    Копит изменения счётчиков и применяет их при выходе из блока.
+    Вызывать внутри transaction.atomic(), чтобы UPDATE попали в ту же транзакцию.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = Counter()
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    _flush(pending)
+
+
+def _test_parent(test):
+    if test.lesson_id:
+        return Lesson, test.lesson_id
+    return Course, test.course_id
+
+
+def _on_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _track(instance, +1)
+
+
+def _on_delete(sender, instance, **kwargs):
+    _track(instance, -1)
+
+
+def _track(instance, delta):
+    if isinstance(instance, Lesson):
+        adjust(Course, instance.course_id, 'lessons_count', delta)
+    elif isinstance(instance, Section):
+        adjust(Lesson, instance.lesson_id, 'sections_count', delta)
+    elif isinstance(instance, Test):
+        model, pk = _test_parent(instance)
+        adjust(model, pk, 'tests_count', delta)
+    elif isinstance(instance, Question):
+        adjust(Test, instance.test_id, 'questions_count', delta)
+    elif isinstance(instance, TestResult):
+        adjust(Test, instance.test_id, 'results_count', delta)
+
+
+# Модели без post_delete: (родитель, поле связи, счётчик родителя)
+CHILDREN = {
+    Section: (Lesson, 'lesson_id', 'sections_count'),
+    Question: (Test, 'test_id', 'questions_count'),
+    TestResult: (Test, 'test_id', 'results_count'),
+}
+
+
+def _on_rows_deleted(sender, rows, **kwargs):
+    if sender not in CHILDREN:
+        return
+    field = CHILDREN[sender][1]
+    _recount_parents(sender, {row[field] for row in rows} - {None})
+
+
+def _recount_parents(child, ids):
+    parent, field, counter = CHILDREN[child]
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        # Пересчёт даёт точное значение, накопленные изменения уже в нём
+        for pk in ids:
+            pending.pop((parent, pk, counter), None)
+    if ids:
+        parent.objects.filter(pk__in=ids).update(**{counter: _count(child.objects.all(), field[:-len('_id')])})
+
+
+def _on_user_pre_delete(sender, instance, **kwargs):
+    instance._counter_test_ids = set(
+        TestResult.objects.filter(user=instance).order_by().values_list('test_id', flat=True).distinct()
+    )
+
+
+def _on_user_delete(sender, instance, **kwargs):
+    _recount_parents(TestResult, getattr(instance, '_counter_test_ids', set()))
+
+
+def connect():
+    for model in (Lesson, Section, Test, Question, TestResult):
+        post_save.connect(_on_save, sender=model, dispatch_uid='counters-save-{}'.format(model.__name__))
+    for model in (Lesson, Test):
+        post_delete.connect(_on_delete, sender=model, dispatch_uid='counters-delete-{}'.format(model.__name__))
+    rows_deleted.connect(_on_rows_deleted, dispatch_uid='counters-rows-deleted')
+    pre_delete.connect(_on_user_pre_delete, sender=User, dispatch_uid='counters-user-pre-delete')
+    post_delete.connect(_on_user_delete, sender=User, dispatch_uid='counters-user-delete')
+
+
+def _count(queryset, parent_field):
+    subquery = queryset.filter(**{parent_field: OuterRef('pk')}).order_by().values(parent_field) \
+        .annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def recount(courses=None):
+    """
+    Пересчитывает все счётчики одним UPDATE на таблицу. courses - queryset
+    курсов, которыми ограничить пересчёт (по умолчанию все).
+    """
+    if courses is None:
+        courses = Course.objects.all()
+    course_ids = courses.values('pk')
+    courses.update(
+        lessons_count=_count(Lesson.objects.all(), 'course'),
+        tests_count=_count(Test.objects.all(), 'course'),
+    )
+    Lesson.objects.filter(course__in=course_ids).update(
+        sections_count=_count(Section.objects.all(), 'lesson'),
+        tests_count=_count(Test.objects.all(), 'lesson'),
+    )
+    tests = Test.objects.filter(Q(course__in=course_ids) | Q(lesson__course__in=course_ids))
+    tests.update(
+        questions_count=_count(Question.objects.all(), 'test'),
+        results_count=_count(TestResult.objects.all(), 'test'),
+    )
+    # Счётчики входят в кэшированные ответы, а update() сигналов не посылает
+    payloads.invalidate_many(course_ids=course_ids.values_list('pk', flat=True),
+                             test_ids=tests.values_list('pk', flat=True))
+
+
+def recount_course(course):
+    recount(Course.objects.filter(pk=course.pk))
@@ -0,0 +1,57 @@
+"""
+Данные для блока "Мои курсы": записи пользователя на курсы вместе с числом
+уроков, числом пройденных уроков и последним результатом теста.
+
+Всё считается фиксированным числом запросов (два) независимо от числа
+курсов в каталоге и числа записей пользователя; число уроков берётся
+из счётчика Course.lessons_count.
+"""
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from .models import Enrollment, Lesson, TestResult
+
+
+def _completed_lesson_ids(user):
+    progress = user.progress if isinstance(user.progress, dict) else {}
+    ids = []
+    for lesson_id in progress.get('completedLessons') or []:
+        try:
+            ids.append(int(lesson_id))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def dashboard_entries(user):
+    """
+    Список Enrollment пользователя с атрибутами lessons_count,
+    completed_lessons, last_test_id, last_score и last_result_at.
+    """
+    last_result = (
+        TestResult.objects.filter(user=user)
+        .filter(Q(test__course=OuterRef('course_id')) | Q(test__lesson__course=OuterRef('course_id')))
+        .order_by('-created_at', '-id')
+    )
+    entries = list(
+        Enrollment.objects.filter(user=user)
+        .select_related('course')
+        .annotate(
+            lessons_count=F('course__lessons_count'),
+            last_test_id=Subquery(last_result.values('test_id')[:1]),
+            last_score=Subquery(last_result.values('score')[:1]),
+            last_result_at=Subquery(last_result.values('created_at')[:1]),
+        )
+        .order_by('-created_at')
+    )
+
+    completed = {}
+    completed_ids = _completed_lesson_ids(user)
+    if entries and completed_ids:
+        rows = (
+            Lesson.objects.filter(id__in=completed_ids, course_id__in=[entry.course_id for entry in entries])
+            .order_by().values('course_id').annotate(total=Count('id'))
+        )
+        completed = {row['course_id']: row['total'] for row in rows}
+    for entry in entries:
+        entry.completed_lessons = completed.get(entry.course_id, 0)
+    return entries
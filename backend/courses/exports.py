@@ -0,0 +1,100 @@
+"""
+Потоковая выгрузка результатов тестов в CSV и JSONL.
+
+Строки читаются через iterator(chunk_size=...) (на PostgreSQL это серверный
+курсор) и сразу отдаются наружу, поэтому память не растёт с числом результатов.
+"""
+import csv
+import json
+
+from .models import Answer, TestResult
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+BASE_COLUMNS = ['id', 'user_id', 'username', 'score', 'created_at']
+
+
+def correct_answers_by_question(test_id):
+    """
+    {question_id: множество id правильных ответов} для всех вопросов теста.
+    """
+    correct = {}
+    rows = Answer.objects.filter(question__test_id=test_id).values_list('question_id', 'id', 'is_correct')
+    for question_id, answer_id, is_correct in rows:
+        answers = correct.setdefault(question_id, set())
+        if is_correct:
+            answers.add(answer_id)
+    return correct
+
+
+def grade_answers(correct, answers):
+    """
+    Проверяет ответы студента так же, как фронтенд при подсчёте score:
+    вопрос засчитан, если выбран ровно набор правильных ответов.
+    answers - JSON из TestResult ({"<question_id>": [answer_id, ...]}).
+    Возвращает {question_id: bool}.
+    """
+    answers = answers if isinstance(answers, dict) else {}
+    graded = {}
+    for question_id, correct_ids in correct.items():
+        selected = answers.get(str(question_id), answers.get(question_id)) or []
+        try:
+            selected = {int(answer_id) for answer_id in selected}
+        except (TypeError, ValueError):
+            selected = set()
+        graded[question_id] = selected == correct_ids
+    return graded
+
+
+def result_rows(test_id, correct=None):
+    """
+    Генератор словарей с результатами теста в порядке сдачи.
+    Если передан correct (см. correct_answers_by_question), добавляется
+    ключ correct: {question_id: bool}; иначе answers даже не читаются из БД.
+    """
+    details = correct is not None
+    fields = ['id', 'user_id', 'user__username', 'score', 'created_at']
+    if details:
+        fields.append('answers')
+    results = TestResult.objects.filter(test_id=test_id).order_by('created_at', 'id').values(*fields)
+    for row in results.iterator(chunk_size=CHUNK_SIZE):
+        item = {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'score': row['score'],
+            'created_at': row['created_at'].isoformat(),
+        }
+        if details:
+            item['correct'] = grade_answers(correct, row['answers'])
+        yield item
+
+
+class _Echo:
+    # csv.writer пишет в объект с методом write; нам нужна строка, а не файл
+    def write(self, value):
+        return value
+
+
+def stream_csv(test_id, details=False):
+    writer = csv.writer(_Echo())
+    correct = correct_answers_by_question(test_id) if details else None
+    question_ids = sorted(correct) if details else []
+    yield writer.writerow(BASE_COLUMNS + ['q{}'.format(question_id) for question_id in question_ids])
+    for row in result_rows(test_id, correct=correct):
+        values = [row[column] for column in BASE_COLUMNS]
+        if details:
+            values += [int(row['correct'].get(question_id, False)) for question_id in question_ids]
+        yield writer.writerow(values)
+
+
+def stream_jsonl(test_id, details=False):
+    correct = correct_answers_by_question(test_id) if details else None
+    for row in result_rows(test_id, correct=correct):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_results(test_id, output='csv', details=False):
+    if output == 'jsonl':
+        return stream_jsonl(test_id, details=details)
+    return stream_csv(test_id, details=details)
@@ -0,0 +1,56 @@
+"""
+Параметры ?fields= и ?expand= для сериализаторов курсов.
+
+?fields=id,title      - вернуть только перечисленные поля верхнего уровня;
+?expand=sections,...  - раскрыть перечисленные вложенные связи. Если expand
+                        не передан, связи раскрываются как раньше.
+
+Нераскрытая связь "к одному" (select) отдаётся как id, "ко многим"
+(prefetch) не отдаётся вовсе. Под выбранные поля подстраивается и queryset:
+only() для колонок и select_related/prefetch_related только для раскрытых связей.
+Всё это действует только на чтение (безопасные методы).
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _param(request, name):
+    params = getattr(request, 'query_params', None)
+    if params is None:
+        params = request.GET
+    value = params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def requested(request):
+    """
+    (fields, expand) из запроса; None означает "параметр не передан".
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    return _param(request, 'fields'), _param(request, 'expand')
+
+
+def is_expanded(name, expand):
+    return expand is None or name in expand
+
+
+def sparse_queryset(queryset, serializer_class, request):
+    fields, expand = requested(request)
+    if request is None or request.method not in SAFE_METHODS:
+        return queryset
+    for name, (kind, lookup) in getattr(serializer_class, 'expandable_fields', {}).items():
+        if fields is not None and name not in fields:
+            continue
+        if not is_expanded(name, expand):
+            continue
+        if kind == 'select':
+            queryset = queryset.select_related(lookup)
+        else:
+            queryset = queryset.prefetch_related(lookup)
+    if fields is not None:
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = (fields & concrete) | {queryset.model._meta.pk.name}
+        queryset = queryset.only(*columns)
+    return queryset
@@ -0,0 +1,253 @@
+"""
+Таблицы лидеров по курсу и по тесту.
+
+Постоянное хранилище - LeaderboardEntry: лучший балл пользователя по каждому
+тесту и сумма этих баллов по курсу. Строки обновляются при сохранении
+TestResult (только если балл улучшился), поэтому просмотр рейтинга не
+сканирует результаты.
+
+Для чтения в каждом процессе держится SortedList ключей
+(-score, achieved_at, user_id): место пользователя и замена его ключа
+стоят O(log n), top N - срез списка. Свои записи процесс применяет к списку
+сразу, чужие (другие воркеры) подхватываются перечитыванием таблицы раз в
+LEADERBOARD_CACHE_SECONDS. У каждой таблицы своя блокировка, и таблица
+читается из БД под ней, а не под общей: пока перечитывается большой курс,
+остальные рейтинги отвечают. Удаление результатов рейтинг не уменьшает -
+для этого есть команда rebuild_leaderboards.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from sortedcontainers import SortedList
+
+from .models import LeaderboardEntry, Test, TestResult
+
+CACHE_SECONDS = getattr(settings, 'LEADERBOARD_CACHE_SECONDS', 60)
+# Сколько таблиц держать в памяти процесса
+MAX_BOARDS = 256
+BATCH_SIZE = 1000
+
+
+class Ranking:
+    """
+    Отсортированные ключи (-score, achieved_at, user_id) одной таблицы лидеров.
+    """
+
+    def __init__(self, rows=()):
+        self._by_user = {}
+        for user_id, score, achieved_at in rows:
+            self._by_user[user_id] = (-score, achieved_at.timestamp(), user_id)
+        self._keys = SortedList(self._by_user.values())
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, user_id, score, achieved_at):
+        old = self._by_user.get(user_id)
+        if old is not None:
+            self._keys.remove(old)
+        key = (-score, achieved_at.timestamp(), user_id)
+        self._keys.add(key)
+        self._by_user[user_id] = key
+
+    def rank(self, user_id):
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return self._keys.bisect_left(key) + 1
+
+    def score(self, user_id):
+        key = self._by_user.get(user_id)
+        return None if key is None else -key[0]
+
+    def top(self, limit):
+        return [(user_id, -score) for score, _, user_id in self._keys.islice(0, limit)]
+
+
+class _Board:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ranking = None
+
+
+_boards = OrderedDict()
+# Защищает только _boards; загрузка и чтение таблицы идут под board.lock
+_lock = threading.Lock()
+
+
+def _load(course_id, test_id):
+    rows = LeaderboardEntry.objects.filter(course_id=course_id, test_id=test_id) \
+        .values_list('user_id', 'score', 'achieved_at')
+    return Ranking(rows.iterator(chunk_size=BATCH_SIZE))
+
+
+def _board(course_id, test_id):
+    key = (course_id, test_id)
+    with _lock:
+        board = _boards.get(key)
+        if board is None:
+            board = _boards[key] = _Board()
+            while len(_boards) > MAX_BOARDS:
+                _boards.popitem(last=False)
+        _boards.move_to_end(key)
+    return board
+
+
+def _ranking(board, course_id, test_id):
+    """
+    Ranking таблицы; перечитывается из БД, если устарел. Вызывать под board.lock.
+    """
+    if board.ranking is None or time.monotonic() - board.ranking.loaded_at >= CACHE_SECONDS:
+        board.ranking = _load(course_id, test_id)
+    return board.ranking
+
+
+def _apply(course_id, test_id, user_id, score, achieved_at):
+    with _lock:
+        board = _boards.get((course_id, test_id))
+    if board is None:
+        return
+    # Если таблица сейчас перечитывается, ждём и применяем к новой версии
+    with board.lock:
+        if board.ranking is not None:
+            board.ranking.update(user_id, score, achieved_at)
+
+
+def clear_cache():
+    with _lock:
+        _boards.clear()
+
+
+def standings(course_id, test_id=None, user=None, limit=10):
+    """
+    {'total', 'top': [{rank, user, username, score}], 'me': {rank, score} | None}
+    """
+    board = _board(course_id, test_id)
+    with board.lock:
+        ranking = _ranking(board, course_id, test_id)
+        total = len(ranking)
+        top = ranking.top(limit)
+        me = None
+        if user is not None and ranking.rank(user.id) is not None:
+            me = {'rank': ranking.rank(user.id), 'score': ranking.score(user.id)}
+    User = LeaderboardEntry._meta.get_field('user').related_model
+    usernames = dict(User.objects.filter(id__in=[user_id for user_id, _ in top]).values_list('id', 'username'))
+    return {
+        'total': total,
+        'top': [
+            {'rank': position, 'user': user_id, 'username': usernames.get(user_id), 'score': score}
+            for position, (user_id, score) in enumerate(top, start=1)
+        ],
+        'me': me,
+    }
+
+
+def test_course_id(test_id):
+    row = Test.objects.filter(pk=test_id).values_list('course_id', 'lesson__course_id').first()
+    if row is None:
+        return None
+    return row[0] or row[1]
+
+
+@transaction.atomic
+def record_result(result):
+    """
+    Учитывает новый результат: поднимает лучший балл по тесту и, на ту же
+    разницу, сумму по курсу.
+    """
+    course_id = test_course_id(result.test_id)
+    if course_id is None:
+        return
+    entry, created = LeaderboardEntry.objects.get_or_create(
+        test_id=result.test_id, user_id=result.user_id,
+        defaults={'course_id': course_id, 'score': result.score, 'achieved_at': result.created_at},
+    )
+    if created:
+        delta = result.score
+    else:
+        entry = LeaderboardEntry.objects.select_for_update().get(pk=entry.pk)
+        if result.score <= entry.score:
+            return
+        delta = result.score - entry.score
+        entry.score, entry.achieved_at = result.score, result.created_at
+        entry.save(update_fields=['score', 'achieved_at'])
+
+    total, created = LeaderboardEntry.objects.get_or_create(
+        course_id=course_id, test=None, user_id=result.user_id,
+        defaults={'score': delta, 'achieved_at': result.created_at},
+    )
+    if not created:
+        LeaderboardEntry.objects.filter(pk=total.pk).update(score=F('score') + delta, achieved_at=result.created_at)
+        total.score = LeaderboardEntry.objects.filter(pk=total.pk).values_list('score', flat=True).get()
+
+    def apply():
+        _apply(course_id, result.test_id, result.user_id, result.score, result.created_at)
+        _apply(course_id, None, result.user_id, total.score, result.created_at)
+    transaction.on_commit(apply)
+
+
+def _on_result_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_result(instance)
+
+
+def connect():
+    post_save.connect(_on_result_saved, sender=TestResult, dispatch_uid='leaderboard-test-results')
+
+
+def rebuild(course_ids=None):
+    """
+    Пересобирает таблицы лидеров из TestResult (всех курсов или перечисленных).
+    Возвращает число записанных строк.
+    """
+    tests = Test.objects.all()
+    if course_ids is not None:
+        tests = tests.filter(Q(course_id__in=course_ids) | Q(lesson__course_id__in=course_ids))
+    course_of_test = {
+        test_id: course_id or lesson_course_id
+        for test_id, course_id, lesson_course_id in tests.values_list('id', 'course_id', 'lesson__course_id')
+    }
+    entries = LeaderboardEntry.objects.all()
+    if course_ids is not None:
+        entries = entries.filter(course_id__in=course_ids)
+
+    # Первая строка для каждой пары (тест, пользователь) - лучший и самый ранний результат
+    results = TestResult.objects.filter(test__in=tests).order_by('test_id', 'user_id', '-score', 'created_at') \
+        .values_list('test_id', 'user_id', 'score', 'created_at')
+    written = 0
+    totals = {}
+    with transaction.atomic():
+        entries.delete()
+        batch = []
+        previous = None
+        for test_id, user_id, score, created_at in results.iterator(chunk_size=BATCH_SIZE):
+            if (test_id, user_id) == previous:
+                continue
+            previous = (test_id, user_id)
+            course_id = course_of_test.get(test_id)
+            if course_id is None:
+                continue
+            batch.append(LeaderboardEntry(course_id=course_id, test_id=test_id, user_id=user_id,
+                                          score=score, achieved_at=created_at))
+            # Сумма по курсу достигнута, когда получен последний из лучших баллов
+            total = totals.setdefault((course_id, user_id), [0, created_at])
+            total[0] += score
+            total[1] = max(total[1], created_at)
+            if len(batch) >= BATCH_SIZE:
+                LeaderboardEntry.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        batch += [
+            LeaderboardEntry(course_id=course_id, test=None, user_id=user_id, score=score, achieved_at=achieved_at)
+            for (course_id, user_id), (score, achieved_at) in totals.items()
+        ]
+        LeaderboardEntry.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        written += len(batch)
+    clear_cache()
+    return written
@@ -0,0 +1,306 @@
+"""
+Живая лента результатов теста (Server-Sent Events).
+
+submit_test_result и завершение попытки создают TestResult; после коммита
+транзакции событие публикуется в брокер, а открытые SSE-потоки по этому тесту
+получают новую строку и пересчитанные агрегаты (count/avg/max). Агрегаты
+считаются одним запросом при подключении и дальше обновляются по событиям,
+так что открытый дашборд не нагружает БД.
+
+Долгий поток (stream) - асинхронный генератор и ждёт событий, не занимая
+поток воркера, только под ASGI (uvicorn/daphne с backend.asgi). Под WSGI
+поток держал бы поток воркера до STREAM_SECONDS, поэтому там ответ
+(snapshot) отдаёт пропущенные результаты и агрегаты и сразу закрывается, а
+клиент переподключается через RETRY_MS с Last-Event-ID.
+
+Брокер задаётся настройкой TEST_RESULTS_FEED_BACKEND:
+    courses.live.LocalBackend     - подписчики в памяти процесса (по умолчанию,
+                                    годится для одного воркера);
+    courses.live.PostgresBackend  - LISTEN/NOTIFY, события доходят до
+                                    подписчиков во всех воркерах.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.signals import post_save
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+from .models import TestResult
+
+logger = logging.getLogger(__name__)
+
+# Сколько событий может накопиться у медленного подписчика, прежде чем они начнут теряться
+QUEUE_SIZE = 1000
+# Интервал комментариев-пингов, чтобы прокси не закрывали простаивающее соединение
+KEEPALIVE_SECONDS = 15
+# Поток ограничен по времени, чтобы соединения не копились за прокси; браузер
+# переподключится сам и по Last-Event-ID получит пропущенные результаты
+STREAM_SECONDS = getattr(settings, 'TEST_RESULTS_FEED_SECONDS', 300)
+RETRY_MS = 3000
+# Пауза перед переподключением LISTEN после ошибки соединения
+LISTEN_RETRY_SECONDS = 5
+
+
+class Subscriber:
+    """
+    Очередь событий одного потока. put() можно вызывать из любого потока:
+    событие передаётся в цикл событий подписчика.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Цикл уже закрыт - подписчик ушёл
+            pass
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class LocalBackend:
+    """
+    Pub/sub в памяти процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, test_id):
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers[test_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, test_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(test_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[test_id]
+
+    def publish(self, test_id, event):
+        self.dispatch(test_id, event)
+
+    def dispatch(self, test_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(test_id, ()))
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+
+class PostgresBackend(LocalBackend):
+    """
+    Публикация через NOTIFY; в каждом процессе один поток держит отдельное
+    соединение с LISTEN и раздаёт события локальным подписчикам. При ошибке
+    соединения поток переподключается сам, не дожидаясь новых подписчиков.
+    """
+    channel = 'courses_test_results'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, test_id):
+        self._ensure_listener()
+        return super().subscribe(test_id)
+
+    def publish(self, test_id, event):
+        payload = json.dumps({'test_id': test_id, 'event': event}, cls=_Encoder)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='test-results-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('LISTEN %s failed, reconnecting in %s s', self.channel, LISTEN_RETRY_SECONDS)
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+    def _listen_once(self):
+        conn = connection.get_new_connection(connection.get_connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN {}'.format(self.channel))
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        message = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    self.dispatch(message['test_id'], message['event'])
+        finally:
+            conn.close()
+
+
+class _Encoder(json.JSONEncoder):
+    def default(self, value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return super().default(value)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'TEST_RESULTS_FEED_BACKEND', 'courses.live.LocalBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def result_event(result):
+    return {
+        'id': result.id,
+        'user': result.user_id,
+        'test': result.test_id,
+        'score': result.score,
+        'created_at': result.created_at.isoformat(),
+    }
+
+
+def _on_result_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    event = result_event(instance)
+    # До коммита результата ещё нет в БД, а при откате его не будет вовсе
+    transaction.on_commit(lambda: get_backend().publish(instance.test_id, event))
+
+
+def connect():
+    post_save.connect(_on_result_saved, sender=TestResult, dispatch_uid='live-test-results')
+
+
+class Aggregates:
+    def __init__(self, test_id):
+        totals = TestResult.objects.filter(test_id=test_id).aggregate(
+            count=Count('id'), total=Sum('score'), best=Max('score'), last_id=Max('id'))
+        self.count = totals['count']
+        self.sum = totals['total'] or 0
+        self.max = totals['best']
+        # Результаты с id не больше этого уже учтены в агрегатах
+        self.last_id = totals['last_id'] or 0
+
+    def add(self, score):
+        self.count += 1
+        self.sum += score
+        self.max = score if self.max is None else max(self.max, score)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'avg': round(self.sum / self.count, 2) if self.count else None,
+            'max': self.max,
+        }
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('event: {}'.format(event))
+    lines.append('data: {}'.format(json.dumps(data, cls=_Encoder, ensure_ascii=False)))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Нужен для согласования Accept: text/event-stream; ответы с ошибками
+    (403, 404) отдаёт одним событием error.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _sse('error', data).encode(self.charset)
+
+
+def _snapshot(test_id, last_event_id):
+    aggregates = Aggregates(test_id)
+    messages = ['retry: {}\n\n'.format(RETRY_MS)]
+    if last_event_id is not None:
+        missed = TestResult.objects.filter(test_id=test_id, id__gt=last_event_id, id__lte=aggregates.last_id)
+        for result in missed.order_by('id').iterator():
+            messages.append(_sse('result', result_event(result), result.id))
+    messages.append(_sse('aggregates', aggregates.as_dict()))
+    return aggregates, messages
+
+
+def snapshot(test_id, last_event_id=None):
+    """
+    Короткий ответ для WSGI: результаты после last_event_id и текущие агрегаты.
+    """
+    return iter(_snapshot(test_id, last_event_id)[1])
+
+
+async def stream(test_id, last_event_id=None):
+    """
+    Асинхронный генератор SSE-сообщений по тесту. Сначала отдаёт то же, что
+    snapshot(), затем ждёт новые результаты до STREAM_SECONDS.
+    """
+    backend = get_backend()
+    # Подписываемся до чтения БД, чтобы не потерять результат между запросами
+    subscriber = backend.subscribe(test_id)
+    try:
+        aggregates, messages = await sync_to_async(_snapshot)(test_id, last_event_id)
+        for message in messages:
+            yield message
+
+        deadline = time.monotonic() + STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = await subscriber.get(timeout=min(KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if event['id'] <= aggregates.last_id:
+                continue
+            aggregates.add(event['score'])
+            yield _sse('result', event, event['id'])
+            yield _sse('aggregates', aggregates.as_dict())
+    finally:
+        backend.unsubscribe(test_id, subscriber)
@@ -0,0 +1,37 @@
+import datetime
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.partitions import archive_month, cold_months
+
+
+class Command(BaseCommand):
+    help = 'Выгружает результаты тестов за старые месяцы в сжатые JSONL-файлы и удаляет их из БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True,
+                            help='Архивировать месяцы раньше этого, формат YYYY-MM')
+        parser.add_argument('--dir', required=True, dest='directory', help='Каталог для архивов')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, какие месяцы будут архивированы')
+
+    def handle(self, *args, **options):
+        try:
+            before = datetime.datetime.strptime(options['before'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError('--before must look like YYYY-MM')
+        if not os.path.isdir(options['directory']):
+            raise CommandError('Directory {} does not exist'.format(options['directory']))
+
+        months = cold_months(before)
+        if not months:
+            self.stdout.write('Nothing to archive')
+            return
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write('Would archive {:%Y-%m}'.format(month))
+                continue
+            path, count = archive_month(month, options['directory'])
+            self.stdout.write('{:%Y-%m}: {} results -> {}'.format(month, count, path))
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Archived {} month(s)'.format(len(months))))
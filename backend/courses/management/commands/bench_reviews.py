@@ -0,0 +1,67 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from courses.models import Course, Question, ReviewItem, Test
+from courses.reviews import due_items
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Замеряет выборку вопросов к повторению на большой синтетической очереди (изменения откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50000, help='Вопросов в очереди каждого пользователя')
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        with transaction.atomic():
+            started = time.perf_counter()
+            author = User.objects.create(username='bench-reviews-author')
+            course = Course.objects.create(title='bench', description='', author=author)
+            test = Test.objects.create(course=course, title='bench')
+            questions = Question.objects.bulk_create(
+                (Question(test=test, text='q{}'.format(i)) for i in range(options['items'])), batch_size=5000)
+            users = User.objects.bulk_create(
+                User(username='bench-reviews-{}'.format(i)) for i in range(options['users']))
+            for user in users:
+                # Около десятой части очереди просрочено, остальное - на два месяца вперёд
+                ReviewItem.objects.bulk_create(
+                    (ReviewItem(user=user, question=question, interval=rng.randint(1, 60),
+                                due_at=now + datetime.timedelta(minutes=rng.randint(-9 * 1440, 60 * 1440)))
+                     for question in questions),
+                    batch_size=5000,
+                )
+            self.stdout.write('Очередь ({}): {} пользователей по {} вопросов за {:.2f} с'.format(
+                connection.vendor, len(users), len(questions), time.perf_counter() - started))
+
+            self.stdout.write('План запроса:')
+            self.stdout.write(due_items(users[0], limit=options['limit'], now=now).explain())
+
+            timings = []
+            for _ in range(options['queries']):
+                user = rng.choice(users)
+                started = time.perf_counter()
+                items = list(due_items(user, limit=options['limit'], now=now))
+                timings.append((time.perf_counter() - started) * 1000)
+                assert len(items) == options['limit']
+
+            timings.sort()
+            self.stdout.write('Запросов: {}, по {} вопросов'.format(len(timings), options['limit']))
+            self.stdout.write('p50 {:.2f} мс, p95 {:.2f} мс, max {:.2f} мс, mean {:.2f} мс'.format(
+                timings[len(timings) // 2],
+                timings[int(len(timings) * 0.95) - 1],
+                timings[-1],
+                statistics.mean(timings),
+            ))
+            transaction.set_rollback(True)
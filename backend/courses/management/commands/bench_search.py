@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from courses.models import Course, Lesson, Section
+from courses.search import search
+from users.models import User
+
+WORDS = (
+    'grammar vocabulary listening reading writing speaking present past future perfect continuous '
+    'irregular verbs nouns adjectives adverbs pronunciation idioms phrasal travel business family '
+    'weather food shopping hobbies interview email essay dialogue articles prepositions conditionals '
+    'passive modal questions negation numbers colours animals holidays transport health school work'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Замеряет скорость полнотекстового поиска на синтетическом корпусе (изменения откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=50)
+        parser.add_argument('--lessons', type=int, default=5000, help='Всего уроков в корпусе')
+        parser.add_argument('--sections', type=int, default=3, help='Секций на урок')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _text(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            started = time.perf_counter()
+            author = User.objects.create(username='bench-search-author')
+            courses = Course.objects.bulk_create(
+                Course(title=self._text(rng, 3), description=self._text(rng, 30), author=author)
+                for _ in range(options['courses'])
+            )
+            lessons = Lesson.objects.bulk_create(
+                (Lesson(course=rng.choice(courses), title=self._text(rng, 4), description=self._text(rng, 40), order=i)
+                 for i in range(options['lessons'])),
+                batch_size=1000,
+            )
+            Section.objects.bulk_create(
+                (Section(lesson=lesson, title=self._text(rng, 3), content=self._text(rng, 200), order=i)
+                 for lesson in lessons for i in range(options['sections'])),
+                batch_size=1000,
+            )
+            self.stdout.write('Корпус ({}): {} курсов, {} уроков, {} секций за {:.2f} с'.format(
+                connection.vendor, len(courses), len(lessons), len(lessons) * options['sections'],
+                time.perf_counter() - started,
+            ))
+
+            timings = []
+            hits = 0
+            for _ in range(options['queries']):
+                query = ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+                started = time.perf_counter()
+                hits += len(search(query, limit=20))
+                timings.append((time.perf_counter() - started) * 1000)
+
+            timings.sort()
+            self.stdout.write('Запросов: {}, найдено в среднем {:.1f}'.format(len(timings), hits / len(timings)))
+            self.stdout.write('p50 {:.2f} мс, p95 {:.2f} мс, max {:.2f} мс, mean {:.2f} мс'.format(
+                timings[len(timings) // 2],
+                timings[int(len(timings) * 0.95) - 1],
+                timings[-1],
+                statistics.mean(timings),
+            ))
+            transaction.set_rollback(True)
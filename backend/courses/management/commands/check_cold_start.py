@@ -0,0 +1,64 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в новом процессе: импорт backend.wsgi (django.setup() и
+# backend.preload), затем первый запрос прямо в WSGI-приложение
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from backend.wsgi import application
+from wsgiref.util import setup_testing_defaults
+imported = time.perf_counter()
+
+def request():
+    environ = {'PATH_INFO': sys.argv[1], 'REQUEST_METHOD': 'GET', 'HTTP_HOST': sys.argv[2]}
+    setup_testing_defaults(environ)
+    statuses = []
+    begun = time.perf_counter()
+    b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    return statuses[0], time.perf_counter() - begun
+
+status, first = request()
+_, second = request()
+print(json.dumps({'import': imported - started, 'first': first, 'second': second, 'status': status}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Проверяет время до первого ответа нового воркера: запускает процесс, импортирует '
+            'backend.wsgi и отправляет первый запрос. Завершается с ошибкой, если медиана выше --max-seconds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/courses/')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--max-seconds', type=float, default=2.0,
+                            help='Допустимая медиана времени от старта процесса до первого ответа')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        runs = []
+        for _ in range(options['runs']):
+            process = subprocess.run(
+                [sys.executable, '-c', PROBE, options['path'], options['host']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if process.returncode:
+                raise CommandError(process.stderr.strip() or 'probe failed')
+            run = json.loads(process.stdout.strip().splitlines()[-1])
+            runs.append(run)
+            self.stdout.write('{}: импорт {:.0f} мс, первый запрос {:.0f} мс, второй {:.0f} мс'.format(
+                run['status'], run['import'] * 1000, run['first'] * 1000, run['second'] * 1000))
+
+        total = statistics.median(run['import'] + run['first'] for run in runs)
+        message = 'До первого ответа (медиана): {:.0f} мс, порог {:.0f} мс'.format(
+            total * 1000, options['max_seconds'] * 1000)
+        if total > options['max_seconds']:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.copying import copy_course
+from courses.models import Course
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Создаёт полную копию курса (уроки, секции, тесты, вопросы, ответы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('--title', help='Название новой копии (по умолчанию как у исходного курса)')
+        parser.add_argument('--author', help='Username автора копии (по умолчанию автор исходного курса)')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.select_related('author').get(pk=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError('Course {} not found'.format(options['course_id']))
+        author = None
+        if options['author']:
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError('User {} not found'.format(options['author']))
+        new_course = copy_course(course, author=author, title=options['title'])
+        self.stdout.write(self.style.SUCCESS('Course {} copied to {}'.format(course.id, new_course.id)))
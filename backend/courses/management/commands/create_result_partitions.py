@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from courses.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Создаёт помесячные секции таблицы результатов тестов на несколько месяцев вперёд (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write('Results table is not partitioned, nothing to do')
+            return
+        created = ensure_partitions(months_ahead=options['months_ahead'])
+        for name in created:
+            self.stdout.write('Created {}'.format(name))
+        self.stdout.write(self.style.SUCCESS('Partitions up to date ({} created)'.format(len(created))))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.archive import export_course
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Экспортирует курс в tar-архив (manifest.jsonl и, по желанию, медиафайлы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('output', help='Путь к архиву или "-" для stdout')
+        parser.add_argument('--media', action='store_true', help='Включить видеофайлы в архив')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError('Course {} not found'.format(options['course_id']))
+        chunks = export_course(course, include_media=options['media'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS('Course {} exported to {}'.format(course.id, options['output'])))
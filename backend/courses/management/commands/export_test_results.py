@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.exports import FORMATS, stream_results
+from courses.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает результаты теста в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_id', type=int)
+        parser.add_argument('--output', default='-', help='Путь к файлу или "-" для stdout')
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='output_format')
+        parser.add_argument('--details', action='store_true', help='Добавить правильность по каждому вопросу')
+
+    def handle(self, *args, **options):
+        if not Test.objects.filter(id=options['test_id']).exists():
+            raise CommandError('Test {} not found'.format(options['test_id']))
+        lines = stream_results(options['test_id'], output=options['output_format'], details=options['details'])
+        if options['output'] == '-':
+            for line in lines:
+                sys.stdout.write(line)
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines:
+                output.write(line)
+        self.stderr.write('Results exported to {}'.format(options['output']))
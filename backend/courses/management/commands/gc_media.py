@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from courses.media import collect, recount, rehash_legacy
+
+
+class Command(BaseCommand):
+    help = 'Удаляет видео, на которые не осталось ссылок, и пересчитывает ссылки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Не трогать файлы, оставшиеся без ссылок позже, чем столько часов назад')
+        parser.add_argument('--recount', action='store_true', help='Сначала пересчитать ссылки по урокам и секциям')
+        parser.add_argument('--rehash-legacy', action='store_true',
+                            help='Перевести старые видео на хэш-имена, схлопнув дубликаты')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        if options['rehash_legacy'] and not options['dry_run']:
+            moved = rehash_legacy()
+            for old, new in moved.items():
+                self.stdout.write('{} -> {}'.format(old, new))
+        if options['recount'] and not options['dry_run']:
+            recount()
+        deleted = collect(grace_seconds=int(options['grace_hours'] * 3600), dry_run=options['dry_run'])
+        for name in deleted:
+            self.stdout.write(('Would delete {}' if options['dry_run'] else 'Deleted {}').format(name))
+        self.stdout.write(self.style.SUCCESS('Unreferenced files: {}'.format(len(deleted))))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.archive import ArchiveError, import_course
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импортирует курс из tar-архива, созданного export_course'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Путь к архиву (tar, tar.gz)')
+        parser.add_argument('--author', required=True, help='Username автора нового курса')
+        parser.add_argument('--title', help='Название курса (по умолчанию из архива)')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError('User {} not found'.format(options['author']))
+        try:
+            with open(options['archive'], 'rb') as archive:
+                course = import_course(archive, author=author, title=options['title'])
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS('Course imported with id {}'.format(course.id)))
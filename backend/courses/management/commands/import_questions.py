@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Test
+from courses.question_bank import import_questions
+from courses.question_import import READERS, ImportFormatError, detect, read
+
+
+class Command(BaseCommand):
+    help = 'Импортирует вопросы в тест из CSV, GIFT или Moodle XML'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_id', type=int)
+        parser.add_argument('path', help='Путь к файлу с вопросами')
+        parser.add_argument('--type', choices=sorted(READERS), help='Формат файла (по умолчанию по расширению)')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл')
+
+    def handle(self, *args, **options):
+        try:
+            test = Test.objects.only('id').get(id=options['test_id'])
+        except Test.DoesNotExist:
+            raise CommandError('Test {} not found'.format(options['test_id']))
+        kind = options['type'] or detect(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_questions(test, read(stream, kind), dry_run=options['dry_run'])
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+        for error in report['errors']:
+            self.stderr.write('row {}: {}'.format(error['row'], error['errors']))
+        verb = 'valid' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS('{} questions {}, {} rejected'.format(
+            report['created'], verb, report['error_count'])))
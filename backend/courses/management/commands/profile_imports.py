@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+Row = namedtuple('Row', 'module self_us cumulative_us')
+
+STARTUP = 'import backend.wsgi'
+
+
+def parse_importtime(output):
+    """
+    Строки вида "import time:   self [us] | cumulative | imported package"
+    из вывода python -X importtime.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        # Вложенность обозначена отступом после '| '; верхний уровень - без отступа
+        rows.append(Row(parts[2][1:].rstrip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+class Command(BaseCommand):
+    help = ('Показывает, сколько стоит импорт каждого модуля при запуске воркера '
+            '(import backend.wsgi, включая django.setup() и backend.preload) - по данным python -X importtime')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=30)
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='cumulative')
+        parser.add_argument('--prefix', action='append', dest='prefixes',
+                            help='Показывать только модули с этим префиксом (можно несколько раз)')
+        parser.add_argument('--statement', default=STARTUP, help='Что импортировать вместо backend.wsgi')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', options['statement']],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'import failed')
+        rows = parse_importtime(process.stderr)
+        if not rows:
+            raise CommandError('python -X importtime produced no data')
+
+        top_level = sum(row.cumulative_us for row in rows if not row.module.startswith(' '))
+        rows = [Row(row.module.strip(), row.self_us, row.cumulative_us) for row in rows]
+        if options['prefixes']:
+            rows = [row for row in rows if row.module.startswith(tuple(options['prefixes']))]
+        key = (lambda row: row.self_us) if options['sort'] == 'self' else (lambda row: row.cumulative_us)
+        rows.sort(key=key, reverse=True)
+
+        self.stdout.write('{:>10} {:>12}  {}'.format('self, ms', 'cumul., ms', 'module'))
+        for row in rows[:options['top']]:
+            self.stdout.write('{:>10.1f} {:>12.1f}  {}'.format(row.self_us / 1000, row.cumulative_us / 1000,
+                                                                row.module))
+        by_package = {}
+        for row in rows:
+            package = row.module.split('.')[0]
+            by_package[package] = by_package.get(package, 0) + row.self_us
+        self.stdout.write('')
+        self.stdout.write('По пакетам (self):')
+        for package, total in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:15]:
+            self.stdout.write('{:>10.1f}  {}'.format(total / 1000, package))
+        self.stdout.write(self.style.SUCCESS('Всего на импорт: {:.1f} мс, запуск процесса целиком: {:.1f} мс'.format(
+            top_level / 1000, elapsed * 1000)))
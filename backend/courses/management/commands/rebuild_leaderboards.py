@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицы лидеров курсов и тестов из результатов тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Ограничить пересборку курсом (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        written = rebuild(course_ids=options['courses'])
+        self.stdout.write(self.style.SUCCESS('Leaderboards rebuilt: {} entries'.format(written)))
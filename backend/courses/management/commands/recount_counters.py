@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.counters import recount
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики курсов, уроков и тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Ограничить пересчёт курсом (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['courses']:
+            courses = courses.filter(pk__in=options['courses'])
+        with transaction.atomic():
+            recount(courses)
+        self.stdout.write(self.style.SUCCESS('Counters recomputed'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Section
+from courses.rendering import render_all
+
+
+class Command(BaseCommand):
+    help = 'Перерисовывает HTML секций, у которых изменился текст или версия рендерера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Ограничить курсом (можно указать несколько раз)')
+        parser.add_argument('--force', action='store_true', help='Перерисовать все секции')
+
+    def handle(self, *args, **options):
+        sections = Section.objects.all()
+        if options['courses']:
+            sections = sections.filter(lesson__course__in=options['courses'])
+        updated = render_all(sections, force=options['force'])
+        self.stdout.write(self.style.SUCCESS('Sections rendered: {}'.format(updated)))
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.payloads import is_local, warm
+
+
+class Command(BaseCommand):
+    help = ('Заранее строит кэшированные ответы курсов, уроков и тестов с наибольшим '
+            'числом недавних результатов (запускать после деплоя или очистки кэша)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Сколько самых активных тестов брать')
+        parser.add_argument('--days', type=int, default=7, help='За сколько последних дней считать результаты')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'PAYLOAD_WARMUP_WORKERS', 4),
+                            help='Потоков построения')
+        parser.add_argument('--base-url', default=None,
+                            help='Адрес API для абсолютных URL файлов (по умолчанию PAYLOAD_CACHE_BASE_URL)')
+
+    def handle(self, *args, **options):
+        if is_local():
+            # Ответы остались бы в памяти этой команды, воркеры их не увидят
+            raise CommandError('warm_cache needs a shared cache backend (Redis, Memcached, database), '
+                               'CACHES["default"] is local-memory')
+        results, elapsed = warm(limit=options['limit'], days=options['days'], workers=options['workers'],
+                                base_url=options['base_url'])
+        failed = 0
+        for kind, pk, seconds, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write('{} {}: {}'.format(kind, pk, error))
+            elif options['verbosity'] > 1:
+                self.stdout.write('{} {}: {:.1f} мс'.format(kind, pk, seconds * 1000))
+        total = sum(seconds for _, _, seconds, _ in results)
+        self.stdout.write(self.style.SUCCESS(
+            'Warmed {} payloads ({} failed) in {:.2f} s using {} workers (serial time {:.2f} s)'.format(
+                len(results) - failed, failed, elapsed, options['workers'], total)))
@@ -0,0 +1,203 @@
+"""
+Счётчики ссылок на видео (MediaBlob) для хранилища courses.storage.
+
+Ссылки меняются при сохранении и удалении Lesson/Section (сигналы) и при
+массовом создании уроков и секций, где сигналов нет: copy_course и
+import_course вызывают retain_course(), inline-формы админки - bulk_saved().
+Секции удаляются без post_delete (см. models.rows_deleted), а ссылки секций
+удаляемого урока снимаются одним запросом в pre_delete урока. Файлы без
+ссылок удаляет collect(): не сразу, а спустя grace-период, чтобы не задеть
+только что загруженный файл, строка для которого ещё не закоммичена.
+collect() обходит только каталог хранилища (ContentAddressedStorage.root), а
+не весь MEDIA_ROOT.
+"""
+import datetime
+import os
+import time
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.utils import timezone
+
+from .models import Lesson, MediaBlob, Section, rows_deleted
+from .storage import is_hashed_name, video_storage
+
+MODELS = (Lesson, Section)
+
+
+def adjust(deltas):
+    """
+    deltas - {имя файла: изменение числа ссылок}.
+    """
+    now = timezone.now()
+    for name, delta in deltas.items():
+        if not name or not delta:
+            continue
+        updated = MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + delta, updated_at=now)
+        if updated or delta < 0:
+            continue
+        _, created = MediaBlob.objects.get_or_create(name=name, defaults={'refcount': delta})
+        if not created:
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + delta, updated_at=now)
+
+
+def _references(querysets):
+    references = Counter()
+    for queryset in querysets:
+        rows = queryset.exclude(video='').exclude(video=None).order_by().values('video') \
+            .annotate(total=Count('pk')).values_list('video', 'total')
+        references.update(dict(rows))
+    return references
+
+
+def retain_course(course):
+    adjust(_references([Lesson.objects.filter(course=course), Section.objects.filter(lesson__course=course)]))
+
+
+def _stored_name(instance):
+    value = instance.__dict__.get('video')
+    return getattr(value, 'name', value) or ''
+
+
+def _on_init(sender, instance, **kwargs):
+    # Запоминаем исходное имя, чтобы при сохранении понять, сменилось ли видео.
+    # Если поле отложено (only/defer), имя дочитается из БД при сохранении
+    if 'video' in instance.__dict__:
+        instance._stored_video = _stored_name(instance)
+
+
+def _on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'video' not in update_fields):
+        return
+    new = instance.video.name or ''
+    if created:
+        old = ''
+    elif hasattr(instance, '_stored_video'):
+        old = instance._stored_video
+    else:
+        old = sender.objects.filter(pk=instance.pk).values_list('video', flat=True).first() or ''
+    if old != new:
+        changes = Counter()
+        changes[new] += 1
+        changes[old] -= 1
+        adjust(changes)
+    instance._stored_video = new
+
+
+def _on_delete(sender, instance, **kwargs):
+    name = _stored_name(instance) if 'video' in instance.__dict__ else getattr(instance, '_stored_video', '')
+    adjust({name: -1})
+
+
+def _on_lesson_delete(sender, instance, **kwargs):
+    # Секции удалятся каскадом без сигналов
+    adjust({name: -count for name, count in _references([Section.objects.filter(lesson=instance)]).items()})
+
+
+def bulk_saved(created=(), changed=()):
+    """
+    Ссылки объектов, записанных bulk_create (created) и bulk_update
+    (changed - те, у которых могло смениться видео): сигналов там нет.
+    """
+    changes = Counter()
+    for instance in created:
+        changes[instance.video.name or ''] += 1
+        instance._stored_video = instance.video.name or ''
+    for instance in changed:
+        new = instance.video.name or ''
+        changes[new] += 1
+        changes[getattr(instance, '_stored_video', '')] -= 1
+        instance._stored_video = new
+    adjust(changes)
+
+
+def _on_rows_deleted(sender, rows, **kwargs):
+    if sender is not Section:
+        return
+    changes = Counter()
+    for row in rows:
+        changes[getattr(row['video'], 'name', row['video']) or ''] -= row['rows']
+    adjust(changes)
+
+
+def connect():
+    for model in MODELS:
+        uid = model.__name__
+        post_init.connect(_on_init, sender=model, dispatch_uid='media-init-' + uid)
+        post_save.connect(_on_save, sender=model, dispatch_uid='media-save-' + uid)
+    pre_delete.connect(_on_lesson_delete, sender=Lesson, dispatch_uid='media-delete-lesson-sections')
+    post_delete.connect(_on_delete, sender=Lesson, dispatch_uid='media-delete-Lesson')
+    rows_deleted.connect(_on_rows_deleted, dispatch_uid='media-rows-deleted')
+
+
+def recount():
+    """
+    Пересчитывает ссылки по фактическим значениям Lesson.video и Section.video.
+    """
+    references = _references([model.objects.all() for model in MODELS])
+    now = timezone.now()
+    for blob in MediaBlob.objects.all().iterator():
+        count = references.pop(blob.name, 0)
+        if blob.refcount != count:
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=count, updated_at=now)
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refcount=count) for name, count in references.items()],
+        ignore_conflicts=True,
+    )
+
+
+def collect(grace_seconds=24 * 60 * 60, dry_run=False):
+    """
+    Удаляет файлы хранилища, на которые нет ссылок дольше grace_seconds:
+    записи MediaBlob с нулём ссылок, файлы с хэш-именами без записи и
+    брошенные временные файлы загрузок. Возвращает список удалённых имён.
+    """
+    storage = video_storage()
+    cutoff = timezone.now() - datetime.timedelta(seconds=grace_seconds)
+    deleted = []
+    for name in MediaBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff).values_list('name', flat=True):
+        if not dry_run:
+            storage.delete(name)
+        deleted.append(name)
+
+    known = set(MediaBlob.objects.values_list('name', flat=True))
+    oldest = time.time() - grace_seconds
+    for root, _, files in os.walk(storage.root):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            stale_upload = filename.endswith('.upload')
+            if not stale_upload and (not is_hashed_name(name) or name in known):
+                continue
+            if os.path.getmtime(path) >= oldest:
+                continue
+            if not dry_run:
+                os.remove(path)
+            deleted.append(name)
+    return deleted
+
+
+def rehash_legacy():
+    """
+    Переводит видео, загруженные до хранилища по хэшу (videos/<имя файла>),
+    на хэш-имена: одинаковые файлы при этом схлопываются в один.
+    Возвращает {старое имя: новое}.
+    """
+    storage = video_storage()
+    names = [name for name in _references([model.objects.all() for model in MODELS]) if not is_hashed_name(name)]
+    moved = {}
+    for name in names:
+        if not storage.exists(name):
+            continue
+        with storage.open(name, 'rb') as content:
+            moved[name] = storage.save(name, content)
+    with transaction.atomic():
+        for old, new in moved.items():
+            for model in MODELS:
+                model.objects.filter(video=old).update(video=new)
+        recount()
+    for old in moved:
+        storage.delete(old)
+    return moved
@@ -0,0 +1,152 @@
+from django.db import migrations
+
+
+# PostgreSQL: tsvector хранится в generated-колонках, поэтому СУБД сама
+# пересчитывает его при каждом INSERT/UPDATE, а GIN-индекс ускоряет поиск.
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE courses_course ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX courses_course_search_idx ON courses_course USING GIN (search_vector)",
+    """
+    ALTER TABLE courses_lesson ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX courses_lesson_search_idx ON courses_lesson USING GIN (search_vector)",
+    """
+    ALTER TABLE courses_section ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX courses_section_search_idx ON courses_section USING GIN (search_vector)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "ALTER TABLE courses_section DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE courses_lesson DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE courses_course DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: единая FTS5-таблица, которую поддерживают триггеры.
+# rowid = id * 4 + вид объекта, чтобы обновление и удаление шли по rowid,
+# а не полным сканом виртуальной таблицы. Триггеры ссылаются только на свою
+# таблицу и courses_search: триггер, читающий другую таблицу, ломает её
+# пересоздание в последующих миграциях, поэтому course_id секции не хранится
+# и берётся JOIN-ом при поиске. Миграции на SQLite пересоздают таблицы и
+# теряют их триггеры - courses.search восстанавливает их после migrate.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE courses_search USING fts5(
+        course_id UNINDEXED, lesson_id UNINDEXED, title, body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER courses_search_course_ai AFTER INSERT ON courses_course BEGIN
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 1, new.id, NULL, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_course_au AFTER UPDATE OF title, description ON courses_course BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 1;
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 1, new.id, NULL, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_course_ad AFTER DELETE ON courses_course BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_lesson_ai AFTER INSERT ON courses_lesson BEGIN
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 2, new.course_id, new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_lesson_au AFTER UPDATE OF title, description, course_id ON courses_lesson BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 2;
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 2, new.course_id, new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_lesson_ad AFTER DELETE ON courses_lesson BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 2;
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_section_ai AFTER INSERT ON courses_section BEGIN
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 3, NULL, new.lesson_id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_section_au AFTER UPDATE OF title, content, lesson_id ON courses_section BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 3;
+        INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+        VALUES (new.id * 4 + 3, NULL, new.lesson_id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_search_section_ad AFTER DELETE ON courses_section BEGIN
+        DELETE FROM courses_search WHERE rowid = old.id * 4 + 3;
+    END
+    """,
+    # Индексируем уже существующие данные
+    """
+    INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+    SELECT id * 4 + 1, id, NULL, title, description FROM courses_course
+    """,
+    """
+    INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+    SELECT id * 4 + 2, course_id, id, title, description FROM courses_lesson
+    """,
+    """
+    INSERT INTO courses_search(rowid, course_id, lesson_id, title, body)
+    SELECT id * 4 + 3, NULL, lesson_id, title, content FROM courses_section
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS courses_search_course_ai",
+    "DROP TRIGGER IF EXISTS courses_search_course_au",
+    "DROP TRIGGER IF EXISTS courses_search_course_ad",
+    "DROP TRIGGER IF EXISTS courses_search_lesson_ai",
+    "DROP TRIGGER IF EXISTS courses_search_lesson_au",
+    "DROP TRIGGER IF EXISTS courses_search_lesson_ad",
+    "DROP TRIGGER IF EXISTS courses_search_section_ai",
+    "DROP TRIGGER IF EXISTS courses_search_section_au",
+    "DROP TRIGGER IF EXISTS courses_search_section_ad",
+    "DROP TABLE IF EXISTS courses_search",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_testresult'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_enrollments(apps, schema_editor):
+    # Раньше записи на курс хранились только в User.progress["courses"]
+    User = apps.get_model('users', 'User')
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    course_ids = set(Course.objects.values_list('id', flat=True))
+    batch = []
+    for user_id, progress in User.objects.values_list('id', 'progress').iterator():
+        courses = progress.get('courses') if isinstance(progress, dict) else None
+        for course_id in set(courses or []):
+            try:
+                course_id = int(course_id)
+            except (TypeError, ValueError):
+                continue
+            if course_id in course_ids:
+                batch.append(Enrollment(user_id=user_id, course_id=course_id))
+        if len(batch) >= 1000:
+            Enrollment.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Enrollment.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'course'), name='unique_enrollment')],
+            },
+        ),
+        migrations.RunPython(backfill_enrollments, migrations.RunPython.noop),
+    ]
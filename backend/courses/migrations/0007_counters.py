@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, parent_field):
+    subquery = model.objects.filter(**{parent_field: OuterRef('pk')}).order_by().values(parent_field) \
+        .annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Section = apps.get_model('courses', 'Section')
+    Test = apps.get_model('courses', 'Test')
+    Question = apps.get_model('courses', 'Question')
+    TestResult = apps.get_model('courses', 'TestResult')
+    Course.objects.update(lessons_count=_count(Lesson, 'course'), tests_count=_count(Test, 'course'))
+    Lesson.objects.update(sections_count=_count(Section, 'lesson'), tests_count=_count(Test, 'lesson'))
+    Test.objects.update(questions_count=_count(Question, 'test'), results_count=_count(TestResult, 'test'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lessons_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='tests_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='sections_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='tests_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='questions_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='results_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
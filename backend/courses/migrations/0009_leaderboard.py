@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_leaderboards(apps, schema_editor):
+    # То же, что courses.leaderboard.rebuild() для пустой таблицы: по строке на
+    # лучший результат (тест, пользователь) и по сумме лучших баллов на курс
+    Test = apps.get_model('courses', 'Test')
+    TestResult = apps.get_model('courses', 'TestResult')
+    LeaderboardEntry = apps.get_model('courses', 'LeaderboardEntry')
+    course_of_test = {
+        test_id: course_id or lesson_course_id
+        for test_id, course_id, lesson_course_id in Test.objects.values_list('id', 'course_id', 'lesson__course_id')
+    }
+    # Первая строка для каждой пары (тест, пользователь) - лучший и самый ранний результат
+    results = TestResult.objects.order_by('test_id', 'user_id', '-score', 'created_at') \
+        .values_list('test_id', 'user_id', 'score', 'created_at')
+    batch, totals, previous = [], {}, None
+    for test_id, user_id, score, created_at in results.iterator(chunk_size=1000):
+        if (test_id, user_id) == previous:
+            continue
+        previous = (test_id, user_id)
+        course_id = course_of_test.get(test_id)
+        if course_id is None:
+            continue
+        batch.append(LeaderboardEntry(course_id=course_id, test_id=test_id, user_id=user_id,
+                                      score=score, achieved_at=created_at))
+        total = totals.setdefault((course_id, user_id), [0, created_at])
+        total[0] += score
+        total[1] = max(total[1], created_at)
+        if len(batch) >= 1000:
+            LeaderboardEntry.objects.bulk_create(batch)
+            batch = []
+    batch += [
+        LeaderboardEntry(course_id=course_id, test=None, user_id=user_id, score=score, achieved_at=achieved_at)
+        for (course_id, user_id), (score, achieved_at) in totals.items()
+    ]
+    LeaderboardEntry.objects.bulk_create(batch, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_test_attempts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(default=0)),
+                ('achieved_at', models.DateTimeField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='courses.course')),
+                ('test', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='courses.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'test', '-score', 'achieved_at'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('test__isnull', True)), fields=('course', 'user'), name='unique_course_leaderboard_entry'), models.UniqueConstraint(fields=('test', 'user'), name='unique_test_leaderboard_entry')],
+            },
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+import datetime
+
+from django.db import migrations
+
+
+# Только PostgreSQL: courses_testresult пересоздаётся секционированной по
+# created_at, данные переносятся из старой таблицы. Identity-колонки на
+# секционированных таблицах появились лишь в PostgreSQL 17, поэтому id берётся
+# из обычной последовательности.
+#
+# Уникальный индекс секционированной таблицы обязан включать created_at,
+# поэтому отдельно уникальность id СУБД не проверяет: её обеспечивает только
+# последовательность. Вставлять результаты с явным id нельзя.
+FORWARD_BEFORE = [
+    'ALTER TABLE courses_testresult RENAME TO courses_testresult_legacy',
+]
+
+FORWARD_CREATE = [
+    'CREATE TABLE courses_testresult (LIKE courses_testresult_legacy INCLUDING DEFAULTS) '
+    'PARTITION BY RANGE (created_at)',
+    'CREATE SEQUENCE courses_testresult_part_id_seq OWNED BY courses_testresult.id',
+    "ALTER TABLE courses_testresult ALTER COLUMN id SET DEFAULT nextval('courses_testresult_part_id_seq')",
+    'ALTER TABLE courses_testresult ADD CONSTRAINT courses_testresult_pkey PRIMARY KEY (id, created_at)',
+    'ALTER TABLE courses_testresult ADD CONSTRAINT courses_testresult_test_id_fk FOREIGN KEY (test_id) '
+    'REFERENCES courses_test (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE courses_testresult ADD CONSTRAINT courses_testresult_user_id_fk FOREIGN KEY (user_id) '
+    'REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED',
+    'CREATE INDEX courses_testresult_test_created_idx ON courses_testresult (test_id, created_at)',
+    'CREATE INDEX courses_testresult_user_created_idx ON courses_testresult (user_id, created_at)',
+    'CREATE TABLE courses_testresult_default PARTITION OF courses_testresult DEFAULT',
+]
+
+FORWARD_AFTER = [
+    'INSERT INTO courses_testresult SELECT * FROM courses_testresult_legacy',
+    "SELECT setval('courses_testresult_part_id_seq', COALESCE((SELECT MAX(id) FROM courses_testresult), 0) + 1, false)",
+    'DROP TABLE courses_testresult_legacy',
+]
+
+BACKWARD_BEFORE = [
+    'ALTER TABLE courses_testresult RENAME TO courses_testresult_partitioned',
+]
+
+BACKWARD_CREATE = [
+    'CREATE TABLE courses_testresult ('
+    ' id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,'
+    ' score integer NOT NULL,'
+    ' answers jsonb NOT NULL,'
+    ' created_at timestamp with time zone NOT NULL,'
+    ' test_id bigint NOT NULL REFERENCES courses_test (id) DEFERRABLE INITIALLY DEFERRED,'
+    ' user_id bigint NOT NULL REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED)',
+    # Индексы до вставки: после неё на таблице висят отложенные проверки внешних ключей
+    'CREATE INDEX courses_testresult_test_id_idx ON courses_testresult (test_id)',
+    'CREATE INDEX courses_testresult_user_id_idx ON courses_testresult (user_id)',
+    'INSERT INTO courses_testresult (id, score, answers, created_at, test_id, user_id) '
+    'SELECT id, score, answers, created_at, test_id, user_id FROM courses_testresult_partitioned',
+    "SELECT setval(pg_get_serial_sequence('courses_testresult', 'id'), "
+    "COALESCE((SELECT MAX(id) FROM courses_testresult), 0) + 1, false)",
+    'DROP TABLE courses_testresult_partitioned',
+]
+
+
+def _rename_aside(schema_editor, table):
+    # После переименования таблицы её ограничения и индексы сохраняют старые
+    # имена (courses_testresult_pkey и т.д.) и мешают создать такие же на
+    # новой таблице, поэтому им даётся префикс old_
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass', [table])
+        constraints = [row[0] for row in cursor.fetchall()]
+        for name in constraints:
+            schema_editor.execute('ALTER TABLE {} RENAME CONSTRAINT {} TO {}'.format(
+                table, schema_editor.quote_name(name), schema_editor.quote_name(('old_' + name)[:63])))
+        # Индексы ограничений (pkey) переименовались вместе с ними
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE 'old\\_%%'",
+                       [table])
+        for (name,) in cursor.fetchall():
+            schema_editor.execute('ALTER INDEX {} RENAME TO {}'.format(
+                schema_editor.quote_name(name), schema_editor.quote_name(('old_' + name)[:63])))
+
+
+def _month_partitions(first):
+    # Секции под уже накопленные месяцы и на три месяца вперёд; имена и
+    # границы (UTC) как у courses.partitions. Секция по умолчанию ещё пуста,
+    # поэтому переносить из неё строки не нужно.
+    today = datetime.date.today()
+    index = first.year * 12 + first.month - 1
+    last = today.year * 12 + today.month - 1 + 3
+    while index <= last:
+        start = datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+        end = datetime.datetime((index + 1) // 12, (index + 1) % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+        yield 'courses_testresult_y{:04d}m{:02d}'.format(start.year, start.month), start, end
+        index += 1
+
+
+def partition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for sql in FORWARD_BEFORE:
+        schema_editor.execute(sql)
+    _rename_aside(schema_editor, 'courses_testresult_legacy')
+    for sql in FORWARD_CREATE:
+        schema_editor.execute(sql)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(created_at) FROM courses_testresult_legacy')
+        first = cursor.fetchone()[0]
+    for name, start, end in _month_partitions(first or datetime.date.today()):
+        schema_editor.execute(
+            'CREATE TABLE {} PARTITION OF courses_testresult FOR VALUES FROM (%s) TO (%s)'.format(name),
+            [start, end])
+    for sql in FORWARD_AFTER:
+        schema_editor.execute(sql)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in BACKWARD_BEFORE:
+        schema_editor.execute(sql)
+    _rename_aside(schema_editor, 'courses_testresult_partitioned')
+    for sql in BACKWARD_CREATE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_leaderboard'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,154 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:55
+
+import hashlib
+import re
+
+from django.db import migrations, models
+from django.utils.html import escape
+
+# Копия рендерера courses.rendering версии 2: миграция не зависит от
+# дальнейших изменений модуля. Секции, отрисованные здесь, перерисует
+# render_sections, когда RENDERER_VERSION сменится.
+RENDERER_VERSION = '2'
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^\s*[-*]\s+(.*)$')
+_NUMBERED = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+_CODE = re.compile(r'`([^`]+)`')
+# Закрывающие ** - последние в серии звёздочек: **a *b*** -> <strong>a <em>b</em></strong>
+_BOLD = re.compile(r'\*\*(.+?)\*\*(?!\*)')
+_ITALIC = re.compile(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])')
+# Ссылки разбираются уже в экранированном тексте, поэтому кавычек и угловых
+# скобок в адресе быть не может. Вынутый код (\x00) в адрес не попадает.
+_LINK = re.compile(r'\[([^\]]+)\]\((https?://[^\s)\x00]+)\)')
+
+
+def content_hash(content):
+    return hashlib.sha256((RENDERER_VERSION + '\0' + (content or '')).encode('utf-8')).hexdigest()
+
+
+def _emphasis(text):
+    text = _BOLD.sub(r'<strong>\1</strong>', text)
+    return _ITALIC.sub(r'<em>\1</em>', text)
+
+
+def _inline(text):
+    # Код и ссылки вынимаются первыми: внутри кода и адреса ссылки остальная
+    # разметка не срабатывает
+    stashed = []
+
+    def stash(html):
+        stashed.append(html)
+        return '\x00{}\x00'.format(len(stashed) - 1)
+
+    text = _CODE.sub(lambda match: stash('<code>{}</code>'.format(match.group(1))),
+                     escape(text.replace('\x00', '')))
+    text = _LINK.sub(lambda match: stash('<a href="{}" rel="nofollow noopener" target="_blank">{}</a>'.format(
+        match.group(2), _emphasis(match.group(1)))), text)
+    text = _emphasis(text)
+    # Текст ссылки может содержать вынутый код
+    while '\x00' in text:
+        text = re.sub('\x00(\\d+)\x00', lambda match: stashed[int(match.group(1))], text)
+    return text
+
+
+def render(content):
+    """
+    HTML для текста секции.
+    """
+    lines = (content or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    blocks = []
+    paragraph = []
+    items = []
+    list_tag = None
+    code = None
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append('<p>{}</p>'.format('<br>'.join(_inline(line) for line in paragraph)))
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if items:
+            blocks.append('<{0}>{1}</{0}>'.format(list_tag, ''.join('<li>{}</li>'.format(item) for item in items)))
+            items.clear()
+        list_tag = None
+
+    for line in lines:
+        if code is not None:
+            if line.strip().startswith('```'):
+                blocks.append('<pre><code>{}</code></pre>'.format(escape('\n'.join(code))))
+                code = None
+            else:
+                code.append(line)
+            continue
+        if line.strip().startswith('```'):
+            close_paragraph()
+            close_list()
+            code = []
+            continue
+        if not line.strip():
+            close_paragraph()
+            close_list()
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            blocks.append('<h{0}>{1}</h{0}>'.format(level, _inline(heading.group(2).strip())))
+            continue
+        bullet = _BULLET.match(line)
+        numbered = None if bullet else _NUMBERED.match(line)
+        if bullet or numbered:
+            close_paragraph()
+            tag = 'ul' if bullet else 'ol'
+            if list_tag != tag:
+                close_list()
+                list_tag = tag
+            items.append(_inline((bullet or numbered).group(1)))
+            continue
+        close_list()
+        paragraph.append(line.strip())
+
+    if code is not None:
+        # Незакрытый блок кода отображается до конца текста
+        blocks.append('<pre><code>{}</code></pre>'.format(escape('\n'.join(code))))
+    close_paragraph()
+    close_list()
+    return '\n'.join(blocks)
+
+
+def render_sections(apps, schema_editor):
+    Section = apps.get_model('courses', 'Section')
+    batch = []
+    for section in Section.objects.only('id', 'content').order_by('id').iterator(chunk_size=500):
+        section.content_html = render(section.content)
+        section.content_hash = content_hash(section.content)
+        batch.append(section)
+        if len(batch) >= 500:
+            Section.objects.bulk_update(batch, ['content_html', 'content_hash'])
+            batch = []
+    Section.objects.bulk_update(batch, ['content_html', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_review_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='section',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(render_sections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:58
+
+import courses.storage
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    MediaBlob = apps.get_model('courses', 'MediaBlob')
+    references = Counter()
+    for model_name in ('Lesson', 'Section'):
+        rows = apps.get_model('courses', model_name).objects.exclude(video='').exclude(video=None) \
+            .order_by().values('video').annotate(total=Count('pk')).values_list('video', 'total')
+        references.update(dict(rows))
+    MediaBlob.objects.bulk_create([MediaBlob(name=name, refcount=count) for name, count in references.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_section_content_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='video',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=courses.storage.video_storage, upload_to='videos/'),
+        ),
+        migrations.AlterField(
+            model_name='section',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.video_storage, upload_to='videos/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+# Только PostgreSQL: индексы для поиска в админке по началу строки без учёта
+# регистра. '^title' превращается в UPPER(title) LIKE 'ABC%', а обычный
+# индекс по title такой запрос не обслуживает. text_pattern_ops нужен, чтобы
+# LIKE по префиксу шёл по индексу и при сортировке базы не "C".
+#
+# Текст вопроса не ограничен по длине и целиком в строку B-дерева может не
+# влезть, поэтому индексируется только его начало: QuestionAdmin ищет по тому
+# же выражению (LargeTableAdmin.prefix_search_fields).
+INDEXES = [
+    ('courses_course_title_upper_idx', 'courses_course', 'UPPER(title)'),
+    ('courses_lesson_title_upper_idx', 'courses_lesson', 'UPPER(title)'),
+    ('courses_section_title_upper_idx', 'courses_section', 'UPPER(title)'),
+    ('courses_test_title_upper_idx', 'courses_test', 'UPPER(title)'),
+    ('courses_question_text_upper_idx', 'courses_question', 'UPPER(LEFT(text, 100))'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in INDEXES:
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON {} (({}) text_pattern_ops)'.format(
+            name, table, expression))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_media_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
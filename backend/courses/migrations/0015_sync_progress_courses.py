@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def sync_progress_courses(apps, schema_editor):
+    # До запрета менять progress["courses"] через профиль список мог разойтись
+    # с Enrollment; источник истины - Enrollment
+    User = apps.get_model('users', 'User')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    enrolled = {}
+    for user_id, course_id in Enrollment.objects.order_by('created_at', 'id').values_list('user_id', 'course_id'):
+        enrolled.setdefault(user_id, []).append(course_id)
+    batch = []
+    for user in User.objects.only('id', 'progress').iterator():
+        progress = user.progress if isinstance(user.progress, dict) else {}
+        courses = enrolled.get(user.pk, [])
+        if progress.get('courses', []) == courses:
+            continue
+        progress['courses'] = courses
+        user.progress = progress
+        batch.append(user)
+        if len(batch) >= 1000:
+            User.objects.bulk_update(batch, ['progress'])
+            batch = []
+    User.objects.bulk_update(batch, ['progress'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(sync_progress_courses, migrations.RunPython.noop),
+    ]
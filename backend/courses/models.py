@@ -2,6 +2,40 @@ from django.db import models
 from users.models import User
 from django.core.exceptions import ValidationError
 from django.db.models import JSONField
+from django.dispatch import Signal
+
+from .storage import video_storage
+
+# Отправляется после удаления строк моделей TrackedDeleteModel вместо
+# post_delete: получатель post_delete заставляет Django загружать каждую
+# удаляемую строку, в том числе при каскадном удалении курса или теста.
+# rows - значения delete_tracked_fields удалённых строк с их числом в 'rows'.
+# При каскадном удалении сигнал не отправляется: родитель удаляется вместе
+# с детьми.
+rows_deleted = Signal()
+
+class TrackedDeleteQuerySet(models.QuerySet):
+    def delete(self):
+        fields = self.model.delete_tracked_fields
+        rows = list(self.order_by().values(*fields).annotate(rows=models.Count('pk')))
+        result = super().delete()
+        if rows:
+            rows_deleted.send(sender=self.model, rows=rows)
+        return result
+
+class TrackedDeleteModel(models.Model):
+    delete_tracked_fields = ()
+
+    objects = TrackedDeleteQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        row = {field: getattr(self, field) for field in self.delete_tracked_fields}
+        result = super().delete(*args, **kwargs)
+        rows_deleted.send(sender=type(self), rows=[dict(row, rows=1)])
+        return result
 
 class Course(models.Model):
     title = models.CharField(max_length=255)
@@ -9,27 +43,49 @@ class Course(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Денормализованные счётчики, см. courses.counters
+    lessons_count = models.IntegerField(default=0, editable=False)
+    tests_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+class Enrollment(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_enrollment'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.course_id}"
+
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
-    video = models.FileField(upload_to='videos/', blank=True, null=True, max_length=255)
+    video = models.FileField(upload_to='videos/', storage=video_storage, blank=True, null=True, max_length=255)
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    sections_count = models.IntegerField(default=0, editable=False)
+    tests_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
-class Section(models.Model):
+class Section(TrackedDeleteModel):
+    delete_tracked_fields = ('lesson_id', 'video')
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='sections')
     title = models.CharField(max_length=255)
     content = models.TextField(blank=True)
-    video = models.FileField(upload_to='videos/', blank=True, null=True)
+    # HTML из content и хэш исходника, по которому он построен (см. courses.rendering)
+    content_html = models.TextField(blank=True, default='', editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    video = models.FileField(upload_to='videos/', storage=video_storage, blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
 
     def __str__(self):
@@ -40,6 +96,10 @@ class Test(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='final_tests', null=True, blank=True)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
+    # Ограничение времени на попытку в минутах, см. TestAttempt
+    time_limit = models.PositiveIntegerField(null=True, blank=True)
+    questions_count = models.IntegerField(default=0, editable=False)
+    results_count = models.IntegerField(default=0, editable=False)
 
     def clean(self):
         if not self.lesson and not self.course:
@@ -50,14 +110,16 @@ class Test(models.Model):
     def __str__(self):
         return self.title
 
-class Question(models.Model):
+class Question(TrackedDeleteModel):
+    delete_tracked_fields = ('test_id',)
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='questions')
     text = models.TextField()
 
     def __str__(self):
         return self.text
 
-class Answer(models.Model):
+class Answer(TrackedDeleteModel):
+    delete_tracked_fields = ('question_id',)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
     text = models.CharField(max_length=255)
     is_correct = models.BooleanField(default=False)
@@ -65,7 +127,8 @@ class Answer(models.Model):
     def __str__(self):
         return self.text
 
-class TestResult(models.Model):
+class TestResult(TrackedDeleteModel):
+    delete_tracked_fields = ('test_id',)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_results')
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='results')
     score = models.IntegerField()
@@ -74,3 +137,81 @@ class TestResult(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.test.title} ({self.score})"
+
+# Попытка прохождения теста. Ответы во время попытки сохраняются в кэш
+# и периодически сбрасываются в answers (см. courses.attempts).
+class TestAttempt(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_attempts')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='attempts')
+    answers = JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    saved_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Без внешнего ключа: таблица результатов может быть секционирована
+    result_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'test', 'finished_at'], name='attempt_user_test_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.test_id} ({self.started_at})"
+
+# Строка таблицы лидеров: лучший балл пользователя по тесту (test задан) или
+# сумма лучших баллов по всем тестам курса (test пустой). Поддерживается
+# при сохранении TestResult, см. courses.leaderboard.
+class LeaderboardEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, null=True, blank=True, related_name='leaderboard_entries')
+    score = models.IntegerField(default=0)
+    # Когда был достигнут текущий балл: при равенстве выше тот, кто раньше
+    achieved_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'user'], condition=models.Q(test__isnull=True),
+                                    name='unique_course_leaderboard_entry'),
+            models.UniqueConstraint(fields=['test', 'user'], name='unique_test_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'test', '-score', 'achieved_at'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.score} ({self.course_id}/{self.test_id})"
+
+# Вопрос в очереди интервального повторения пользователя (SM-2).
+# Очередь наполняется из отправленных результатов тестов, см. courses.reviews.
+class ReviewItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_items')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_items')
+    ease_factor = models.FloatField(default=2.5)
+    interval = models.PositiveIntegerField(default=0)  # дней
+    repetitions = models.PositiveIntegerField(default=0)
+    lapses = models.PositiveIntegerField(default=0)
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_review_item'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'due_at'], name='review_user_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.question_id} ({self.due_at})"
+
+# Файл в хранилище видео и число ссылок на него из Lesson.video и
+# Section.video. Файлы без ссылок удаляет команда gc_media.
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
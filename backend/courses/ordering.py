@@ -0,0 +1,37 @@
+"""
+Атомарное переупорядочивание уроков и секций.
+"""
+from django.db import transaction
+
+
+class ReorderError(ValueError):
+    pass
+
+
+def reorder(queryset, ids):
+    """
+    Проставляет order = 1..N объектам queryset в порядке ids.
+    ids должен содержать каждый объект queryset ровно один раз. Строки
+    блокируются на время транзакции, изменённые записываются одним bulk_update.
+    Возвращает число обновлённых объектов.
+    """
+    # bool - подкласс int, а int() молча обрезал бы 2.5 и принял бы '2'
+    if not isinstance(ids, (list, tuple)) or not all(type(pk) is int for pk in ids):
+        raise ReorderError('order must be a list of integer ids')
+    if len(set(ids)) != len(ids):
+        raise ReorderError('order contains duplicate ids')
+    with transaction.atomic():
+        objects = {obj.pk: obj for obj in queryset.select_for_update().only('id', 'order')}
+        if set(ids) != set(objects):
+            missing = sorted(set(objects) - set(ids))
+            unknown = sorted(set(ids) - set(objects))
+            raise ReorderError('order must list every id exactly once (missing: {}, unknown: {})'.format(
+                missing, unknown))
+        changed = []
+        for position, pk in enumerate(ids, start=1):
+            obj = objects[pk]
+            if obj.order != position:
+                obj.order = position
+                changed.append(obj)
+        queryset.model.objects.bulk_update(changed, ['order'])
+    return len(changed)
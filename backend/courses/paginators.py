@@ -0,0 +1,48 @@
+"""
+Пагинация без COUNT(*) по большим таблицам (для админки).
+
+На PostgreSQL число строк сначала оценивается планировщиком (EXPLAIN): если
+оценка не меньше EXACT_BELOW, она и используется как общее число - точный
+COUNT(*) по миллионам результатов тестов занял бы секунды. Небольшие
+выборки и другие СУБД считаются точно.
+"""
+import json
+
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+EXACT_BELOW = 10000
+
+
+def planner_estimate(queryset):
+    """
+    Оценка числа строк queryset по плану PostgreSQL или None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        # Пустые выборки (none(), pk__in=[]) SQL не строят
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query'):
+            estimate = planner_estimate(queryset)
+            if estimate is not None and estimate >= EXACT_BELOW:
+                return estimate
+        return super().count
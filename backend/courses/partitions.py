@@ -0,0 +1,228 @@
+"""
+Помесячное секционирование courses_testresult и архивация старых месяцев.
+
+На PostgreSQL таблица секционирована по created_at (PARTITION BY RANGE):
+по секции на месяц (courses_testresult_y2026m01, ...) и секция по умолчанию
+для строк, под которые месячной секции ещё нет. Первичный ключ - (id,
+created_at), так требует секционирование; внешних ключей на результаты нет
+(TestAttempt.result_id - просто число). Уникальность одного id СУБД не
+проверяет (уникальный индекс секционированной таблицы обязан включать
+created_at) - id выдаёт только последовательность, вставлять результаты с
+явным id нельзя. Запросы с условием на created_at PostgreSQL обходит только по
+нужным секциям.
+
+На остальных СУБД таблица обычная: создание секций ничего не делает, а
+архивация выгружает и удаляет строки месяца обычным DELETE.
+
+Архив месяца - gzip-файл JSONL со всеми полями результата. Счётчики
+results_count пересчитываются, таблицы лидеров не трогаются: лучший балл
+остаётся в рейтинге и после архивации.
+"""
+import datetime
+import gzip
+import json
+import os
+
+from django.db import connection, transaction
+
+from . import counters
+from .models import Course, Test, TestResult
+
+TABLE = 'courses_testresult'
+DEFAULT_PARTITION = TABLE + '_default'
+CHUNK_SIZE = 2000
+
+
+def is_partitioned(conn=None):
+    conn = conn or connection
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return '{}_y{:04d}m{:02d}'.format(TABLE, month.year, month.month)
+
+
+def _month_range(month):
+    # Границы в UTC: created_at хранится как timestamptz
+    start = datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc)
+    next_month = add_months(month, 1)
+    end = datetime.datetime(next_month.year, next_month.month, 1, tzinfo=datetime.timezone.utc)
+    return start, end
+
+
+def list_partitions(conn=None):
+    """
+    [(имя, месяц)] месячных секций по возрастанию; секция по умолчанию не входит.
+    """
+    conn = conn or connection
+    if not is_partitioned(conn):
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    prefix = TABLE + '_y'
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        year, month = name[len(prefix):].split('m')
+        partitions.append((name, datetime.date(int(year), int(month), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def create_partition(month, conn=None):
+    """
+    Создаёт секцию месяца, если её нет. Строки этого месяца, успевшие попасть
+    в секцию по умолчанию, переносятся в новую секцию. Возвращает True, если
+    секция создана.
+    """
+    conn = conn or connection
+    name = partition_name(month)
+    if any(existing == name for existing, _ in list_partitions(conn)):
+        return False
+    start, end = _month_range(month)
+    quote = conn.ops.quote_name
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(
+            quote(name), quote(TABLE)))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM {} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            'INSERT INTO {} SELECT * FROM moved'.format(quote(DEFAULT_PARTITION), quote(name)),
+            [start, end],
+        )
+        cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(
+            quote(TABLE), quote(name)), [start, end])
+    return True
+
+
+def ensure_partitions(months_ahead=3, conn=None):
+    """
+    Секции с текущего месяца на months_ahead вперёд. Возвращает имена созданных.
+    """
+    conn = conn or connection
+    if not is_partitioned(conn):
+        return []
+    current = month_start(datetime.date.today())
+    return [
+        partition_name(month)
+        for month in (add_months(current, offset) for offset in range(months_ahead + 1))
+        if create_partition(month, conn)
+    ]
+
+
+def _row(result):
+    return {
+        'id': result['id'],
+        'user_id': result['user_id'],
+        'test_id': result['test_id'],
+        'score': result['score'],
+        'answers': result['answers'],
+        'created_at': result['created_at'].isoformat(),
+    }
+
+
+def archive_month(month, directory):
+    """
+    Выгружает результаты месяца в <directory>/<имя секции>.jsonl.gz и удаляет их:
+    на PostgreSQL отсоединяет и удаляет секцию целиком, иначе - DELETE.
+    Если секции месяца нет, она сначала создаётся, и в неё переезжают строки
+    месяца из секции по умолчанию. Возвращает (путь к файлу, число строк).
+    """
+    name = partition_name(month)
+    partitioned = is_partitioned()
+    if partitioned:
+        create_partition(month)
+    start, end = _month_range(month)
+    results = TestResult.objects.filter(created_at__gte=start, created_at__lt=end)
+
+    path = os.path.join(directory, name + '.jsonl.gz')
+    partial = path + '.partial'
+    count = 0
+    test_ids = set()
+    with transaction.atomic():
+        rows = results.order_by('id').values('id', 'user_id', 'test_id', 'score', 'answers', 'created_at')
+        with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+            for row in rows.iterator(chunk_size=CHUNK_SIZE):
+                archive.write(json.dumps(_row(row), ensure_ascii=False) + '\n')
+                test_ids.add(row['test_id'])
+                count += 1
+        # Файл переименовывается до удаления строк: если удалить не удалось,
+        # архив просто будет перезаписан при следующем запуске
+        os.replace(partial, path)
+
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if partitioned:
+                cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(quote(TABLE), quote(name)))
+                cursor.execute('DROP TABLE {}'.format(quote(name)))
+            else:
+                # Без QuerySet.delete(): он вытащил бы все строки ради сигналов,
+                # а счётчики всё равно пересчитываются ниже
+                cursor.execute('DELETE FROM {} WHERE created_at >= %s AND created_at < %s'.format(quote(TABLE)),
+                               [start, end])
+        if test_ids:
+            courses = Course.objects.filter(pk__in=_course_ids(test_ids))
+            counters.recount(courses)
+    return path, count
+
+
+def _course_ids(test_ids):
+    rows = Test.objects.filter(pk__in=test_ids).values_list('course_id', 'lesson__course_id')
+    return {course_id or lesson_course_id for course_id, lesson_course_id in rows} - {None}
+
+
+def _default_partition_months(cutoff):
+    # Строки месяцев, для которых секцию не создали вовремя
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {} WHERE created_at < %s".format(
+                connection.ops.quote_name(DEFAULT_PARTITION)),
+            [_month_range(cutoff)[0]],
+        )
+        return {month_start(row[0]) for row in cursor.fetchall()}
+
+
+def cold_months(before):
+    """
+    Месяцы, целиком лежащие раньше before, в которых есть что архивировать.
+    """
+    cutoff = month_start(before)
+    if is_partitioned():
+        months = {month for _, month in list_partitions() if month < cutoff}
+        months.update(_default_partition_months(cutoff))
+        return sorted(months)
+    first = TestResult.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first is None:
+        return []
+    months = []
+    month = month_start(first)
+    while month < cutoff:
+        start, end = _month_range(month)
+        if TestResult.objects.filter(created_at__gte=start, created_at__lt=end).exists():
+            months.append(month)
+        month = add_months(month, 1)
+    return months
@@ -0,0 +1,265 @@
+"""
+Кэш сериализованных ответов горячих эндпоинтов чтения: курс
+(CourseDetailView), уроки курса с секциями (LessonListCreateView,
+get_lessons_for_course) и тест со всеми вопросами и ответами (get_test_by_id).
+
+Ключ ответа содержит версию курса или теста. Любое сохранение или удаление
+курса, урока, секции, теста, вопроса или ответа после коммита меняет версию,
+и старые ответы просто перестают читаться. Запросы с ?fields= и ?expand=
+кэш не используют. Версия - случайная строка, поэтому после вытеснения
+ключа версии из кэша устаревший ответ не может снова совпасть.
+
+Секции, вопросы и ответы удаляются без post_delete (см. models.rows_deleted),
+версии сбрасываются одним запросом на всё удаление. Ответ курса содержит
+автора, поэтому изменение пользователя сбрасывает версии его курсов.
+bulk-операции (rendering.render_all, counters.recount, question_bank)
+сбрасывают версии сами через invalidate_many().
+
+results_count теста меняется с каждым результатом, поэтому в ответ из кэша
+он подставляется из БД отдельным запросом по первичному ключу.
+
+Версии должны быть общими для всех воркеров, поэтому с LocMemCache кэш
+ответов выключен (кроме PAYLOAD_CACHE_ALLOW_LOCAL для одного процесса,
+например runserver), а warm_cache отказывается работать.
+
+warm() заранее строит ответы для самых активных курсов и тестов (по числу
+недавних результатов) - см. команду warm_cache.
+"""
+import datetime
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.test import RequestFactory
+from django.utils import timezone
+
+from . import fieldsets
+from .models import Answer, Course, Lesson, Question, Section, Test, TestResult, rows_deleted
+from .serializers import CourseSerializer, LessonSerializer, TestSerializer
+from users.serializers import UserSerializer
+
+COURSE = 'course'
+LESSONS = 'lessons'
+TEST = 'test'
+
+
+def is_local():
+    """
+    Кэш живёт в памяти процесса: у каждого воркера свои версии и ответы.
+    """
+    return isinstance(caches['default'], LocMemCache)
+
+
+def enabled():
+    return not is_local() or getattr(settings, 'PAYLOAD_CACHE_ALLOW_LOCAL', False)
+
+
+def _timeout():
+    return getattr(settings, 'PAYLOAD_CACHE_SECONDS', 600)
+
+
+def _version_key(scope, pk):
+    return 'payload-version:{}:{}'.format(scope, pk)
+
+
+def _version(scope, pk):
+    key = _version_key(scope, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _base(request):
+    # Поля файлов сериализуются в абсолютные URL, поэтому ответы разных
+    # хостов кэшируются отдельно
+    return request.build_absolute_uri('/') if request is not None else ''
+
+
+def _build_course(pk, request):
+    course = Course.objects.select_related('author').get(pk=pk)
+    return CourseSerializer(course, context={'request': request}).data
+
+
+def _build_lessons(pk, request):
+    lessons = Lesson.objects.filter(course_id=pk).order_by('order', 'id').prefetch_related('sections')
+    return LessonSerializer(lessons, many=True, context={'request': request}).data
+
+
+def _build_test(pk, request):
+    test = Test.objects.prefetch_related('questions__answers').get(pk=pk)
+    return TestSerializer(test, context={'request': request}).data
+
+
+KINDS = {
+    # вид ответа: (чья версия, построение)
+    COURSE: (COURSE, _build_course),
+    LESSONS: (COURSE, _build_lessons),
+    TEST: (TEST, _build_test),
+}
+
+
+def cacheable(request):
+    return enabled() and request.method in ('GET', 'HEAD') and fieldsets.requested(request) == (None, None)
+
+
+def _key(kind, pk, request):
+    scope, _ = KINDS[kind]
+    return 'payload:{}:{}:{}:{}'.format(kind, pk, _version(scope, pk), _base(request))
+
+
+def build(kind, pk, request=None):
+    """
+    Строит ответ и кладёт его в кэш. DoesNotExist пробрасывается.
+    """
+    _, builder = KINDS[kind]
+    # Версия читается до построения: если данные изменятся во время
+    # сериализации, ответ ляжет под уже устаревшей версией
+    key = _key(kind, pk, request)
+    data = builder(pk, request)
+    cache.set(key, data, _timeout())
+    return data
+
+
+def get(kind, pk, request=None):
+    data = cache.get(_key(kind, pk, request))
+    if data is None:
+        data = build(kind, pk, request)
+    elif kind == TEST:
+        data = dict(data)
+        data['results_count'] = Test.objects.filter(pk=pk).values_list('results_count', flat=True).first() or 0
+    return data
+
+
+def invalidate(course_id=None, test_id=None):
+    """
+    Сбрасывает ответы курса и/или теста после коммита текущей транзакции.
+    """
+    invalidate_many(course_ids=[course_id] if course_id is not None else (),
+                    test_ids=[test_id] if test_id is not None else ())
+
+
+def invalidate_many(course_ids=(), test_ids=()):
+    keys = [_version_key(COURSE, pk) for pk in set(course_ids) if pk is not None]
+    keys += [_version_key(TEST, pk) for pk in set(test_ids) if pk is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None))
+
+
+def _test_course_id(test):
+    if test.course_id:
+        return test.course_id
+    return Lesson.objects.filter(pk=test.lesson_id).values_list('course_id', flat=True).first()
+
+
+def _on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is Course:
+        invalidate(course_id=instance.pk)
+    elif sender is Lesson:
+        invalidate(course_id=instance.course_id)
+    elif sender is Section:
+        invalidate(course_id=Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first())
+    elif sender is Test:
+        invalidate(course_id=_test_course_id(instance), test_id=instance.pk)
+    elif sender is Question:
+        invalidate(test_id=instance.test_id)
+    elif sender is Answer:
+        invalidate(test_id=Question.objects.filter(pk=instance.question_id).values_list('test_id', flat=True).first())
+
+
+def _on_rows_deleted(sender, rows, **kwargs):
+    if sender is Section:
+        lesson_ids = {row['lesson_id'] for row in rows}
+        invalidate_many(course_ids=Lesson.objects.filter(pk__in=lesson_ids).values_list('course_id', flat=True))
+    elif sender is Question:
+        invalidate_many(test_ids=[row['test_id'] for row in rows])
+    elif sender is Answer:
+        question_ids = {row['question_id'] for row in rows}
+        invalidate_many(test_ids=Question.objects.filter(pk__in=question_ids).values_list('test_id', flat=True))
+
+
+def _on_author_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход меняет только last_login, которого в ответе нет
+    if raw or (update_fields is not None and not set(update_fields) & set(UserSerializer.Meta.fields)):
+        return
+    invalidate_many(course_ids=Course.objects.filter(author=instance).values_list('pk', flat=True))
+
+
+def connect():
+    for model in (Course, Lesson, Section, Test, Question, Answer):
+        post_save.connect(_on_change, sender=model, dispatch_uid='payloads-save-' + model.__name__)
+    for model in (Course, Lesson, Test):
+        post_delete.connect(_on_change, sender=model, dispatch_uid='payloads-delete-' + model.__name__)
+    rows_deleted.connect(_on_rows_deleted, dispatch_uid='payloads-rows-deleted')
+    post_save.connect(_on_author_change, sender=get_user_model(), dispatch_uid='payloads-author-save')
+
+
+def popular(limit=50, days=7):
+    """
+    Самые активные тесты и курсы за последние days дней по числу результатов:
+    ([test_id, ...], [course_id, ...]).
+    """
+    since = timezone.now() - datetime.timedelta(days=days)
+    rows = list(
+        TestResult.objects.filter(created_at__gte=since).order_by().values('test_id', 'test__course_id',
+                                                                             'test__lesson__course_id')
+        .annotate(total=Count('id')).order_by('-total')[:limit]
+    )
+    tests = [row['test_id'] for row in rows]
+    totals = {}
+    for row in rows:
+        course_id = row['test__course_id'] or row['test__lesson__course_id']
+        if course_id is not None:
+            totals[course_id] = totals.get(course_id, 0) + row['total']
+    courses = sorted(totals, key=totals.get, reverse=True)
+    return tests, courses
+
+
+def _request(base_url):
+    if not base_url:
+        return None
+    scheme, _, host = base_url.partition('://')
+    host, _, port = host.rstrip('/').partition(':')
+    return RequestFactory().get('/', SERVER_NAME=host, SERVER_PORT=port or ('443' if scheme == 'https' else '80'),
+                                secure=scheme == 'https')
+
+
+def _build_timed(kind, pk, request):
+    started = time.perf_counter()
+    try:
+        build(kind, pk, request)
+        return kind, pk, time.perf_counter() - started, None
+    except Exception as exc:
+        return kind, pk, time.perf_counter() - started, exc
+    finally:
+        # Каждый поток держит своё соединение - закрываем, чтобы не копились
+        connection.close()
+
+
+def warm(limit=50, days=7, workers=4, base_url=None):
+    """
+    Строит ответы для популярных курсов (курс и его уроки) и тестов в
+    workers потоках. Возвращает (список (вид, id, секунды, ошибка), общее время).
+    """
+    started = time.perf_counter()
+    tests, courses = popular(limit=limit, days=days)
+    jobs = [(COURSE, pk) for pk in courses] + [(LESSONS, pk) for pk in courses] + [(TEST, pk) for pk in tests]
+    request = _request(base_url if base_url is not None else getattr(settings, 'PAYLOAD_CACHE_BASE_URL', ''))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(lambda job: _build_timed(job[0], job[1], request), jobs))
+    return results, time.perf_counter() - started
+
+
+def warm_after_migrate(sender, **kwargs):
+    if getattr(settings, 'PAYLOAD_WARMUP_ON_MIGRATE', False) and not is_local():
+        warm(workers=getattr(settings, 'PAYLOAD_WARMUP_WORKERS', 4))
@@ -0,0 +1,160 @@
+"""
+Массовое редактирование вопросов теста и импорт банка вопросов.
+
+apply_batch() создаёт, изменяет и удаляет вопросы теста вместе с ответами
+в одной транзакции: новые вопросы и ответы вставляются bulk_create,
+изменённые сохраняются bulk_update, удалённые - одним DELETE на таблицу.
+
+import_questions() читает строки из courses.question_import (CSV, GIFT,
+Moodle XML) и вставляет корректные вопросы пачками по BATCH_SIZE, а ошибки
+проверки собирает по номерам строк. Файл не читается в память целиком.
+
+bulk-операции не посылают сигналов, поэтому Test.questions_count, кэш
+ответа теста (courses.payloads) и закэшированный список вопросов для попыток
+(courses.attempts) обновляются здесь явно.
+"""
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from . import attempts, counters, payloads
+from .models import Answer, Question, Test
+from .serializers import BatchQuestionSerializer
+
+BATCH_SIZE = 500
+# Больше ошибок в ответе не перечисляем, только считаем
+MAX_REPORTED_ERRORS = 1000
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _answers(question, answers_data):
+    return [Answer(question=question, text=a['text'], is_correct=a.get('is_correct', False)) for a in answers_data]
+
+
+def _create(test, items):
+    questions = Question.objects.bulk_create([Question(test=test, text=item['text']) for item in items],
+                                             batch_size=BATCH_SIZE)
+    answers = []
+    for question, item in zip(questions, items):
+        answers.extend(_answers(question, item.get('answers', [])))
+    Answer.objects.bulk_create(answers, batch_size=BATCH_SIZE)
+    counters.adjust(Test, test.pk, 'questions_count', len(questions))
+    return questions
+
+
+def _missing(ids, found):
+    missing = sorted(set(ids) - set(found))
+    if missing:
+        raise BatchError('Questions {} not found in test'.format(missing))
+
+
+def _update(test, items):
+    if not items:
+        return 0
+    questions = Question.objects.select_for_update().filter(test=test, pk__in=[item['id'] for item in items])
+    questions = {question.pk: question for question in questions}
+    _missing([item['id'] for item in items], questions)
+    for item in items:
+        questions[item['id']].text = item['text']
+    Question.objects.bulk_update(list(questions.values()), ['text'], batch_size=BATCH_SIZE)
+
+    # Ответы меняются только у вопросов, где список answers передан: ответы с
+    # id обновляются, без id - создаются, не упомянутые - удаляются
+    replaced = {item['id']: item['answers'] for item in items if 'answers' in item}
+    existing = {}
+    for answer in Answer.objects.filter(question_id__in=replaced):
+        existing.setdefault(answer.question_id, {})[answer.pk] = answer
+    changed, created, kept = [], [], set()
+    for question_id, answers_data in replaced.items():
+        own = existing.get(question_id, {})
+        for data in answers_data:
+            if 'id' not in data:
+                created.extend(_answers(questions[question_id], [data]))
+                continue
+            answer = own.get(data['id'])
+            if answer is None:
+                raise BatchError('Answer {} does not belong to question {}'.format(data['id'], question_id))
+            answer.text = data['text']
+            answer.is_correct = data.get('is_correct', False)
+            changed.append(answer)
+            kept.add(answer.pk)
+    stale = [pk for own in existing.values() for pk in own if pk not in kept]
+    if stale:
+        Answer.objects.filter(pk__in=stale).delete()
+    Answer.objects.bulk_update(changed, ['text', 'is_correct'], batch_size=BATCH_SIZE)
+    Answer.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    return len(questions)
+
+
+def _delete(test, ids):
+    if not ids:
+        return 0
+    found = list(Question.objects.filter(test=test, pk__in=ids).values_list('pk', flat=True))
+    _missing(ids, found)
+    Question.objects.filter(pk__in=found).delete()
+    return len(found)
+
+
+def apply_batch(test, create=(), update=(), delete=()):
+    """
+    Применяет проверенные данные QuestionBatchSerializer к тесту.
+    Возвращает {'created': [id, ...], 'updated': n, 'deleted': n}.
+    Ссылки на чужие вопросы и ответы дают BatchError, и транзакция
+    откатывается целиком.
+    """
+    with transaction.atomic(), counters.deferred():
+        deleted = _delete(test, list(delete))
+        updated = _update(test, list(update))
+        created = _create(test, list(create))
+        payloads.invalidate(test_id=test.pk)
+        attempts.invalidate_questions([test.pk])
+    return {'created': [question.pk for question in created], 'updated': updated, 'deleted': deleted}
+
+
+def _validate(serializer, data):
+    # Один сериализатор на весь импорт: поля строятся один раз, а не на каждую строку
+    try:
+        cleaned = serializer.run_validation(data)
+    except ValidationError as exc:
+        return None, exc.detail
+    cleaned.pop('id', None)
+    if not cleaned.get('answers'):
+        return None, {'answers': ['Question must have answers.']}
+    return cleaned, None
+
+
+def import_questions(test, rows, dry_run=False):
+    """
+    Добавляет в тест вопросы из rows - итератора (номер, данные, ошибка)
+    из courses.question_import. Строки с ошибками пропускаются и попадают в
+    отчёт, остальные вставляются пачками. С dry_run ничего не сохраняет.
+    Ошибка формата файла (ImportFormatError) откатывает весь импорт.
+    """
+    report = {'created': 0, 'error_count': 0, 'errors': []}
+
+    def reject(number, errors):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'errors': errors})
+
+    serializer = BatchQuestionSerializer()
+    with transaction.atomic(), counters.deferred():
+        batch = []
+        for number, data, error in rows:
+            if error is None:
+                data, error = _validate(serializer, data)
+            if error is not None:
+                reject(number, error)
+                continue
+            batch.append(data)
+            if len(batch) >= BATCH_SIZE:
+                report['created'] += len(batch) if dry_run else len(_create(test, batch))
+                batch = []
+        if batch:
+            report['created'] += len(batch) if dry_run else len(_create(test, batch))
+        if report['created'] and not dry_run:
+            payloads.invalidate(test_id=test.pk)
+            attempts.invalidate_questions([test.pk])
+    return report
@@ -0,0 +1,273 @@
+"""
+Потоковое чтение банков вопросов: CSV, GIFT и Moodle XML.
+
+Каждый читатель принимает бинарный файл (загрузку Django или open(..., 'rb'))
+и выдаёт по одной записи (номер, данные, ошибка) на вопрос, не читая файл
+целиком. Данные - {'text': ..., 'answers': [{'text': ..., 'is_correct': ...}]},
+ошибка - {'поле': [сообщения]} для вопроса, который нельзя разобрать (тогда
+данные None). Номер - строка файла (для CSV - последняя строка записи, для
+GIFT - первая строка блока), а для XML - порядковый номер элемента <question>.
+
+Ошибки, после которых файл дальше читать нельзя (не UTF-8, нет заголовка
+CSV, битый XML), поднимают ImportFormatError.
+
+CSV: первая строка - заголовок с колонками question, answer* (answer1,
+answer2, ...; пустые ячейки пропускаются) и correct - номера правильных
+ответов через ';' или ',', считая с 1.
+
+GIFT: поддерживаются вопросы с выбором ответа (=верный ~неверный, в том
+числе с весами ~%50%), верно/неверно ({T}, {F}) и короткий ответ ({=a =b}).
+Названия ::...::, комментарии //, $CATEGORY и отзывы #... пропускаются.
+
+Moodle XML: типы multichoice, truefalse и shortanswer; ответ с fraction
+больше нуля считается правильным, HTML из текстов убирается.
+"""
+import codecs
+import csv
+import html
+import re
+from xml.etree import ElementTree
+
+from django.utils.html import strip_tags
+
+CSV = 'csv'
+GIFT = 'gift'
+XML = 'xml'
+EXTENSIONS = {'.csv': CSV, '.gift': GIFT, '.txt': GIFT, '.xml': XML}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect(filename):
+    """
+    Формат по расширению имени файла или None.
+    """
+    name = (filename or '').lower()
+    for extension, kind in EXTENSIONS.items():
+        if name.endswith(extension):
+            return kind
+    return None
+
+
+def _lines(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for raw in stream:
+            yield decoder.decode(raw)
+        tail = decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError('File must be UTF-8 encoded')
+    if tail:
+        yield tail
+
+
+def _question(text, answers):
+    return {'text': text, 'answers': [{'text': t, 'is_correct': c} for t, c in answers]}
+
+
+def _error(message, field='non_field_errors'):
+    return {field: [message]}
+
+
+# --- CSV ---
+
+def _cell(row, index):
+    return row[index].strip() if index is not None and index < len(row) else ''
+
+
+def read_csv(stream):
+    reader = csv.reader(_lines(stream))
+    try:
+        header = [name.strip().lower() for name in next(reader, [])]
+    except csv.Error as exc:
+        raise ImportFormatError('Invalid CSV: {}'.format(exc))
+    if 'question' not in header:
+        raise ImportFormatError('CSV header must contain a "question" column')
+    text_column = header.index('question')
+    answer_columns = [i for i, name in enumerate(header) if name.startswith('answer')]
+    correct_column = header.index('correct') if 'correct' in header else None
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            raise ImportFormatError('Invalid CSV at line {}: {}'.format(reader.line_num, exc))
+        number = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        answers = [_cell(row, i) for i in answer_columns if _cell(row, i)]
+        try:
+            correct = {int(n) for n in re.split(r'[;,\s]+', _cell(row, correct_column)) if n}
+        except ValueError:
+            yield number, None, _error('Answer numbers must be integers.', 'correct')
+            continue
+        if any(n < 1 or n > len(answers) for n in correct):
+            yield number, None, _error('Answer number out of range.', 'correct')
+            continue
+        yield number, _question(_cell(row, text_column), [(a, i in correct) for i, a in enumerate(answers, 1)]), None
+
+
+# --- GIFT ---
+
+def _find(text, chars, start=0):
+    i = start
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] in chars:
+            return i
+        i += 1
+    return -1
+
+
+def _unescape(text):
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), text).strip()
+
+
+def _gift_text(text):
+    text = text.strip()
+    if text.startswith('::'):
+        end = text.find('::', 2)
+        text = text[end + 2:] if end != -1 else text
+    text = text.lstrip()
+    match = re.match(r'\[(html|moodle|plain|markdown)\]', text)
+    if match:
+        text = text[match.end():]
+        if match.group(1) == 'html':
+            text = html.unescape(strip_tags(text))
+    return text
+
+
+def _gift_answers(body):
+    body = body.strip()
+    flag = body.split('#', 1)[0].strip().upper()
+    if flag in ('T', 'TRUE', 'F', 'FALSE'):
+        truth = flag.startswith('T')
+        return [('True', truth), ('False', not truth)]
+    if not body:
+        raise ValueError('Essay questions are not supported.')
+    if body.startswith('#'):
+        raise ValueError('Numerical questions are not supported.')
+    answers = []
+    start = _find(body, '=~')
+    if start != 0:
+        raise ValueError('Answers must start with "=" or "~".')
+    while start != -1:
+        end = _find(body, '=~', start + 1)
+        token = body[start + 1:end if end != -1 else len(body)]
+        feedback = _find(token, '#')
+        if feedback != -1:
+            token = token[:feedback]
+        if '->' in token:
+            raise ValueError('Matching questions are not supported.')
+        weight = re.match(r'\s*%(-?\d+(?:\.\d+)?)%', token)
+        if weight:
+            token = token[weight.end():]
+            correct = float(weight.group(1)) > 0
+        else:
+            correct = body[start] == '='
+        answers.append((_unescape(token), correct))
+        start = end
+    return answers
+
+
+def _gift_block(lines):
+    block = '\n'.join(lines)
+    opening = _find(block, '{')
+    if opening == -1:
+        raise ValueError('Question has no answers block.')
+    closing = _find(block, '}', opening)
+    if closing == -1:
+        raise ValueError('Answers block is not closed.')
+    before, after = _gift_text(block[:opening]), block[closing + 1:].strip()
+    # Вопрос с пропуском в середине: "Столица {=Парижа} - ..."
+    text = _unescape(before + (' _____ ' + after if after else ''))
+    return _question(text, _gift_answers(block[opening + 1:closing]))
+
+
+def read_gift(stream):
+    lines, number = [], None
+    for number_in_file, line in enumerate(_lines(stream), 1):
+        stripped = line.strip()
+        if stripped.startswith('//') or stripped.startswith('$CATEGORY'):
+            continue
+        if stripped:
+            if not lines:
+                number = number_in_file
+            lines.append(line.rstrip('\r\n'))
+            continue
+        if lines:
+            yield _gift_parsed(number, lines)
+            lines = []
+    if lines:
+        yield _gift_parsed(number, lines)
+
+
+def _gift_parsed(number, lines):
+    try:
+        return number, _gift_block(lines), None
+    except ValueError as exc:
+        return number, None, _error(str(exc))
+
+
+# --- Moodle XML ---
+
+XML_TYPES = ('multichoice', 'truefalse', 'shortanswer')
+
+
+def _xml_text(element):
+    if element is None:
+        return ''
+    text = element.findtext('text') or ''
+    if element.get('format', 'html') in ('html', 'moodle_auto_format'):
+        text = html.unescape(strip_tags(text))
+    return text.strip()
+
+
+def _xml_question(element):
+    kind = element.get('type')
+    if kind not in XML_TYPES:
+        raise ValueError('Question type "{}" is not supported.'.format(kind))
+    answers = []
+    for answer in element.findall('answer'):
+        try:
+            fraction = float(answer.get('fraction', '0'))
+        except ValueError:
+            raise ValueError('Invalid answer fraction "{}".'.format(answer.get('fraction')))
+        answers.append((_xml_text(answer), fraction > 0))
+    return _question(_xml_text(element.find('questiontext')), answers)
+
+
+def read_xml(stream):
+    number, root = 0, None
+    try:
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = element
+            if event != 'end' or element.tag != 'question':
+                continue
+            if element.get('type') != 'category':
+                number += 1
+                try:
+                    yield number, _xml_question(element), None
+                except ValueError as exc:
+                    yield number, None, _error(str(exc))
+            # Разобранные вопросы не копятся в дереве
+            root.clear()
+    except ElementTree.ParseError as exc:
+        raise ImportFormatError('Invalid XML: {}'.format(exc))
+
+
+READERS = {CSV: read_csv, GIFT: read_gift, XML: read_xml}
+
+
+def read(stream, kind):
+    if kind is None:
+        raise ImportFormatError('Cannot detect file format, expected one of: {}'.format(', '.join(READERS)))
+    if kind not in READERS:
+        raise ImportFormatError('Unknown format "{}", expected one of: {}'.format(kind, ', '.join(READERS)))
+    return READERS[kind](stream)
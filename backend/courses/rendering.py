@@ -0,0 +1,191 @@
+"""
+Серверный рендеринг Section.content в HTML.
+
+Поддерживается небольшое подмножество Markdown: заголовки (#), абзацы,
+переносы строк, списки (-, *, 1.), блоки кода (```), `код`, **жирный**,
+*курсив* и ссылки [текст](http://...). Весь текст сначала экранируется, а
+разметка добавляется уже поверх экранированного - поэтому HTML из контента
+никогда не попадает в результат как есть.
+
+HTML хранится в Section.content_html вместе с хэшем исходника
+(content_hash) и пересчитывается только при изменении content или версии
+рендерера (RENDERER_VERSION) - см. apply() и команду render_sections.
+"""
+import hashlib
+import re
+
+from django.db.models.signals import pre_save
+from django.utils.html import escape
+
+from . import payloads
+from .models import Section
+
+# Увеличить при изменении правил рендеринга: render_sections перерисует все секции
+RENDERER_VERSION = '2'
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^\s*[-*]\s+(.*)$')
+_NUMBERED = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+_CODE = re.compile(r'`([^`]+)`')
+# Закрывающие ** - последние в серии звёздочек: **a *b*** -> <strong>a <em>b</em></strong>
+_BOLD = re.compile(r'\*\*(.+?)\*\*(?!\*)')
+_ITALIC = re.compile(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])')
+# Ссылки разбираются уже в экранированном тексте, поэтому кавычек и угловых
+# скобок в адресе быть не может. Вынутый код (\x00) в адрес не попадает.
+_LINK = re.compile(r'\[([^\]]+)\]\((https?://[^\s)\x00]+)\)')
+
+
+def content_hash(content):
+    return hashlib.sha256((RENDERER_VERSION + '\0' + (content or '')).encode('utf-8')).hexdigest()
+
+
+def _emphasis(text):
+    text = _BOLD.sub(r'<strong>\1</strong>', text)
+    return _ITALIC.sub(r'<em>\1</em>', text)
+
+
+def _inline(text):
+    # Код и ссылки вынимаются первыми: внутри кода и адреса ссылки остальная
+    # разметка не срабатывает
+    stashed = []
+
+    def stash(html):
+        stashed.append(html)
+        return '\x00{}\x00'.format(len(stashed) - 1)
+
+    text = _CODE.sub(lambda match: stash('<code>{}</code>'.format(match.group(1))),
+                     escape(text.replace('\x00', '')))
+    text = _LINK.sub(lambda match: stash('<a href="{}" rel="nofollow noopener" target="_blank">{}</a>'.format(
+        match.group(2), _emphasis(match.group(1)))), text)
+    text = _emphasis(text)
+    # Текст ссылки может содержать вынутый код
+    while '\x00' in text:
+        text = re.sub('\x00(\\d+)\x00', lambda match: stashed[int(match.group(1))], text)
+    return text
+
+
+def render(content):
+    """
+    HTML для текста секции.
+    """
+    lines = (content or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    blocks = []
+    paragraph = []
+    items = []
+    list_tag = None
+    code = None
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append('<p>{}</p>'.format('<br>'.join(_inline(line) for line in paragraph)))
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if items:
+            blocks.append('<{0}>{1}</{0}>'.format(list_tag, ''.join('<li>{}</li>'.format(item) for item in items)))
+            items.clear()
+        list_tag = None
+
+    for line in lines:
+        if code is not None:
+            if line.strip().startswith('```'):
+                blocks.append('<pre><code>{}</code></pre>'.format(escape('\n'.join(code))))
+                code = None
+            else:
+                code.append(line)
+            continue
+        if line.strip().startswith('```'):
+            close_paragraph()
+            close_list()
+            code = []
+            continue
+        if not line.strip():
+            close_paragraph()
+            close_list()
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            blocks.append('<h{0}>{1}</h{0}>'.format(level, _inline(heading.group(2).strip())))
+            continue
+        bullet = _BULLET.match(line)
+        numbered = None if bullet else _NUMBERED.match(line)
+        if bullet or numbered:
+            close_paragraph()
+            tag = 'ul' if bullet else 'ol'
+            if list_tag != tag:
+                close_list()
+                list_tag = tag
+            items.append(_inline((bullet or numbered).group(1)))
+            continue
+        close_list()
+        paragraph.append(line.strip())
+
+    if code is not None:
+        # Незакрытый блок кода отображается до конца текста
+        blocks.append('<pre><code>{}</code></pre>'.format(escape('\n'.join(code))))
+    close_paragraph()
+    close_list()
+    return '\n'.join(blocks)
+
+
+def apply(section, force=False):
+    """
+    Перерисовывает content_html, если content изменился. Возвращает True,
+    если секция обновлена. Нужен там, где секции создаются без save()
+    (bulk_create): сигнал pre_save там не срабатывает.
+    """
+    digest = content_hash(section.content)
+    if not force and section.content_hash == digest:
+        return False
+    section.content_html = render(section.content)
+    section.content_hash = digest
+    return True
+
+
+def _on_section_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'content' not in update_fields):
+        return
+    if apply(instance) and update_fields is not None and 'content_html' not in update_fields:
+        # save(update_fields=[...]) сам html не запишет
+        Section.objects.filter(pk=instance.pk).update(
+            content_html=instance.content_html, content_hash=instance.content_hash)
+
+
+def connect():
+    pre_save.connect(_on_section_save, sender=Section, dispatch_uid='rendering-section-save')
+
+
+def render_all(queryset=None, force=False, batch_size=500):
+    """
+    Перерисовывает секции с устаревшим HTML. Возвращает число обновлённых.
+    queryset может быть и от исторической модели миграции.
+    """
+    queryset = (queryset if queryset is not None else Section.objects.all()) \
+        .only('id', 'lesson_id', 'content', 'content_hash').order_by('id')
+    model = queryset.model
+    updated = 0
+    batch = []
+    lesson_ids = set()
+
+    def save(batch):
+        model.objects.bulk_update(batch, ['content_html', 'content_hash'])
+        lesson_ids.update(section.lesson_id for section in batch)
+        return len(batch)
+
+    for section in queryset.iterator(chunk_size=batch_size):
+        if apply(section, force=force):
+            batch.append(section)
+        if len(batch) >= batch_size:
+            updated += save(batch)
+            batch = []
+    if batch:
+        updated += save(batch)
+    # bulk_update не посылает сигналов, кэш ответов уроков сбрасываем сами
+    if lesson_ids:
+        lessons = model._meta.get_field('lesson').related_model.objects.filter(pk__in=lesson_ids)
+        payloads.invalidate_many(course_ids=lessons.values_list('course_id', flat=True).distinct())
+    return updated
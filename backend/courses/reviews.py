@@ -0,0 +1,109 @@
+"""
+Интервальное повторение вопросов (алгоритм SM-2).
+
+После каждого результата теста ответы проверяются на сервере: вопросы с
+ошибкой попадают в очередь пользователя (или возвращаются в её начало), а
+уже стоящие в очереди и решённые верно откладываются на растущий интервал.
+Верно решённые вопросы, которых нет в очереди, в неё не добавляются.
+
+Очередь - таблица ReviewItem с индексом (user, due_at), так что выборка
+"следующие N к повторению" - один проход по диапазону индекса независимо от
+размера очереди.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .exports import correct_answers_by_question, grade_answers
+from .models import ReviewItem, TestResult
+
+MIN_EASE = 1.3
+# Оценки SM-2 (0-5), которые ставятся по ответу в тесте или на повторении
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+
+
+def schedule(item, quality, now):
+    """
+    Пересчитывает интервал и дату повторения item по оценке quality (0-5).
+    """
+    if quality < 3:
+        item.repetitions = 0
+        item.interval = 1
+        item.lapses += 1
+    else:
+        item.repetitions += 1
+        if item.repetitions == 1:
+            item.interval = 1
+        elif item.repetitions == 2:
+            item.interval = 6
+        else:
+            item.interval = round(item.interval * item.ease_factor)
+    penalty = 5 - quality
+    item.ease_factor = max(MIN_EASE, item.ease_factor + 0.1 - penalty * (0.08 + penalty * 0.02))
+    item.due_at = now + datetime.timedelta(days=item.interval)
+    item.last_reviewed_at = now
+    return item
+
+
+@transaction.atomic
+def record_result(result):
+    """
+    Обновляет очередь пользователя по ответам из результата теста.
+    """
+    graded = grade_answers(correct_answers_by_question(result.test_id), result.answers)
+    if not graded:
+        return
+    now = timezone.now()
+    existing = {
+        item.question_id: item
+        for item in ReviewItem.objects.select_for_update().filter(user_id=result.user_id, question_id__in=graded)
+    }
+    changed, created = [], []
+    for question_id, correct in graded.items():
+        quality = QUALITY_CORRECT if correct else QUALITY_WRONG
+        item = existing.get(question_id)
+        if item is not None:
+            changed.append(schedule(item, quality, now))
+        elif not correct:
+            created.append(schedule(ReviewItem(user_id=result.user_id, question_id=question_id, due_at=now),
+                                    quality, now))
+    if changed:
+        ReviewItem.objects.bulk_update(
+            changed, ['ease_factor', 'interval', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at'])
+    if created:
+        # Параллельная отправка могла уже создать строку - тогда её просто пропускаем
+        ReviewItem.objects.bulk_create(created, ignore_conflicts=True)
+
+
+def _on_result_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_result(instance)
+
+
+def connect():
+    post_save.connect(_on_result_saved, sender=TestResult, dispatch_uid='reviews-test-results')
+
+
+def due_items(user, limit=20, now=None):
+    """
+    Вопросы, которые пора повторить, начиная с самых просроченных.
+    """
+    now = now or timezone.now()
+    return ReviewItem.objects.filter(user=user, due_at__lte=now).order_by('due_at')[:limit]
+
+
+def review(item, answer_ids=None, quality=None):
+    """
+    Ответ на повторении: либо выбранные ответы (проверяются как в тесте),
+    либо самооценка quality 0-5.
+    """
+    if quality is None:
+        question = item.question
+        correct = {question.id: set(question.answers.filter(is_correct=True).values_list('id', flat=True))}
+        quality = QUALITY_CORRECT if grade_answers(correct, {question.id: answer_ids})[question.id] else QUALITY_WRONG
+    schedule(item, quality, timezone.now())
+    item.save(update_fields=['ease_factor', 'interval', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at'])
+    return item
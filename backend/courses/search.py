@@ -0,0 +1,228 @@
+"""
+Полнотекстовый поиск по курсам, урокам и секциям.
+
+На PostgreSQL используются generated-колонки search_vector с GIN-индексами
+(см. миграцию 0005_search_index), на SQLite - FTS5-таблица courses_search,
+которую поддерживают триггеры. Для остальных СУБД остаётся медленный
+запасной вариант через icontains.
+"""
+import re
+from html import escape
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Course, Lesson, Section
+
+KINDS = ('course', 'lesson', 'section')
+MAX_LIMIT = 50
+
+# Служебные символы-маркеры подсветки: СУБД вставляет их вокруг совпадений,
+# а после экранирования HTML мы заменяем их на <mark>.
+_START, _STOP = '\x02', '\x03'
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# rowid в FTS5-таблице: id * 4 + код вида объекта, чтобы обновление и
+# удаление шли по rowid, а не полным сканом виртуальной таблицы.
+_SQLITE_KIND_CODES = {'course': 1, 'lesson': 2, 'section': 3}
+
+# Триггеры ссылаются только на свою таблицу и courses_search: при пересоздании
+# таблицы на SQLite триггер на другую таблицу ломает переименование.
+# Для секций course_id не хранится и берётся JOIN-ом при поиске.
+_SQLITE_SOURCES = {
+    'course': ('courses_course', 'new.id', 'NULL', 'new.title', 'new.description', ('title', 'description')),
+    'lesson': ('courses_lesson', 'new.course_id', 'new.id', 'new.title', 'new.description',
+               ('title', 'description', 'course_id')),
+    'section': ('courses_section', 'NULL', 'new.lesson_id', 'new.title', 'new.content',
+                ('title', 'content', 'lesson_id')),
+}
+
+
+def _sqlite_triggers():
+    for kind, (table, course_id, lesson_id, title, body, columns) in _SQLITE_SOURCES.items():
+        code = _SQLITE_KIND_CODES[kind]
+        insert = (
+            'INSERT INTO courses_search(rowid, course_id, lesson_id, title, body) '
+            'VALUES (new.id * 4 + {code}, {course_id}, {lesson_id}, {title}, {body});'
+        ).format(code=code, course_id=course_id, lesson_id=lesson_id, title=title, body=body)
+        delete = 'DELETE FROM courses_search WHERE rowid = old.id * 4 + {};'.format(code)
+        yield 'courses_search_{}_ai'.format(kind), 'AFTER INSERT ON {}'.format(table), insert
+        yield ('courses_search_{}_au'.format(kind),
+               'AFTER UPDATE OF {} ON {}'.format(', '.join(columns), table), delete + ' ' + insert)
+        yield 'courses_search_{}_ad'.format(kind), 'AFTER DELETE ON {}'.format(table), delete
+
+
+def install_sqlite_index(connection):
+    """
+    Создаёт FTS5-таблицу и недостающие триггеры. Если чего-то не хватало,
+    индекс перестраивается целиком, чтобы подхватить изменения, сделанные без
+    триггеров.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'courses_search_%'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [trigger for trigger in _sqlite_triggers() if trigger[0] not in existing]
+        if not missing:
+            return
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS courses_search USING fts5('
+            "course_id UNINDEXED, lesson_id UNINDEXED, title, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        for name, event, body in missing:
+            cursor.execute('CREATE TRIGGER {} {} BEGIN {} END'.format(name, event, body))
+        cursor.execute('DELETE FROM courses_search')
+        cursor.execute(
+            'INSERT INTO courses_search(rowid, course_id, lesson_id, title, body) '
+            'SELECT id * 4 + 1, id, NULL, title, description FROM courses_course'
+        )
+        cursor.execute(
+            'INSERT INTO courses_search(rowid, course_id, lesson_id, title, body) '
+            'SELECT id * 4 + 2, course_id, id, title, description FROM courses_lesson'
+        )
+        cursor.execute(
+            'INSERT INTO courses_search(rowid, course_id, lesson_id, title, body) '
+            'SELECT id * 4 + 3, NULL, lesson_id, title, content FROM courses_section'
+        )
+
+
+def drop_search_triggers(sender, using, plan=None, **kwargs):
+    # pre_migrate: пересоздание таблиц в миграциях на SQLite удаляет их триггеры
+    # или падает на триггерах, ссылающихся на пересоздаваемую таблицу, поэтому
+    # на время миграций триггеры снимаются, а после - восстанавливаются.
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not plan:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'courses_search_%'")
+        for (name,) in cursor.fetchall():
+            cursor.execute('DROP TRIGGER {}'.format(name))
+
+
+def restore_search_index(sender, using, plan=None, **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not plan:
+        return
+    if 'courses_search' not in connection.introspection.table_names():
+        return
+    install_sqlite_index(connection)
+
+
+def _highlight(text):
+    return escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def _result(kind, obj_id, course_id, lesson_id, title, rank, snippet):
+    return {
+        'type': kind,
+        'id': obj_id,
+        'course_id': course_id,
+        'lesson_id': lesson_id,
+        'title': title,
+        'rank': float(rank),
+        'snippet': _highlight(snippet),
+    }
+
+
+def _search_postgresql(query, kinds, limit):
+    # Имена колонок UNION берутся из первой ветки, а первой может быть любая,
+    # поэтому псевдонимы есть у всех колонок каждой ветки
+    parts = []
+    if 'course' in kinds:
+        parts.append("""
+            SELECT 'course' AS kind, c.id AS id, c.id AS course_id, NULL::bigint AS lesson_id, c.title AS title,
+                   c.description AS body, ts_rank(c.search_vector, q) AS rank
+            FROM courses_course c, query WHERE c.search_vector @@ q
+        """)
+    if 'lesson' in kinds:
+        parts.append("""
+            SELECT 'lesson' AS kind, l.id AS id, l.course_id AS course_id, l.id AS lesson_id, l.title AS title,
+                   l.description AS body, ts_rank(l.search_vector, q) AS rank
+            FROM courses_lesson l, query WHERE l.search_vector @@ q
+        """)
+    if 'section' in kinds:
+        parts.append("""
+            SELECT 'section' AS kind, s.id AS id, l.course_id AS course_id, s.lesson_id AS lesson_id,
+                   s.title AS title, s.content AS body, ts_rank(s.search_vector, q) AS rank
+            FROM courses_section s JOIN courses_lesson l ON l.id = s.lesson_id, query WHERE s.search_vector @@ q
+        """)
+    # ts_headline дорогой, поэтому считаем его только для уже отобранной первой страницы
+    sql = """
+        WITH query AS (SELECT websearch_to_tsquery('simple', %s) AS q),
+        hits AS ({hits} ORDER BY rank DESC LIMIT %s)
+        SELECT kind, id, course_id, lesson_id, title, rank,
+               ts_headline('simple', title || ' ' || coalesce(body, ''), (SELECT q FROM query),
+                           %s)
+        FROM hits ORDER BY rank DESC
+    """.format(hits=' UNION ALL '.join(parts))
+    options = 'StartSel={},StopSel={},MaxWords=30,MinWords=10,MaxFragments=2'.format(_START, _STOP)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, limit, options])
+        return [_result(*row) for row in cursor.fetchall()]
+
+
+def _fts5_query(query):
+    # Каждое слово берём в кавычки, чтобы пользовательский ввод не трактовался
+    # как синтаксис FTS5; последнее слово ищем по префиксу.
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = ['"{}"'.format(word.replace('"', '""')) for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _search_sqlite(query, kinds, limit):
+    match = _fts5_query(query)
+    if match is None:
+        return []
+    codes = [_SQLITE_KIND_CODES[kind] for kind in kinds]
+    sql = """
+        SELECT s.rowid, coalesce(s.course_id, l.course_id), s.lesson_id, s.title,
+               bm25(courses_search, 0, 0, 10.0, 4.0) AS rank,
+               snippet(courses_search, -1, %s, %s, '…', 16)
+        FROM courses_search s LEFT JOIN courses_lesson l ON l.id = s.lesson_id
+        WHERE courses_search MATCH %s AND s.rowid %% 4 IN ({})
+        ORDER BY rank LIMIT %s
+    """.format(', '.join(['%s'] * len(codes)))
+    kind_by_code = {code: kind for kind, code in _SQLITE_KIND_CODES.items()}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_START, _STOP, match, *codes, limit])
+        rows = cursor.fetchall()
+    # bm25 возвращает отрицательные значения: чем меньше, тем релевантнее
+    return [
+        _result(kind_by_code[rowid % 4], rowid // 4, course_id, lesson_id, title, -rank, snippet)
+        for rowid, course_id, lesson_id, title, rank, snippet in rows
+    ]
+
+
+def _search_fallback(query, kinds, limit):
+    results = []
+    if 'course' in kinds:
+        for course in Course.objects.filter(Q(title__icontains=query) | Q(description__icontains=query))[:limit]:
+            results.append(_result('course', course.id, course.id, None, course.title, 0, course.description[:200]))
+    if 'lesson' in kinds:
+        for lesson in Lesson.objects.filter(Q(title__icontains=query) | Q(description__icontains=query))[:limit]:
+            results.append(_result('lesson', lesson.id, lesson.course_id, lesson.id, lesson.title, 0, lesson.description[:200]))
+    if 'section' in kinds:
+        sections = Section.objects.select_related('lesson').filter(Q(title__icontains=query) | Q(content__icontains=query))
+        for section in sections[:limit]:
+            results.append(_result('section', section.id, section.lesson.course_id, section.lesson_id,
+                                   section.title, 0, section.content[:200]))
+    return results[:limit]
+
+
+def search(query, kinds=KINDS, limit=20):
+    """
+    Ищет query по курсам, урокам и секциям. Возвращает список словарей,
+    отсортированный по релевантности; snippet уже экранирован и содержит <mark>.
+    """
+    query = (query or '').strip()
+    kinds = [kind for kind in kinds if kind in KINDS]
+    if not query or not kinds:
+        return []
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(query, kinds, limit)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(query, kinds, limit)
+    return _search_fallback(query, kinds, limit)
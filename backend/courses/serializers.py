@@ -1,28 +1,65 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Course, Lesson, Section, Test, Question, Answer, TestResult
+from . import counters, fieldsets
+from .models import Course, Enrollment, Lesson, Section, Test, Question, Answer, TestResult, TestAttempt, ReviewItem
 from users.serializers import UserSerializer
 
-class CourseSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Поддержка ?fields= и ?expand= (см. courses.fieldsets) для сериализатора
+    верхнего уровня, в том числе в режиме many=True.
+    """
+    # {имя поля: ('select' | 'prefetch', lookup для queryset)}
+    expandable_fields = {}
+
+    def _is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_top_level():
+            return fields
+        only, expand = fieldsets.requested(self.context.get('request'))
+        for name, (kind, _) in self.expandable_fields.items():
+            if name not in fields or fieldsets.is_expanded(name, expand):
+                continue
+            if kind == 'select':
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+            else:
+                del fields[name]
+        if only is not None:
+            for name in list(fields):
+                if name != 'id' and name not in only:
+                    del fields[name]
+        return fields
+
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
+    expandable_fields = {'author': ('select', 'author')}
     
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'author', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'author', 'lessons_count', 'tests_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'lessons_count', 'tests_count', 'created_at', 'updated_at']
 
-class SectionSerializer(serializers.ModelSerializer):
+class SectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Section
-        fields = ['id', 'title', 'content', 'video', 'order']
-        read_only_fields = ['id']
+        fields = ['id', 'title', 'content', 'content_html', 'video', 'order']
+        read_only_fields = ['id', 'content_html']
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sections = SectionSerializer(many=True, read_only=True)
+    expandable_fields = {'sections': ('prefetch', 'sections')}
     
     class Meta:
         model = Lesson
-        fields = ['id', 'title', 'description', 'video', 'order', 'sections', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'video', 'order', 'sections', 'sections_count', 'tests_count',
+                  'created_at', 'updated_at']
+        read_only_fields = ['id', 'sections_count', 'tests_count', 'created_at', 'updated_at']
     
     def update(self, instance, validated_data):
         print(f"Updating lesson {instance.id} with data: {validated_data}")
@@ -34,50 +71,181 @@ class AnswerSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'is_correct']
         read_only_fields = ['id']
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     answers = AnswerSerializer(many=True)
+    expandable_fields = {'answers': ('prefetch', 'answers')}
     
     class Meta:
         model = Question
         fields = ['id', 'text', 'answers']
         read_only_fields = ['id']
 
-class TestSerializer(serializers.ModelSerializer):
-    questions = QuestionSerializer(many=True, required=False)
+    @transaction.atomic
+    def create(self, validated_data):
+        answers_data = validated_data.pop('answers', [])
+        question = Question.objects.create(**validated_data)
+        Answer.objects.bulk_create([Answer(question=question, **a_data) for a_data in answers_data])
+        return question
+
+    # Переданный список answers заменяет ответы вопроса целиком
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        answers_data = validated_data.pop('answers', None)
+        instance.text = validated_data.get('text', instance.text)
+        instance.save()
+        if answers_data is not None:
+            instance.answers.all().delete()
+            Answer.objects.bulk_create([Answer(question=instance, **a_data) for a_data in answers_data])
+        return instance
+
+class BatchAnswerSerializer(AnswerSerializer):
+    # Ответ с id изменяется, без id - создаётся
+    id = serializers.IntegerField(required=False)
+
+    class Meta(AnswerSerializer.Meta):
+        read_only_fields = []
+
+class BatchQuestionSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    answers = BatchAnswerSerializer(many=True, required=False)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'text', 'answers']
+
+    # Пустой список при изменении удалил бы все ответы вопроса: чтобы оставить
+    # ответы как есть, answers не передаётся
+    def validate_answers(self, value):
+        if not value:
+            raise serializers.ValidationError('Question must have answers.')
+        if not any(a.get('is_correct') for a in value):
+            raise serializers.ValidationError('At least one answer must be correct.')
+        ids = [a['id'] for a in value if 'id' in a]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Answer ids must be unique.')
+        return value
+
+class QuestionBatchSerializer(serializers.Serializer):
+    """
+    Пакет изменений вопросов теста, см. courses.question_bank.apply_batch
+    """
+    create = BatchQuestionSerializer(many=True, required=False)
+    update = BatchQuestionSerializer(many=True, required=False)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate_update(self, value):
+        if any('id' not in item for item in value):
+            raise serializers.ValidationError('Each updated question needs an id.')
+        return value
+
+    def validate(self, data):
+        updated = [item['id'] for item in data.get('update', [])]
+        deleted = data.get('delete', [])
+        if len(updated) != len(set(updated)) or len(deleted) != len(set(deleted)):
+            raise serializers.ValidationError('Question ids must be unique.')
+        if set(updated) & set(deleted):
+            raise serializers.ValidationError('A question cannot be both updated and deleted.')
+        return data
+
+class TestQuestionSerializer(QuestionSerializer):
+    # Вопрос и ответы с id изменяются на месте, без id - создаются
+    id = serializers.IntegerField(required=False)
+    answers = BatchAnswerSerializer(many=True)
+
+class TestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    questions = TestQuestionSerializer(many=True, required=False)
     course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all(), required=False, allow_null=True)
     lesson = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {'questions': ('prefetch', 'questions__answers')}
     
     class Meta:
         model = Test
-        fields = ['id', 'title', 'description', 'questions', 'course', 'lesson']
-        read_only_fields = ['id']
+        fields = ['id', 'title', 'description', 'questions', 'course', 'lesson', 'time_limit',
+                  'questions_count', 'results_count']
+        read_only_fields = ['id', 'questions_count', 'results_count']
+
+    def validate_questions(self, value):
+        ids = [q['id'] for q in value if 'id' in q]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Question ids must be unique.')
+        return value
 
+    # Счётчики вопросов обновляются одним UPDATE на тест, а не на каждый вопрос
+    @transaction.atomic
     def create(self, validated_data):
         questions_data = validated_data.pop('questions', [])
-        test = Test.objects.create(**validated_data)
-        for q_data in questions_data:
-            answers_data = q_data.pop('answers', [])
-            question = Question.objects.create(test=test, **q_data)
-            for a_data in answers_data:
-                Answer.objects.create(question=question, **a_data)
+        with counters.deferred():
+            test = Test.objects.create(**validated_data)
+            for q_data in questions_data:
+                answers_data = q_data.pop('answers', [])
+                question = Question.objects.create(test=test, text=q_data['text'])
+                for a_data in answers_data:
+                    Answer.objects.create(question=question, text=a_data['text'],
+                                          is_correct=a_data.get('is_correct', False))
+        test.refresh_from_db(fields=['questions_count'])
         return test
 
+    # Вопросы не пересоздаются: от них каскадом удалились бы карточки
+    # повторения (ReviewItem). Не упомянутые в списке вопросы удаляются
+    @transaction.atomic
     def update(self, instance, validated_data):
-        questions_data = validated_data.pop('questions', [])
+        # question_bank сам импортирует сериализаторы
+        from .question_bank import BatchError, apply_batch
+
+        questions_data = validated_data.pop('questions', None)
         instance.title = validated_data.get('title', instance.title)
         instance.description = validated_data.get('description', instance.description)
+        instance.time_limit = validated_data.get('time_limit', instance.time_limit)
         instance.save()
-        # Удаляем старые вопросы и ответы
-        instance.questions.all().delete()
-        for q_data in questions_data:
-            answers_data = q_data.pop('answers', [])
-            question = Question.objects.create(test=instance, **q_data)
-            for a_data in answers_data:
-                Answer.objects.create(question=question, **a_data)
+        if questions_data is not None:
+            kept = [q for q in questions_data if 'id' in q]
+            stale = instance.questions.exclude(pk__in=[q['id'] for q in kept]).values_list('pk', flat=True)
+            try:
+                apply_batch(instance, create=[q for q in questions_data if 'id' not in q], update=kept,
+                            delete=list(stale))
+            except BatchError as exc:
+                raise serializers.ValidationError({'questions': [str(exc)]})
+            instance.refresh_from_db(fields=['questions_count'])
         return instance
 
 class TestResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = TestResult
         fields = ['id', 'user', 'test', 'score', 'answers', 'created_at']
-        read_only_fields = ['id', 'created_at', 'user'] 
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'user']
+
+class TestAttemptSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TestAttempt
+        fields = ['id', 'test', 'answers', 'started_at', 'expires_at', 'saved_at', 'finished_at', 'result_id']
+        read_only_fields = fields
+
+class ReviewItemSerializer(serializers.ModelSerializer):
+    question = QuestionSerializer(read_only=True)
+    test = serializers.IntegerField(source='question.test_id', read_only=True)
+
+    class Meta:
+        model = ReviewItem
+        fields = ['id', 'question', 'test', 'due_at', 'interval', 'repetitions', 'lapses', 'ease_factor',
+                  'last_reviewed_at']
+        read_only_fields = fields
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description']
+
+class DashboardEntrySerializer(serializers.ModelSerializer):
+    # Поля-счётчики берутся из аннотаций, см. courses.dashboard
+    course = CourseSummarySerializer(read_only=True)
+    enrolled_at = serializers.DateTimeField(source='created_at', read_only=True)
+    lessons_count = serializers.IntegerField(read_only=True)
+    completed_lessons = serializers.IntegerField(read_only=True)
+    last_test_id = serializers.IntegerField(read_only=True, allow_null=True)
+    last_score = serializers.IntegerField(read_only=True, allow_null=True)
+    last_result_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Enrollment
+        fields = ['course', 'enrolled_at', 'lessons_count', 'completed_lessons',
+                  'last_test_id', 'last_score', 'last_result_at']
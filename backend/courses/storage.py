@@ -0,0 +1,101 @@
+"""
+Хранилище видео с адресацией по содержимому.
+
+Файл сохраняется под именем из sha256 содержимого:
+videos/ab/ab12...ef.mp4. Одинаковые файлы хранятся один раз, а URL файла
+никогда не меняет содержимое, поэтому его можно кэшировать навсегда
+(например, expires max для /media/videos/ в nginx). Все файлы и временные
+файлы загрузок лежат в своём подкаталоге directory (OPTIONS в
+STORAGES['videos']), так что сборщик мусора не трогает остальной MEDIA_ROOT.
+
+Сколько строк ссылается на файл, считает MediaBlob (см. courses.media).
+delete() удаляет файл только если ссылок на него не осталось (проверка и
+удаление идут под блокировкой строки MediaBlob), поэтому вызывать его
+безопасно из любого места.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+
+HASH_CHUNK = 1024 * 1024
+_HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]{1,10})?$')
+
+
+def video_storage():
+    # Вызывается полем модели; само хранилище задаётся в STORAGES['videos']
+    return storages['videos']
+
+
+def is_hashed_name(name):
+    return bool(name and _HASHED_NAME.search(name))
+
+
+def _extension(name):
+    ext = os.path.splitext(name)[1].lower()
+    return ext if re.fullmatch(r'\.[a-z0-9]{1,10}', ext) else ''
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def __init__(self, directory='videos', **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory.strip('/')
+
+    @property
+    def root(self):
+        """
+        Каталог файлов хранилища на диске.
+        """
+        return os.path.join(self.location, self.directory)
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя всё равно определяется хэшем в _save
+        return name
+
+    def _save(self, name, content):
+        os.makedirs(self.root, exist_ok=True)
+        # Один проход: содержимое пишется во временный файл (в том же каталоге,
+        # чтобы переименование было атомарным) и одновременно хэшируется.
+        # Так работает и с потоками без seek(), например из tar-архива
+        digest = hashlib.sha256()
+        fd, temporary = tempfile.mkstemp(dir=self.root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks(HASH_CHUNK):
+                    if not isinstance(chunk, bytes):
+                        chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    output.write(chunk)
+            digest = digest.hexdigest()
+            target = '/'.join([self.directory, digest[:2], digest + _extension(name)])
+            full_path = self.path(target)
+            if os.path.exists(full_path):
+                os.remove(temporary)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                # Параллельная загрузка того же файла в худшем случае заменит его тем же содержимым
+                os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return target
+
+    def delete(self, name):
+        if not name:
+            return
+        blob_model = apps.get_model('courses', 'MediaBlob')
+        # Блокировка строки не даёт новой ссылке появиться между проверкой и удалением
+        with transaction.atomic():
+            blob = blob_model.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 0:
+                return
+            super().delete(name)
+            if blob is not None:
+                blob.delete()
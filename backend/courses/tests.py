@@ -1,3 +1,1523 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.preload import preload
+from users.models import User
+from . import (
+    archive, attempts, copying, counters, exports, leaderboard, live, media, ordering, partitions, payloads,
+    question_import, rendering, reviews,
+)
+from .models import (
+    Answer, Course, Enrollment, LeaderboardEntry, Lesson, MediaBlob, Question, ReviewItem, Section, Test, TestAttempt,
+    TestResult,
+)
+from .serializers import TestSerializer
+from .storage import video_storage
+
+
+def make_user(username, role='student'):
+    return User.objects.create_user(username, username + '@example.com', 'password', role=role)
+
+
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@contextmanager
+def shared_cache():
+    # Кэш, общий для воркеров: с LocMemCache попытки и кэш ответов ведут себя иначе
+    with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}):
+        yield
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson', description='', order=0)
+        cls.test = Test.objects.create(lesson=cls.lesson, title='Test')
+
+    def _counts(self):
+        self.course.refresh_from_db()
+        self.lesson.refresh_from_db()
+        self.test.refresh_from_db()
+        return (self.course.lessons_count, self.lesson.sections_count, self.lesson.tests_count,
+                self.test.questions_count, self.test.results_count)
+
+    def test_create_and_delete(self):
+        questions = [Question.objects.create(test=self.test, text=str(i)) for i in range(3)]
+        section = Section.objects.create(lesson=self.lesson, title='S', content='', order=0)
+        result = TestResult.objects.create(user=self.teacher, test=self.test, score=1, answers={})
+        self.assertEqual(self._counts(), (1, 1, 1, 3, 1))
+        questions[0].delete()
+        Question.objects.filter(pk=questions[1].pk).delete()
+        section.delete()
+        result.delete()
+        self.assertEqual(self._counts(), (1, 0, 1, 1, 0))
+
+    def test_delete_inside_deferred_block(self):
+        with transaction.atomic(), counters.deferred():
+            Question.objects.create(test=self.test, text='a')
+            Question.objects.create(test=self.test, text='b')
+            self.test.questions.filter(text='a').delete()
+            Question.objects.create(test=self.test, text='c')
+        self.assertEqual(self._counts()[3], 2)
+
+    def test_cascade_delete_does_not_load_children(self):
+        for i in range(20):
+            question = Question.objects.create(test=self.test, text=str(i))
+            Answer.objects.create(question=question, text='a', is_correct=True)
+            TestResult.objects.create(user=self.teacher, test=self.test, score=i, answers={})
+            Section.objects.create(lesson=self.lesson, title=str(i), content='', order=i)
+        with CaptureQueriesContext(connection) as queries:
+            self.test.delete()
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'courses_testresult' in sql])
+        self.lesson.refresh_from_db()
+        self.assertEqual((self.lesson.sections_count, self.lesson.tests_count), (20, 0))
+
+    def test_deleting_user_recounts_results(self):
+        student = make_user('student', 'student')
+        for score in range(3):
+            TestResult.objects.create(user=student, test=self.test, score=score, answers={})
+        TestResult.objects.create(user=self.teacher, test=self.test, score=1, answers={})
+        other = Test.objects.create(course=self.course, title='Final')
+        TestResult.objects.create(user=student, test=other, score=1, answers={})
+        self.assertEqual(self._counts()[4], 4)
+        student.delete()
+        self.assertEqual(self._counts()[4], 1)
+        other.refresh_from_db()
+        self.assertEqual(other.results_count, 0)
+
+
+
+class SparseFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.courses = [Course.objects.create(title=str(i), description='long text', author=cls.teacher)
+                       for i in range(3)]
+        lesson = Lesson.objects.create(course=cls.courses[0], title='Lesson', description='', order=0)
+        Section.objects.create(lesson=lesson, title='S', content='', order=0)
+        cls.test = Test.objects.create(lesson=lesson, title='Quiz')
+        for i in range(3):
+            question = Question.objects.create(test=cls.test, text=str(i))
+            Answer.objects.create(question=question, text='a', is_correct=True)
+            Answer.objects.create(question=question, text='b')
+
+    def setUp(self):
+        self.client_ = api_client(self.teacher)
+
+    def _get(self, url, **params):
+        response = self.client_.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fields_trim_response_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self._get('/courses/', fields='title')
+        self.assertEqual([sorted(item) for item in data], [['id', 'title']] * 3)
+        self.assertNotIn('description', queries.captured_queries[-1]['sql'])
+        lessons = self._get('/courses/{}/lessons/'.format(self.courses[0].pk), fields='id,title,sections')
+        self.assertEqual(sorted(lessons[0]), ['id', 'sections', 'title'])
+        self.assertEqual(sorted(self._get('/courses/{}/lessons/'.format(self.courses[0].pk), fields='title')[0]),
+                         ['id', 'title'])
+
+    def test_select_field_is_pk_unless_expanded(self):
+        course = self._get('/courses/{}/'.format(self.courses[0].pk), expand='')
+        self.assertEqual(course['author'], self.teacher.pk)
+        course = self._get('/courses/{}/'.format(self.courses[0].pk), expand='author')
+        self.assertEqual(course['author']['username'], 'teacher')
+
+    def test_expand_uses_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(1):
+            data = self._get('/courses/', expand='author')
+        self.assertEqual({item['author']['id'] for item in data}, {self.teacher.pk})
+        url = '/courses/api/tests/{}/'.format(self.test.pk)
+        with self.assertNumQueries(3):
+            data = self._get(url, expand='questions')
+        self.assertEqual([len(question['answers']) for question in data['questions']], [2, 2, 2])
+        with self.assertNumQueries(1):
+            data = self._get(url, expand='')
+        self.assertNotIn('questions', data)
+
+    def test_nested_serializers_are_not_trimmed(self):
+        data = self._get('/courses/api/tests/{}/'.format(self.test.pk), fields='questions,text', expand='questions')
+        self.assertEqual(sorted(data), ['id', 'questions'])
+        self.assertEqual(sorted(data['questions'][0]), ['answers', 'id', 'text'])
+        self.assertEqual(sorted(data['questions'][0]['answers'][0]), ['id', 'is_correct', 'text'])
+
+    def test_writes_ignore_fields(self):
+        response = self.client_.post('/courses/?fields=title', {'title': 'New', 'description': 'd'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('description', response.data)
+
+
+@override_settings(PAYLOAD_CACHE_ALLOW_LOCAL=True)
+class PayloadCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson', description='', order=0)
+        cls.section = Section.objects.create(lesson=cls.lesson, title='S', content='old', order=0)
+        cls.test = Test.objects.create(lesson=cls.lesson, title='Test')
+        cls.question = Question.objects.create(test=cls.test, text='Q')
+        Answer.objects.create(question=cls.question, text='yes', is_correct=True)
+        Answer.objects.create(question=cls.question, text='no')
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, kind, pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            return payloads.get(kind, pk)
+
+    def test_local_memory_cache_is_not_used_by_default(self):
+        request = APIClient().get('/').wsgi_request
+        self.assertTrue(payloads.cacheable(request))
+        with override_settings(PAYLOAD_CACHE_ALLOW_LOCAL=False):
+            self.assertFalse(payloads.cacheable(request))
+            with self.assertRaises(CommandError):
+                call_command('warm_cache')
+
+    def test_deleted_answers_and_sections_invalidate(self):
+        self._get(payloads.TEST, self.test.pk)
+        self._get(payloads.LESSONS, self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.answers.filter(is_correct=False).delete()
+            self.section.delete()
+        answers = self._get(payloads.TEST, self.test.pk)['questions'][0]['answers']
+        self.assertEqual([answer['text'] for answer in answers], ['yes'])
+        self.assertEqual(self._get(payloads.LESSONS, self.course.pk)[0]['sections'], [])
+
+    def test_author_change_invalidates_course(self):
+        self._get(payloads.COURSE, self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.first_name = 'Anna'
+            self.teacher.save()
+        self.assertEqual(self._get(payloads.COURSE, self.course.pk)['author']['first_name'], 'Anna')
+
+    def test_bulk_paths_invalidate(self):
+        self._get(payloads.TEST, self.test.pk)
+        self._get(payloads.LESSONS, self.course.pk)
+        Section.objects.filter(pk=self.section.pk).update(content='**new**')
+        Test.objects.filter(pk=self.test.pk).update(questions_count=99)
+        with self.captureOnCommitCallbacks(execute=True):
+            rendering.render_all()
+            counters.recount()
+        section = self._get(payloads.LESSONS, self.course.pk)[0]['sections'][0]
+        self.assertIn('<strong>new</strong>', section['content_html'])
+        self.assertEqual(self._get(payloads.TEST, self.test.pk)['questions_count'], 1)
+
+
+class TestAttemptTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_user('teacher', 'teacher')
+        course = Course.objects.create(title='Course', description='', author=teacher)
+        cls.test = Test.objects.create(course=course, title='Final', time_limit=10)
+        cls.questions = []
+        for text in ('one', 'two'):
+            question = Question.objects.create(test=cls.test, text=text)
+            cls.questions.append((question, Answer.objects.create(question=question, text='yes', is_correct=True)))
+            Answer.objects.create(question=question, text='no')
+        cls.student = make_user('student')
+
+    def setUp(self):
+        cache.clear()
+        self.client_ = api_client(self.student)
+
+    def _start(self):
+        response = self.client_.post('/courses/api/tests/{}/attempts/'.format(self.test.pk))
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def _save(self, attempt_id, question, answer):
+        return self.client_.put('/courses/api/attempts/{}/answers/{}/'.format(attempt_id, question.pk),
+                                {'answers': [answer.pk]}, format='json')
+
+    def _finish(self, attempt_id):
+        return self.client_.post('/courses/api/attempts/{}/finish/'.format(attempt_id))
+
+    def _answer_all(self, attempt_id):
+        for question, answer in self.questions:
+            self.assertEqual(self._save(attempt_id, question, answer).status_code, 200)
+
+    def test_local_cache_writes_answers_through(self):
+        attempt_id = self._start()
+        self._answer_all(attempt_id)
+        self.assertEqual(len(TestAttempt.objects.get(pk=attempt_id).answers), 2)
+        response = self._finish(attempt_id)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['result']['score'], 2)
+        self.assertEqual(self._finish(attempt_id).status_code, 400)
+
+    def test_shared_cache_buffers_until_finish(self):
+        with shared_cache():
+            attempt_id = self._start()
+            self._answer_all(attempt_id)
+            # Первое сохранение сбросило буфер, второе осталось в кэше
+            self.assertEqual(len(TestAttempt.objects.get(pk=attempt_id).answers), 1)
+            response = self._finish(attempt_id)
+        self.assertEqual(response.json()['result']['score'], 2)
+
+    def test_expired_attempt_is_rejected(self):
+        attempt_id = self._start()
+        self._answer_all(attempt_id)
+        TestAttempt.objects.filter(pk=attempt_id).update(expires_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(self._finish(attempt_id).status_code, 400)
+        self.assertFalse(TestResult.objects.filter(test=self.test).exists())
+
+    def test_local_cache_reads_questions_from_db(self):
+        attempt_id = self._start()
+        # Список из кэша другого воркера устарел: вопрос добавлен там
+        cache.set('test-questions:{}'.format(self.test.pk), [question.pk for question, _ in self.questions])
+        question = Question.objects.bulk_create([Question(test=self.test, text='three')])[0]
+        answer = Answer.objects.create(question=question, text='yes', is_correct=True)
+        self.assertEqual(self._save(attempt_id, question, answer).status_code, 200)
+
+    def test_new_question_is_accepted(self):
+        with shared_cache():
+            attempt_id = self._start()
+            self._answer_all(attempt_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                question = Question.objects.create(test=self.test, text='three')
+                answer = Answer.objects.create(question=question, text='yes', is_correct=True)
+            self.assertEqual(self._save(attempt_id, question, answer).status_code, 200)
+
+
+
+class EnrollmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.student = make_user('student')
+        cls.courses = [Course.objects.create(title=str(i), description='', author=cls.teacher) for i in range(2)]
+        cls.lessons = [Lesson.objects.create(course=cls.courses[0], title=str(i), description='', order=i)
+                       for i in range(3)]
+        cls.test = Test.objects.create(lesson=cls.lessons[0], title='Quiz')
+
+    def setUp(self):
+        self.client_ = api_client(self.student)
+
+    def _enroll(self, course, method='post'):
+        return getattr(self.client_, method)('/courses/{}/enroll/'.format(course.pk))
+
+    def _state(self):
+        self.student.refresh_from_db()
+        enrolled = list(Enrollment.objects.filter(user=self.student).order_by('created_at', 'id')
+                        .values_list('course_id', flat=True))
+        return enrolled, self.student.progress.get('courses')
+
+    def test_enroll_and_leave(self):
+        self.assertEqual(self._enroll(self.courses[0]).status_code, 201)
+        self.assertEqual(self._enroll(self.courses[0]).status_code, 200)
+        self.assertEqual(self._enroll(self.courses[1]).status_code, 201)
+        ids = [course.pk for course in self.courses]
+        self.assertEqual(self._state(), (ids, ids))
+        self.assertEqual(self._enroll(self.courses[0], 'delete').status_code, 204)
+        self.assertEqual(self._state(), (ids[1:], ids[1:]))
+        self.assertEqual(self.client_.post('/courses/0/enroll/').status_code, 404)
+
+    def test_profile_update_does_not_change_enrolled_courses(self):
+        self._enroll(self.courses[0])
+        completed = [self.lessons[0].pk, self.lessons[1].pk]
+        response = self.client_.put('/auth/profile/', {'progress': {'courses': [self.courses[1].pk],
+                                                                    'completedLessons': completed}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['progress'], {'courses': [self.courses[0].pk], 'completedLessons': completed})
+        self.assertEqual(self._state(), ([self.courses[0].pk], [self.courses[0].pk]))
+        response = self.client_.put('/auth/profile/', {'progress': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_dashboard(self):
+        self._enroll(self.courses[1])
+        self._enroll(self.courses[0])
+        self.student.progress['completedLessons'] = [self.lessons[0].pk, self.lessons[2].pk, 'bad']
+        self.student.save(update_fields=['progress'])
+        TestResult.objects.create(user=self.student, test=self.test, score=3, answers={})
+        latest = TestResult.objects.create(user=self.student, test=self.test, score=8, answers={})
+        with self.assertNumQueries(2):
+            response = self.client_.get('/courses/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data
+        self.assertEqual(first['course']['id'], self.courses[0].pk)
+        self.assertEqual((first['lessons_count'], first['completed_lessons']), (3, 2))
+        self.assertEqual((first['last_test_id'], first['last_score']), (self.test.pk, latest.score))
+        self.assertEqual(second['course']['id'], self.courses[1].pk)
+        self.assertEqual((second['lessons_count'], second['completed_lessons'], second['last_score']), (0, 0, None))
+
+    def test_migration_syncs_progress_courses(self):
+        self._enroll(self.courses[1])
+        User.objects.filter(pk=self.student.pk).update(progress={'courses': [self.courses[0].pk], 'x': 1})
+        User.objects.filter(pk=self.teacher.pk).update(progress={'courses': [self.courses[0].pk]})
+        migration = importlib.import_module('courses.migrations.0015_sync_progress_courses')
+        migration.sync_progress_courses(django_apps, None)
+        self.student.refresh_from_db()
+        self.teacher.refresh_from_db()
+        self.assertEqual(self.student.progress, {'courses': [self.courses[1].pk], 'x': 1})
+        self.assertEqual(self.teacher.progress, {'courses': []})
+
+
+
+class ReorderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.lessons = [Lesson.objects.create(course=cls.course, title=str(i), description='', order=i)
+                       for i in range(3)]
+        other = Course.objects.create(title='Other', description='', author=cls.teacher)
+        cls.foreign = Lesson.objects.create(course=other, title='F', description='', order=0)
+
+    def _post(self, data):
+        return api_client(self.teacher).post('/courses/{}/lessons/reorder/'.format(self.course.pk), data,
+                                             format='json')
+
+    def _orders(self):
+        return list(Lesson.objects.filter(course=self.course).order_by('order').values_list('pk', flat=True))
+
+    def test_reorder(self):
+        first, second, third = [lesson.pk for lesson in self.lessons]
+        response = self._post({'order': [third, first, second]})
+        self.assertEqual((response.status_code, response.data), (200, {'updated': 3}))
+        self.assertEqual(self._orders(), [third, first, second])
+        section = Section.objects.create(lesson=self.lessons[0], title='S', content='', order=5)
+        response = api_client(self.teacher).post(
+            '/courses/{}/lessons/{}/sections/reorder/'.format(self.course.pk, self.lessons[0].pk),
+            {'order': [section.pk]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+
+    def test_invalid_bodies(self):
+        ids = [lesson.pk for lesson in self.lessons]
+        for data in ([ids], {}, {'order': None}, {'order': ','.join(map(str, ids))},
+                     {'order': [str(pk) for pk in ids]}, {'order': ids[:2] + [ids[2] + 0.5]},
+                     {'order': ids + [True]}):
+            with self.subTest(data=data):
+                self.assertEqual(self._post(data).status_code, 400)
+
+    def test_foreign_duplicate_and_partial_lists(self):
+        ids = [lesson.pk for lesson in self.lessons]
+        for order in (ids[:2] + [self.foreign.pk], ids + [self.foreign.pk], ids + ids[:1], ids[:2]):
+            with self.subTest(order=order):
+                self.assertEqual(self._post({'order': order}).status_code, 400)
+        self.assertEqual(self._orders(), ids)
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.order, 0)
+
+    def test_failure_rolls_back(self):
+        ids = [lesson.pk for lesson in self.lessons]
+
+        def bulk_update(objects, fields):
+            Lesson.objects.filter(pk=objects[0].pk).update(order=99)
+            raise RuntimeError('boom')
+
+        with mock.patch.object(Lesson.objects, 'bulk_update', side_effect=bulk_update):
+            with self.assertRaises(RuntimeError):
+                ordering.reorder(Lesson.objects.filter(course=self.course), ids[::-1])
+        self.assertEqual(self._orders(), ids)
+        self.assertEqual(sorted(Lesson.objects.values_list('order', flat=True)), [0, 0, 1, 2])
+
+
+class TimeLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.test = Test.objects.create(course=cls.course, title='Final', time_limit=15)
+
+    def test_update_keeps_time_limit(self):
+        serializer = TestSerializer(self.test, data={'title': 'Final', 'time_limit': 20}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.test.refresh_from_db()
+        self.assertEqual(self.test.time_limit, 20)
+
+    def test_copy_and_archive_keep_time_limit(self):
+        copy = copying.copy_course(self.course, author=self.teacher)
+        self.assertEqual(copy.final_tests.get().time_limit, 15)
+        imported = archive.import_course(io.BytesIO(b''.join(archive.export_course(self.course))), self.teacher)
+        self.assertEqual(imported.final_tests.get().time_limit, 15)
+
+
+class ReviewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.student = make_user('student')
+        cls.course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.test = Test.objects.create(course=cls.course, title='Final')
+        cls.questions = [Question.objects.create(test=cls.test, text=str(i)) for i in range(3)]
+        cls.correct = [Answer.objects.create(question=q, text='yes', is_correct=True) for q in cls.questions]
+        cls.wrong = [Answer.objects.create(question=q, text='no') for q in cls.questions]
+
+    def _submit(self, *wrong):
+        answers = {str(q.pk): [(self.wrong if i in wrong else self.correct)[i].pk]
+                   for i, q in enumerate(self.questions)}
+        return TestResult.objects.create(user=self.student, test=self.test, score=0, answers=answers)
+
+    def _item(self, index):
+        return ReviewItem.objects.get(user=self.student, question=self.questions[index])
+
+    def test_wrong_answers_are_queued(self):
+        self._submit(1)
+        item = ReviewItem.objects.get(user=self.student)
+        self.assertEqual(item.question_id, self.questions[1].pk)
+        self.assertEqual((item.interval, item.repetitions, item.lapses), (1, 0, 1))
+        self.assertAlmostEqual(item.ease_factor, 1.96)
+
+    def test_intervals_grow_with_correct_answers(self):
+        self._submit(0)
+        intervals, eases = [], []
+        for _ in range(3):
+            self._submit()
+            item = self._item(0)
+            intervals.append(item.interval)
+            eases.append(item.ease_factor)
+        self.assertEqual(intervals, [1, 6, 12])
+        self.assertEqual([round(ease, 2) for ease in eases], [1.96] * 3)
+        self._submit(0)
+        item = self._item(0)
+        self.assertEqual((item.interval, item.repetitions, item.lapses), (1, 0, 2))
+        self.assertAlmostEqual(item.ease_factor, 1.42)
+
+    def test_schedule(self):
+        now = timezone.now()
+        item = ReviewItem(ease_factor=2.5, interval=6, repetitions=2, due_at=now)
+        reviews.schedule(item, 5, now)
+        self.assertEqual((item.interval, item.repetitions), (15, 3))
+        self.assertAlmostEqual(item.ease_factor, 2.6)
+        self.assertEqual(item.due_at, now + datetime.timedelta(days=15))
+        for _ in range(5):
+            reviews.schedule(item, 0, now)
+        self.assertEqual(item.ease_factor, reviews.MIN_EASE)
+
+    def test_due_items_are_ordered_by_due_date(self):
+        now = timezone.now()
+        offsets = [-1, -5, 2]
+        for question, days in zip(self.questions, offsets):
+            ReviewItem.objects.create(user=self.student, question=question, due_at=now + datetime.timedelta(days=days))
+        ReviewItem.objects.create(user=self.teacher, question=self.questions[2],
+                                  due_at=now - datetime.timedelta(days=9))
+        due = list(reviews.due_items(self.student, now=now))
+        self.assertEqual([item.question_id for item in due], [self.questions[1].pk, self.questions[0].pk])
+        self.assertEqual(len(reviews.due_items(self.student, limit=1, now=now)), 1)
+        response = api_client(self.student).get('/courses/reviews/due/')
+        self.assertEqual([item['question']['id'] for item in response.data], [q.pk for q in self.questions[1::-1]])
+
+    def test_review_with_answers(self):
+        self._submit(0)
+        item = self._item(0)
+        response = api_client(self.student).post('/courses/reviews/{}/review/'.format(item.pk),
+                                                 {'answers': [self.correct[0].pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['interval'], response.data['repetitions']), (1, 1))
+        response = api_client(self.teacher).post('/courses/reviews/{}/review/'.format(item.pk), {'quality': 5},
+                                                 format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_updating_test_keeps_review_items(self):
+        self._submit(0, 1)
+        first, second, third = self.questions
+        data = {'title': 'Final', 'questions': [
+            {'id': first.pk, 'text': 'changed', 'answers': [
+                {'id': self.correct[0].pk, 'text': 'yes', 'is_correct': True}, {'text': 'maybe'}]},
+            {'id': third.pk, 'text': third.text, 'answers': [{'text': 'yes', 'is_correct': True}]},
+            {'text': 'new', 'answers': [{'text': 'yes', 'is_correct': True}]},
+        ]}
+        serializer = TestSerializer(self.test, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        test = serializer.save()
+        self.assertEqual(test.questions_count, 3)
+        first.refresh_from_db()
+        self.assertEqual(first.text, 'changed')
+        self.assertEqual(sorted(first.answers.values_list('text', flat=True)), ['maybe', 'yes'])
+        self.assertTrue(first.answers.filter(pk=self.correct[0].pk).exists())
+        self.assertFalse(Question.objects.filter(pk=second.pk).exists())
+        self.assertEqual(list(ReviewItem.objects.values_list('question_id', flat=True)), [first.pk])
+
+    def test_updating_test_without_questions_keeps_them(self):
+        serializer = TestSerializer(self.test, data={'title': 'Renamed'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(self.test.questions.count(), 3)
+
+    def test_updating_test_with_foreign_question_fails(self):
+        other = Test.objects.create(course=self.course, title='Other')
+        foreign = Question.objects.create(test=other, text='?')
+        data = {'title': 'Final', 'questions': [{'id': foreign.pk, 'text': 'x', 'answers': [{'text': 'a'}]}]}
+        serializer = TestSerializer(self.test, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertEqual(self.test.questions.count(), 3)
+
+
+class QuestionBankTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_user('teacher', 'teacher')
+        course = Course.objects.create(title='Course', description='', author=teacher)
+        cls.test = Test.objects.create(course=course, title='Final')
+        cls.question = Question.objects.create(test=cls.test, text='one')
+        cls.answer = Answer.objects.create(question=cls.question, text='yes', is_correct=True)
+        cls.client_ = api_client(teacher)
+
+    def setUp(self):
+        # Список вопросов для попыток кэшируется только в общем кэше
+        self.enterContext(shared_cache())
+
+    def _batch(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_.post('/courses/api/tests/{}/questions/batch/'.format(self.test.pk), data,
+                                     format='json')
+
+    def _import(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_.post('/courses/api/tests/{}/questions/import/'.format(self.test.pk),
+                                     {'file': ContentFile(content, name=name)}, format='multipart')
+
+    def _read(self, reader, content):
+        return list(reader(io.BytesIO(content.encode())))
+
+    def test_batch(self):
+        self.assertEqual(attempts.question_ids(self.test.pk), [self.question.pk])
+        response = self._batch({
+            'create': [{'text': 'two', 'answers': [{'text': 'a', 'is_correct': True}, {'text': 'b'}]}],
+            'update': [{'id': self.question.pk, 'text': 'one!', 'answers': [
+                {'id': self.answer.pk, 'text': 'yes', 'is_correct': True}, {'text': 'no'}]}],
+        })
+        self.assertEqual(response.status_code, 200, response.json())
+        created = response.json()['created']
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(self.question.answers.count(), 2)
+        self.assertEqual(Test.objects.get(pk=self.test.pk).questions_count, 2)
+        # Новые вопросы сразу видны попыткам, а не после истечения кэша
+        self.assertEqual(sorted(attempts.question_ids(self.test.pk)), sorted([self.question.pk] + created))
+
+        response = self._batch({'delete': created})
+        self.assertEqual(response.json()['deleted'], 1)
+        self.assertEqual(attempts.question_ids(self.test.pk), [self.question.pk])
+
+    def test_batch_rejects_empty_answers(self):
+        response = self._batch({'update': [{'id': self.question.pk, 'text': 'one', 'answers': []}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.question.answers.count(), 1)
+        # Без answers ответы не трогаются
+        response = self._batch({'update': [{'id': self.question.pk, 'text': 'one?'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.question.answers.count(), 1)
+
+    def test_batch_rejects_foreign_question(self):
+        other = Test.objects.create(course=self.test.course, title='Other')
+        question = Question.objects.create(test=other, text='x')
+        response = self._batch({'update': [{'id': question.pk, 'text': 'y'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Question.objects.get(pk=question.pk).text, 'x')
+
+    def test_read_csv(self):
+        rows = self._read(question_import.read_csv,
+                          'question,answer1,answer2,answer3,correct\n'
+                          'Capital of France?,Paris,Rome,,1\n'
+                          '\n'
+                          '"Two, correct",a,b,c,1;3\n'
+                          'Bad,a,b,,5\n')
+        self.assertEqual(rows[0], (2, {'text': 'Capital of France?', 'answers': [
+            {'text': 'Paris', 'is_correct': True}, {'text': 'Rome', 'is_correct': False}]}, None))
+        self.assertEqual([a['is_correct'] for a in rows[1][1]['answers']], [True, False, True])
+        self.assertEqual(rows[2][:2], (5, None))
+        self.assertIn('correct', rows[2][2])
+        with self.assertRaises(question_import.ImportFormatError):
+            self._read(question_import.read_csv, 'text,answer\nx,y\n')
+
+    def test_read_gift(self):
+        rows = self._read(question_import.read_gift,
+                          '$CATEGORY: verbs\n'
+                          '// comment\n'
+                          '::Q1:: Past of "go"? {=went ~goed#no ~%50%gone}\n'
+                          '\n'
+                          'The sky is green. {F}\n'
+                          '\n'
+                          'Paris is the capital {=of France} in Europe.\n'
+                          '\n'
+                          'Describe it. {}\n')
+        self.assertEqual(rows[0], (3, {'text': 'Past of "go"?', 'answers': [
+            {'text': 'went', 'is_correct': True}, {'text': 'goed', 'is_correct': False},
+            {'text': 'gone', 'is_correct': True}]}, None))
+        self.assertEqual(rows[1][1]['answers'], [{'text': 'True', 'is_correct': False},
+                                                 {'text': 'False', 'is_correct': True}])
+        self.assertEqual(rows[2][1]['text'], 'Paris is the capital _____ in Europe.')
+        self.assertEqual(rows[3][:2], (9, None))
+
+    def test_read_xml(self):
+        rows = self._read(question_import.read_xml, """<?xml version="1.0"?>
+<quiz>
+  <question type="category"><category><text>verbs</text></category></question>
+  <question type="multichoice">
+    <questiontext format="html"><text><![CDATA[<p>Past of &quot;go&quot;?</p>]]></text></questiontext>
+    <answer fraction="100"><text>went</text></answer>
+    <answer fraction="0"><text>goed</text></answer>
+  </question>
+  <question type="essay"><questiontext><text>Describe</text></questiontext></question>
+</quiz>""")
+        self.assertEqual(rows[0], (1, {'text': 'Past of "go"?', 'answers': [
+            {'text': 'went', 'is_correct': True}, {'text': 'goed', 'is_correct': False}]}, None))
+        self.assertEqual(rows[1][:2], (2, None))
+        with self.assertRaises(question_import.ImportFormatError):
+            self._read(question_import.read_xml, '<quiz><question>')
+
+    def test_import(self):
+        self.assertEqual(attempts.question_ids(self.test.pk), [self.question.pk])
+        response = self._import('bank.csv', b'question,answer1,answer2,correct\nTwo?,a,b,2\nNo answers,,,\n')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['row'], 3)
+        self.assertEqual(len(attempts.question_ids(self.test.pk)), 2)
+        self.assertEqual(Test.objects.get(pk=self.test.pk).questions_count, 2)
+
+        response = self.client_.post('/courses/api/tests/{}/questions/import/'.format(self.test.pk),
+                                     {'file': ContentFile(b'Dry? {T}\n', name='bank.gift'), 'dry_run': 'true'},
+                                     format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(self.test.questions.count(), 2)
+
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        cls.student = make_user('student')
+        course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.test = Test.objects.create(course=course, title='Final')
+        cls.single = Question.objects.create(test=cls.test, text='One')
+        cls.multi = Question.objects.create(test=cls.test, text='Many')
+        cls.a = Answer.objects.create(question=cls.single, text='a', is_correct=True)
+        cls.b = Answer.objects.create(question=cls.single, text='b')
+        cls.c = Answer.objects.create(question=cls.multi, text='c', is_correct=True)
+        cls.d = Answer.objects.create(question=cls.multi, text='d', is_correct=True)
+        cls.e = Answer.objects.create(question=cls.multi, text='e')
+        submissions = [
+            {str(cls.single.pk): [cls.a.pk], str(cls.multi.pk): [cls.d.pk, cls.c.pk]},
+            {str(cls.single.pk): [str(cls.a.pk)], str(cls.multi.pk): [cls.c.pk]},
+            {str(cls.single.pk): [cls.a.pk, cls.b.pk], str(cls.multi.pk): [cls.c.pk, cls.d.pk, cls.e.pk]},
+            {str(cls.multi.pk): ['x']},
+            [],
+        ]
+        cls.results = [TestResult.objects.create(user=cls.student, test=cls.test, score=i, answers=answers)
+                       for i, answers in enumerate(submissions)]
+        cls.expected = [(True, True), (True, False), (False, False), (False, False), (False, False)]
+
+    def _export(self, **params):
+        response = api_client(self.teacher).get('/courses/api/tests/{}/results/export/'.format(self.test.pk), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_grade_answers(self):
+        correct = exports.correct_answers_by_question(self.test.pk)
+        self.assertEqual(correct, {self.single.pk: {self.a.pk}, self.multi.pk: {self.c.pk, self.d.pk}})
+        graded = [exports.grade_answers(correct, result.answers) for result in self.results]
+        self.assertEqual(graded, [{self.single.pk: single, self.multi.pk: multi} for single, multi in self.expected])
+
+    def test_csv_details(self):
+        rows = list(csv.reader(io.StringIO(self._export(details=1))))
+        self.assertEqual(rows[0], exports.BASE_COLUMNS + ['q{}'.format(self.single.pk), 'q{}'.format(self.multi.pk)])
+        self.assertEqual(len(rows), len(self.results) + 1)
+        for row, result, (single, multi) in zip(rows[1:], self.results, self.expected):
+            self.assertEqual(row[:4], [str(result.pk), str(self.student.pk), 'student', str(result.score)])
+            self.assertEqual(row[4], result.created_at.isoformat())
+            self.assertEqual(row[5:], [str(int(single)), str(int(multi))])
+
+    def test_csv_without_details(self):
+        rows = list(csv.reader(io.StringIO(self._export())))
+        self.assertEqual(rows[0], exports.BASE_COLUMNS)
+        self.assertEqual([row[0] for row in rows[1:]], [str(result.pk) for result in self.results])
+
+    def test_jsonl(self):
+        lines = [json.loads(line) for line in self._export(output='jsonl', details='true').splitlines()]
+        self.assertEqual([line['id'] for line in lines], [result.pk for result in self.results])
+        self.assertEqual([line['correct'] for line in lines],
+                         [{str(self.single.pk): single, str(self.multi.pk): multi} for single, multi in self.expected])
+        plain = json.loads(self._export(output='jsonl').splitlines()[0])
+        self.assertEqual(sorted(plain), sorted(exports.BASE_COLUMNS))
+
+    def test_export_errors(self):
+        url = '/courses/api/tests/{}/results/export/'
+        self.assertEqual(api_client(self.teacher).get(url.format(self.test.pk), {'output': 'xml'}).status_code, 400)
+        self.assertEqual(api_client(self.teacher).get(url.format(0)).status_code, 404)
+        self.assertEqual(api_client(self.student).get(url.format(self.test.pk)).status_code, 403)
+
+
+class LiveFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher', 'teacher')
+        course = Course.objects.create(title='Course', description='', author=cls.teacher)
+        cls.test = Test.objects.create(course=course, title='Final')
+        cls.first = TestResult.objects.create(user=cls.teacher, test=cls.test, score=4, answers={})
+        cls.second = TestResult.objects.create(user=cls.teacher, test=cls.test, score=8, answers={})
+
+    def test_wsgi_returns_snapshot_and_closes(self):
+        response = api_client(self.teacher).get('/courses/api/tests/{}/results/stream/'.format(self.test.pk),
+                                                HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=str(self.first.pk))
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('id: {}\n'.format(self.second.pk), body)
+        self.assertNotIn('id: {}\n'.format(self.first.pk), body)
+        self.assertIn('"count": 2, "avg": 6.0, "max": 8', body)
+
+    def test_asgi_request_gets_long_stream(self):
+        token = AccessToken.for_user(self.teacher)
+        client = AsyncClient()
+        with mock.patch.object(live, 'stream', wraps=live.stream) as stream, \
+                mock.patch.object(live, 'STREAM_SECONDS', 0):
+            response = async_to_sync(client.get)('/courses/api/tests/{}/results/stream/'.format(self.test.pk),
+                                                 headers={'Accept': 'text/event-stream',
+                                                          'Authorization': 'Bearer {}'.format(token)})
+        self.assertEqual(response.status_code, 200)
+        stream.assert_called_once()
+
+    def test_async_stream_receives_published_results(self):
+        backend = live.LocalBackend()
+
+        async def consume():
+            feed = live.stream(self.test.pk)
+            try:
+                head = [await feed.__anext__(), await feed.__anext__()]
+                event = {'id': self.second.pk + 1, 'user': self.teacher.pk, 'test': self.test.pk, 'score': 3}
+                # Публикация идёт из другого потока, как из обработчика запроса
+                thread = threading.Thread(target=backend.publish, args=(self.test.pk, event))
+                thread.start()
+                thread.join()
+                return head, [await feed.__anext__(), await feed.__anext__()]
+            finally:
+                await feed.aclose()
+
+        with mock.patch.object(live, '_backend', backend):
+            head, tail = async_to_sync(consume)()
+        self.assertTrue(head[0].startswith('retry:'))
+        self.assertIn('"count": 2', head[1])
+        self.assertIn('event: result', tail[0])
+        self.assertIn('"count": 3, "avg": 5.0, "max": 8', tail[1])
+        self.assertEqual(backend._subscribers, {})
+
+    def test_listener_reconnects_after_error(self):
+        backend = live.PostgresBackend()
+        with mock.patch.object(backend, '_listen_once', side_effect=[OSError('gone'), KeyboardInterrupt]) as listen, \
+                mock.patch.object(live.time, 'sleep'), self.assertLogs('courses.live', 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                backend._listen()
+        self.assertEqual(listen.call_count, 2)
+
+
+class LeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Course', description='', author=teacher)
+        cls.other_course = Course.objects.create(title='Other', description='', author=teacher)
+        cls.test = Test.objects.create(course=cls.course, title='Final')
+        cls.users = [make_user('student{}'.format(i)) for i in range(3)]
+
+    def setUp(self):
+        leaderboard.clear_cache()
+        self.addCleanup(leaderboard.clear_cache)
+
+    def test_ranking_updates(self):
+        now = timezone.now()
+        ranking = leaderboard.Ranking([(1, 5, now), (2, 7, now), (3, 5, now + datetime.timedelta(seconds=1))])
+        self.assertEqual(ranking.top(3), [(2, 7), (1, 5), (3, 5)])
+        ranking.update(3, 9, now)
+        self.assertEqual((ranking.rank(3), ranking.rank(2), ranking.rank(1)), (1, 2, 3))
+        self.assertEqual(ranking.top(2), [(3, 9), (2, 7)])
+        self.assertIsNone(ranking.rank(4))
+
+    def test_migration_fill_matches_rebuild(self):
+        lesson = Lesson.objects.create(course=self.other_course, title='Lesson', description='', order=0)
+        lesson_test = Test.objects.create(lesson=lesson, title='Quiz')
+        for test, scores in ((self.test, (3, 6, 9)), (lesson_test, (4, 2, 8))):
+            for user, score in zip(self.users, scores):
+                TestResult.objects.create(user=user, test=test, score=score, answers={})
+                TestResult.objects.create(user=user, test=test, score=score - 1, answers={})
+
+        def entries():
+            rows = LeaderboardEntry.objects.values_list('course_id', 'test_id', 'user_id', 'score', 'achieved_at')
+            return sorted(rows, key=str)
+
+        leaderboard.rebuild()
+        rebuilt = entries()
+        LeaderboardEntry.objects.all().delete()
+        importlib.import_module('courses.migrations.0009_leaderboard').fill_leaderboards(django_apps, None)
+        self.assertEqual(entries(), rebuilt)
+        # По строке на тест и на курс для каждого из трёх пользователей
+        self.assertEqual(len(rebuilt), 12)
+
+    def test_new_results_reach_loaded_board(self):
+        for user, score in zip(self.users, (3, 6, 9)):
+            TestResult.objects.create(user=user, test=self.test, score=score, answers={})
+        self.assertEqual(leaderboard.standings(self.course.pk, user=self.users[0])['me'], {'rank': 3, 'score': 3})
+        with self.captureOnCommitCallbacks(execute=True):
+            TestResult.objects.create(user=self.users[0], test=self.test, score=10, answers={})
+        standings = leaderboard.standings(self.course.pk, self.test.pk, user=self.users[0])
+        self.assertEqual(standings['me'], {'rank': 1, 'score': 10})
+        self.assertEqual([row['username'] for row in standings['top']], ['student0', 'student2', 'student1'])
+
+    def test_loading_one_board_does_not_block_others(self):
+        leaderboard.standings(self.other_course.pk)
+        loading, release = threading.Event(), threading.Event()
+        load = leaderboard._load
+
+        def slow_load(course_id, test_id):
+            if course_id == self.course.pk:
+                loading.set()
+                release.wait(5)
+            return load(course_id, test_id)
+
+        def read_board():
+            try:
+                board = leaderboard._board(self.course.pk, None)
+                with board.lock:
+                    leaderboard._ranking(board, self.course.pk, None)
+            finally:
+                connection.close()
+
+        with mock.patch.object(leaderboard, '_load', side_effect=slow_load):
+            thread = threading.Thread(target=read_board)
+            thread.start()
+            self.assertTrue(loading.wait(5))
+            try:
+                self.assertEqual(leaderboard.standings(self.other_course.pk)['total'], 0)
+            finally:
+                release.set()
+                thread.join()
+
+
+class MediaTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.root = directory.name
+        teacher = make_user('teacher', 'teacher')
+        self.course = Course.objects.create(title='Course', description='', author=teacher)
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson', description='', order=0)
+
+    def _section(self, content=b'video'):
+        section = Section(lesson=self.lesson, title='S', content='', order=0)
+        section.video.save('clip.mp4', ContentFile(content))
+        return section
+
+    def _refcount(self, name):
+        return MediaBlob.objects.filter(name=name).values_list('refcount', flat=True).first()
+
+    def test_sections_share_blob_and_release_it_on_delete(self):
+        first, second = self._section(), self._section()
+        name = first.video.name
+        self.assertEqual(second.video.name, name)
+        self.assertTrue(name.startswith('videos/'))
+        self.assertEqual(self._refcount(name), 2)
+        Section.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self._refcount(name), 1)
+        self.lesson.delete()
+        self.assertEqual(self._refcount(name), 0)
+
+    def test_storage_keeps_referenced_file(self):
+        section = self._section()
+        storage = video_storage()
+        storage.delete(section.video.name)
+        self.assertTrue(storage.exists(section.video.name))
+        section.delete()
+        storage.delete(section.video.name)
+        self.assertFalse(storage.exists(section.video.name))
+        self.assertIsNone(self._refcount(section.video.name))
+
+    def test_collect_walks_only_the_video_store(self):
+        section = self._section(b'kept')
+        orphan = video_storage().save('clip.mp4', ContentFile(b'orphan'))
+        foreign = os.path.join(self.root, 'avatars', 'ab', 'ab' + '0' * 62 + '.png')
+        os.makedirs(os.path.dirname(foreign))
+        open(foreign, 'wb').close()
+        for path in (foreign, video_storage().path(orphan)):
+            os.utime(path, (0, 0))
+        self.assertEqual(media.collect(grace_seconds=60), [orphan])
+        self.assertTrue(os.path.exists(foreign))
+        self.assertTrue(video_storage().exists(section.video.name))
+
+
+
+
+class CopyTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.teacher = make_user('teacher', 'teacher')
+        self.other = make_user('other', 'teacher')
+        self.course = Course.objects.create(title='Course', description='About', author=self.teacher)
+        for i in (2, 1):
+            lesson = Lesson(course=self.course, title='L{}'.format(i), description='', order=i)
+            lesson.video.save('intro.mp4', ContentFile(b'intro'))
+            for j in range(2):
+                section = Section(lesson=lesson, title='S{}'.format(j), content='**{}**'.format(j), order=j)
+                if j:
+                    section.video.save('clip.mp4', ContentFile(b'clip'))
+                else:
+                    section.save()
+            test = Test.objects.create(lesson=lesson, title='Quiz {}'.format(i))
+            self._questions(test, 2)
+        final = Test.objects.create(course=self.course, title='Final', time_limit=30)
+        self._questions(final, 3)
+        self.lesson = lesson
+
+    def _questions(self, test, count):
+        for i in range(count):
+            question = Question.objects.create(test=test, text='Q{}'.format(i))
+            Answer.objects.create(question=question, text='yes', is_correct=True)
+            Answer.objects.create(question=question, text='no')
+
+    def _tree(self, course):
+        course.refresh_from_db()
+
+        def questions(test):
+            return [(q.text, [(a.text, a.is_correct) for a in q.answers.order_by('id')])
+                    for q in test.questions.order_by('id')]
+
+        def test_row(test):
+            return (test.title, test.time_limit, test.questions_count, questions(test))
+
+        lessons = [
+            (lesson.title, lesson.order, lesson.video.name, lesson.sections_count, lesson.tests_count,
+             [(s.title, s.content_html, s.video.name, s.order) for s in lesson.sections.order_by('order')],
+             [test_row(test) for test in lesson.tests.order_by('id')])
+            for lesson in course.lessons.order_by('order')
+        ]
+        finals = [test_row(test) for test in course.final_tests.order_by('id')]
+        return course.description, course.lessons_count, course.tests_count, lessons, finals
+
+    def _ids(self, course):
+        tests = Test.objects.filter(Q(course=course) | Q(lesson__course=course))
+        return {
+            'lessons': set(course.lessons.values_list('pk', flat=True)),
+            'sections': set(Section.objects.filter(lesson__course=course).values_list('pk', flat=True)),
+            'tests': set(tests.values_list('pk', flat=True)),
+            'questions': set(Question.objects.filter(test__in=tests).values_list('pk', flat=True)),
+            'answers': set(Answer.objects.filter(question__test__in=tests).values_list('pk', flat=True)),
+        }
+
+    def _refcounts(self):
+        return dict(MediaBlob.objects.values_list('name', 'refcount'))
+
+    def test_copy_keeps_content_and_counters(self):
+        refcounts = self._refcounts()
+        copy = copying.copy_course(self.course, author=self.other, title='Copy')
+        self.assertNotEqual(copy.pk, self.course.pk)
+        self.assertEqual((copy.title, copy.author), ('Copy', self.other))
+        self.assertEqual(self._tree(copy), self._tree(self.course))
+        self.assertEqual(self._tree(copy)[:3], ('About', 2, 1))
+        original, copied = self._ids(self.course), self._ids(copy)
+        for kind, ids in copied.items():
+            self.assertEqual(len(ids), len(original[kind]), kind)
+            self.assertFalse(ids & original[kind], kind)
+        self.assertEqual(self._refcounts(), {name: count * 2 for name, count in refcounts.items()})
+
+    def test_copy_query_count_does_not_grow_with_course(self):
+        with CaptureQueriesContext(connection) as small:
+            copying.copy_course(self.course)
+        for i in range(5):
+            self._questions(Test.objects.create(lesson=self.lesson, title=str(i)), 3)
+            Section.objects.create(lesson=self.lesson, title=str(i), content='', order=10 + i)
+        with CaptureQueriesContext(connection) as large:
+            copying.copy_course(self.course)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_copy_endpoint(self):
+        response = api_client(self.other).post('/courses/{}/copy/'.format(self.course.pk), {'title': 'Mine'},
+                                               format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['title'], response.data['lessons_count']), ('Mine', 2))
+        self.assertEqual(response.data['author']['id'], self.other.pk)
+        self.assertEqual(self.client.post('/courses/{}/copy/'.format(self.course.pk)).status_code, 401)
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.teacher = make_user('teacher', 'teacher')
+        self.course = Course.objects.create(title='Course', description='', author=self.teacher)
+        self.lesson = Lesson(course=self.course, title='Lesson', description='', order=0)
+        self.lesson.video.save('intro.mp4', ContentFile(b'intro'))
+        self.section = Section(lesson=self.lesson, title='S', content='*text*', order=0)
+        self.section.video.save('clip.mp4', ContentFile(b'clip'))
+
+    def _refcount(self, name):
+        return MediaBlob.objects.filter(name=name).values_list('refcount', flat=True).first()
+
+    def _archive(self, records, media=()):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            for name, content in [('manifest.jsonl', b''.join(json.dumps(r).encode() + b'\n' for r in records)),
+                                  *media]:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        buffer.seek(0)
+        return archive.import_course(buffer, self.teacher)
+
+    def _records(self, video):
+        return [
+            {'type': 'archive', 'version': archive.ARCHIVE_VERSION},
+            {'type': 'course', 'title': 'Imported'},
+            {'type': 'lesson', 'id': 1, 'title': 'L', 'video': video},
+        ]
+
+    def test_round_trip_with_media(self):
+        data = b''.join(archive.export_course(self.course, include_media=True))
+        imported = archive.import_course(io.BytesIO(data), self.teacher)
+        lesson = imported.lessons.get()
+        section = lesson.sections.get()
+        self.assertEqual(lesson.video.name, self.lesson.video.name)
+        self.assertEqual(section.video.name, self.section.video.name)
+        self.assertEqual(section.content_html, self.section.content_html)
+        self.assertEqual((imported.lessons_count, lesson.sections_count), (1, 1))
+        self.assertEqual(self._refcount(self.lesson.video.name), 2)
+        self.assertEqual(self._refcount(self.section.video.name), 2)
+
+    def test_videos_without_media_members_are_dropped(self):
+        data = b''.join(archive.export_course(self.course))
+        imported = archive.import_course(io.BytesIO(data), self.teacher)
+        lesson = imported.lessons.get()
+        self.assertFalse(lesson.video)
+        self.assertFalse(lesson.sections.get().video)
+        self.assertEqual(self._refcount(self.lesson.video.name), 1)
+
+    def test_video_name_is_taken_from_content(self):
+        # Файл архива под чужим именем сохраняется под хэшем своего содержимого
+        imported = self._archive(self._records(self.lesson.video.name),
+                                 [('media/' + self.lesson.video.name, b'other')])
+        name = imported.lessons.get().video.name
+        self.assertNotEqual(name, self.lesson.video.name)
+        self.assertEqual(video_storage().open(name).read(), b'other')
+        self.assertEqual(video_storage().open(self.lesson.video.name).read(), b'intro')
+        self.assertEqual(self._refcount(self.lesson.video.name), 1)
+
+    def test_unreferenced_media_members_are_skipped(self):
+        imported = self._archive(self._records(''), [('media/videos/extra.mp4', b'extra')])
+        self.assertFalse(imported.lessons.get().video)
+        self.assertFalse(video_storage().exists('videos/extra.mp4'))
+        self.assertEqual(MediaBlob.objects.count(), 2)
+
+    def test_unsafe_paths(self):
+        for video in ('../../etc/passwd', '/etc/passwd', 'videos/../../settings.py'):
+            with self.subTest(video=video):
+                imported = self._archive(self._records(video))
+                self.assertFalse(imported.lessons.get().video)
+                with self.assertRaises(archive.ArchiveError):
+                    self._archive(self._records(video), [('media/' + video, b'evil')])
+        self.assertEqual(Course.objects.filter(title='Imported').count(), 3)
+
+
+class RenderingTests(TestCase):
+
+    def test_raw_html_is_escaped(self):
+        self.assertEqual(rendering.render('<script>alert(1)</script>'), '<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>')
+        html = rendering.render('# <img src=x onerror=alert(1)>\n- <b onclick="x">')
+        self.assertNotIn('<img', html)
+        self.assertNotIn('<b ', html)
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', html)
+
+    def test_links(self):
+        self.assertEqual(
+            rendering.render('[a "b"](https://example.com/?q="y")'),
+            '<p><a href="https://example.com/?q=&quot;y&quot;" rel="nofollow noopener" target="_blank">'
+            'a &quot;b&quot;</a></p>')
+        for url in ('javascript:alert(1)', 'data:text/html;base64,PHNjcmlwdD4=', 'JaVaScRiPt:alert(1)'):
+            self.assertNotIn('<a', rendering.render('[x]({})'.format(url)))
+        # Разметка не попадает внутрь адреса
+        self.assertIn('href="http://x.*"', rendering.render('[t](http://x.*) b*'))
+        self.assertEqual(rendering.render('[x](http://a`b`c)'), '<p>[x](http://a<code>b</code>c)</p>')
+
+    def test_code(self):
+        self.assertEqual(rendering.render('`<b>` and `**x**`'),
+                         '<p><code>&lt;b&gt;</code> and <code>**x**</code></p>')
+        self.assertEqual(rendering.render('```\n<script>\n**x** [a](http://b)\n```\nafter'),
+                         '<pre><code>&lt;script&gt;\n**x** [a](http://b)</code></pre>\n<p>after</p>')
+        # Незакрытый блок кода идёт до конца текста
+        self.assertEqual(rendering.render('```\n<i>'), '<pre><code>&lt;i&gt;</code></pre>')
+
+    def test_nested_emphasis(self):
+        self.assertEqual(rendering.render('**bold *it* bold**'), '<p><strong>bold <em>it</em> bold</strong></p>')
+        self.assertEqual(rendering.render('*a **b** c*'), '<p><em>a <strong>b</strong> c</em></p>')
+        self.assertEqual(rendering.render('***both*** and **c *d***'),
+                         '<p><strong><em>both</em></strong> and <strong>c <em>d</em></strong></p>')
+        self.assertEqual(rendering.render('[**b** `c`](http://x.com)'),
+                         '<p><a href="http://x.com" rel="nofollow noopener" target="_blank">'
+                         '<strong>b</strong> <code>c</code></a></p>')
+
+    def test_migration_copy(self):
+        # 0012 рисует своей копией рендерера: пока версии совпадают, результат
+        # тот же, а после смены версии хэши расходятся и render_sections перерисует секции
+        migration = importlib.import_module('courses.migrations.0012_section_content_html')
+        content = '# T\n- **a** `b` [c](http://x.com)\n\n```\n<i>\n```'
+        same_version = migration.RENDERER_VERSION == rendering.RENDERER_VERSION
+        self.assertEqual(migration.content_hash(content) == rendering.content_hash(content), same_version)
+        if same_version:
+            self.assertEqual(migration.render(content), rendering.render(content))
+
+    def test_save_renders_content(self):
+        course = Course.objects.create(title='Course', description='', author=make_user('teacher', 'teacher'))
+        lesson = Lesson.objects.create(course=course, title='Lesson', description='', order=0)
+        section = Section.objects.create(lesson=lesson, title='S', content='**a**', order=0)
+        self.assertEqual(section.content_html, '<p><strong>a</strong></p>')
+        section.content = '*b*'
+        section.save(update_fields=['content'])
+        section.refresh_from_db()
+        self.assertEqual(section.content_html, '<p><em>b</em></p>')
+        self.assertEqual(section.content_hash, rendering.content_hash('*b*'))
+        # Сохранение других полей html не трогает
+        Section.objects.filter(pk=section.pk).update(content_html='stale')
+        section.title = 'T'
+        section.save(update_fields=['title'])
+        section.refresh_from_db()
+        self.assertEqual(section.content_html, 'stale')
+        # Устаревший хэш (другая версия рендерера) перерисовывается render_all
+        Section.objects.filter(pk=section.pk).update(content_hash='')
+        self.assertEqual(rendering.render_all(), 1)
+        section.refresh_from_db()
+        self.assertEqual(section.content_html, '<p><em>b</em></p>')
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = make_user('teacher', 'teacher')
+        cls.course = Course.objects.create(title='Grammar basics', description='Verbs and grammar', author=teacher)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Grammar of verbs', description='', order=0)
+        cls.section = Section.objects.create(lesson=cls.lesson, title='Irregular', content='Irregular grammar forms',
+                                             order=0)
+        cls.client_ = api_client(make_user('student'))
+
+    def _search(self, **params):
+        response = self.client_.get('/courses/search/', {'q': 'grammar', **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id'], row['course_id'], row['lesson_id']) for row in response.json()['results']]
+
+    def test_all_kinds(self):
+        self.assertCountEqual(self._search(), [
+            ('course', self.course.pk, self.course.pk, None),
+            ('lesson', self.lesson.pk, self.course.pk, self.lesson.pk),
+            ('section', self.section.pk, self.course.pk, self.lesson.pk),
+        ])
+
+    def test_type_filter(self):
+        self.assertEqual(self._search(type='lesson'), [('lesson', self.lesson.pk, self.course.pk, self.lesson.pk)])
+        self.assertEqual(self._search(type='section'),
+                         [('section', self.section.pk, self.course.pk, self.lesson.pk)])
+        self.assertCountEqual(self._search(type='section,lesson'), [
+            ('lesson', self.lesson.pk, self.course.pk, self.lesson.pk),
+            ('section', self.section.pk, self.course.pk, self.lesson.pk),
+        ])
+
+    def test_snippet_is_highlighted(self):
+        response = self.client_.get('/courses/search/', {'q': 'irregular', 'type': 'section'})
+        self.assertIn('<mark>', response.json()['results'][0]['snippet'])
+
+    def test_index_follows_edits(self):
+        self.section.content = 'Phonetics'
+        self.section.title = 'Sounds'
+        self.section.save()
+        self.assertEqual(self._search(type='section'), [])
+
+
+class AdminSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(title='Grammar basics', description='', author=make_user('teacher', 'teacher'))
+        cls.test = Test.objects.create(course=course, title='Verbs')
+        cls.question = Question.objects.create(test=cls.test, text='What is the past tense of "go"? ' * 10)
+        Question.objects.create(test=cls.test, text='Pick the article')
+
+    def _search(self, model, term):
+        queryset, _ = admin.site._registry[model].get_search_results(None, model.objects.all(), term)
+        return queryset
+
+    def test_question_prefix_ignores_case(self):
+        self.assertEqual(list(self._search(Question, 'what IS')), [self.question])
+        self.assertEqual(list(self._search(Question, 'is the')), [])
+
+    def test_question_term_longer_than_indexed_prefix(self):
+        self.assertEqual(list(self._search(Question, self.question.text[:150].upper())), [self.question])
+        self.assertEqual(list(self._search(Question, self.question.text[:120] + 'x')), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'индексы по выражениям создаются только на PostgreSQL')
+    def test_searches_use_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plans = {
+            'courses_test_title_upper_idx': self._search(Test, 'verb').explain(),
+            'courses_question_text_upper_idx': self._search(Question, 'what').explain(),
+            'users_user_email_upper_idx': User.objects.filter(email__iexact='Teacher@example.com').explain(),
+        }
+        for index, plan in plans.items():
+            self.assertIn(index, plan)
+
+
+class AdminInlineTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.course = Course.objects.create(title='Course', description='', author=make_user('teacher', 'teacher'))
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson', description='', order=0)
+
+    def _post(self, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302, getattr(response, 'context_data', {}).get('errors'))
+
+    def _formset(self, prefix, forms, initial):
+        data = {prefix + '-TOTAL_FORMS': len(forms), prefix + '-INITIAL_FORMS': initial,
+                prefix + '-MIN_NUM_FORMS': 0, prefix + '-MAX_NUM_FORMS': 1000}
+        for i, form in enumerate(forms):
+            data.update({'{}-{}-{}'.format(prefix, i, name): value for name, value in form.items()})
+        return data
+
+    def test_section_inline_renders_html_and_counts_videos(self):
+        section = Section(lesson=self.lesson, title='S', content='old', order=0)
+        section.video.save('a.mp4', ContentFile(b'first'))
+        old_video = section.video.name
+        data = {'course': self.course.pk, 'title': 'Lesson', 'description': '', 'order': 0}
+        data.update(self._formset('sections', [
+            {'id': section.pk, 'lesson': self.lesson.pk, 'title': 'S', 'order': 0, 'content': '**new**',
+             'video': ContentFile(b'second', name='b.mp4')},
+            {'lesson': self.lesson.pk, 'title': 'T', 'order': 1, 'content': '*x*',
+             'video': ContentFile(b'first', name='c.mp4')},
+        ], initial=1))
+        self._post('/admin/courses/lesson/{}/change/'.format(self.lesson.pk), data)
+
+        changed, created = Section.objects.filter(lesson=self.lesson).order_by('order')
+        self.assertEqual(changed.content_html, '<p><strong>new</strong></p>')
+        self.assertEqual(created.content_html, '<p><em>x</em></p>')
+        self.assertEqual(created.video.name, old_video)
+        self.assertTrue(video_storage().exists(changed.video.name))
+        refcounts = dict(MediaBlob.objects.values_list('name', 'refcount'))
+        self.assertEqual(refcounts, {old_video: 1, changed.video.name: 1})
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.sections_count, 2)
+
+    def test_question_inline_refreshes_attempt_questions(self):
+        test = Test.objects.create(course=self.course, title='Final')
+        self.enterContext(shared_cache())
+        self.assertEqual(attempts.question_ids(test.pk), [])
+        data = {'title': 'Final', 'description': '', 'course': self.course.pk, 'lesson': '', 'time_limit': ''}
+        data.update(self._formset('questions', [{'test': test.pk, 'text': 'New?'}], initial=0))
+        self._post('/admin/courses/test/{}/change/'.format(test.pk), data)
+        self.assertEqual(attempts.question_ids(test.pk), list(test.questions.values_list('pk', flat=True)))
+        self.assertEqual(len(attempts.question_ids(test.pk)), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование есть только на PostgreSQL')
+class TestResultPartitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('student')
+        course = Course.objects.create(title='Course', description='', author=make_user('teacher', 'teacher'))
+        cls.test = Test.objects.create(course=course, title='Final')
+
+    def _result(self, created_at):
+        result = TestResult.objects.create(user=self.user, test=self.test, score=5, answers={})
+        TestResult.objects.filter(pk=result.pk).update(created_at=created_at)
+        return result
+
+    def test_table_is_partitioned_by_month(self):
+        self.assertTrue(partitions.is_partitioned())
+        current = partitions.month_start(datetime.date.today())
+        self.assertIn(partitions.partition_name(current), [name for name, _ in partitions.list_partitions()])
+
+    def test_month_left_in_default_partition_is_archived(self):
+        moment = timezone.now() - datetime.timedelta(days=800)
+        month = partitions.month_start(moment)
+        result = self._result(moment)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM courses_testresult_default')
+            self.assertEqual(cursor.fetchall(), [(result.pk,)])
+
+        self.assertIn(month, partitions.cold_months(datetime.date.today()))
+        with tempfile.TemporaryDirectory() as directory:
+            path, count = partitions.archive_month(month, directory)
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual(count, 1)
+        self.assertEqual([row['id'] for row in rows], [result.pk])
+        self.assertFalse(TestResult.objects.filter(pk=result.pk).exists())
+        self.assertNotIn(month, partitions.cold_months(datetime.date.today()))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование есть только на PostgreSQL')
+class PartitionMigrationTests(TransactionTestCase):
+    before = [('courses', '0009_leaderboard')]
+    after = [('courses', '0010_partition_testresult')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+    def _rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id, score FROM courses_testresult ORDER BY id')
+            return cursor.fetchall()
+
+    def test_migration_keeps_rows_both_ways(self):
+        user = make_user('student')
+        course = Course.objects.create(title='Course', description='', author=user)
+        test = Test.objects.create(course=course, title='Final')
+        self._migrate(self.before)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO courses_testresult (user_id, test_id, score, answers, created_at) '
+                "VALUES (%s, %s, 7, '{}', now() - interval '40 days'), (%s, %s, 9, '{}', now())",
+                [user.pk, test.pk, user.pk, test.pk],
+            )
+        rows = self._rows()
+
+        self._migrate(self.after)
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(self._rows(), rows)
+        # Месячные секции от первого результата до трёх месяцев вперёд, все строки в них
+        months = [month for _, month in partitions.list_partitions()]
+        today = datetime.date.today()
+        self.assertEqual(months[0], partitions.month_start(today - datetime.timedelta(days=40)))
+        self.assertEqual(months[-1], partitions.add_months(partitions.month_start(today), 3))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM courses_testresult_default')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        # Последовательность продолжает старые id
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO courses_testresult (user_id, test_id, score, answers, created_at) "
+                           "VALUES (%s, %s, 1, '{}', now()) RETURNING id", [user.pk, test.pk])
+            self.assertGreater(cursor.fetchone()[0], rows[-1][0])
+
+        self._migrate(self.before)
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(self._rows()[:2], rows)
+
+
+class TestResultsWindowTests(TestCase):
+
+    def test_window_applies_only_to_until(self):
+        teacher = make_user('teacher', 'teacher')
+        course = Course.objects.create(title='Course', description='', author=teacher)
+        test = Test.objects.create(course=course, title='Final')
+        old = TestResult.objects.create(user=teacher, test=test, score=1, answers={})
+        TestResult.objects.filter(pk=old.pk).update(created_at=timezone.now() - datetime.timedelta(days=30))
+        recent = TestResult.objects.create(user=teacher, test=test, score=2, answers={})
+        client = api_client(teacher)
+        url = '/courses/api/tests/{}/results/'.format(test.pk)
+
+        def ids(**params):
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return [row['id'] for row in response.json()]
+
+        tomorrow = (timezone.now() + datetime.timedelta(days=1)).date().isoformat()
+        with override_settings(TEST_RESULTS_WINDOW_DAYS=7):
+            self.assertEqual(ids(), [recent.pk, old.pk])
+            self.assertEqual(ids(until=tomorrow), [recent.pk])
+            self.assertEqual(ids(since=(timezone.now() - datetime.timedelta(days=60)).date().isoformat(),
+                                 until=tomorrow), [recent.pk, old.pk])
+            self.assertEqual(ids(since=(timezone.now() - datetime.timedelta(days=1)).isoformat()), [recent.pk])
+        self.assertEqual(client.get(url, {'until': 'yesterday'}).status_code, 400)
+
+
+class ColdStartTests(SimpleTestCase):
+
+    def test_preload_steps(self):
+        self.assertEqual(list(preload()), ['urls', 'serializers', 'models', 'drf settings', 'hashers'])
+
+    def test_new_worker_imports_views_before_first_request(self):
+        # Время не проверяем: оно зависит от машины. Проверяем, что после
+        # импорта backend.wsgi новый процесс уже загрузил то, что иначе
+        # грузилось бы на первом запросе
+        probe = '''
+import json, sys
+import django
+django.setup()
+before = set(sys.modules)
+import backend.wsgi
+from django.urls import get_resolver
+print(json.dumps({'before': sorted(before & set(sys.argv[1:])), 'after': sorted(set(sys.argv[1:]) & set(sys.modules)),
+                  'urls': get_resolver()._populated}))
+'''
+        modules = ['courses.views', 'courses.serializers', 'users.views', 'users.serializers', 'users.hashing',
+                   'rest_framework_simplejwt.authentication']
+        process = subprocess.run([sys.executable, '-c', probe, *modules], cwd=settings.BASE_DIR, capture_output=True,
+                                 text=True, env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE))
+        self.assertEqual(process.returncode, 0, process.stderr)
+        state = json.loads(process.stdout.strip().splitlines()[-1])
+        self.assertEqual(state['after'], sorted(modules))
+        self.assertNotIn('courses.views', state['before'])
+        self.assertTrue(state['urls'])
@@ -5,13 +5,35 @@ urlpatterns = [
     # Курсы
     path('', views.CourseListCreateView.as_view(), name='course-list-create'),
     path('<int:pk>/', views.CourseDetailView.as_view(), name='course-detail'),
+    path('<int:pk>/copy/', views.copy_course, name='course-copy'),
+
+    # Запись на курс и блок "Мои курсы"
+    path('<int:pk>/enroll/', views.enroll, name='course-enroll'),
+    path('dashboard/', views.my_courses_dashboard, name='my-courses-dashboard'),
+
+    # Таблицы лидеров
+    path('<int:pk>/leaderboard/', views.course_leaderboard, name='course-leaderboard'),
+    path('api/tests/<int:test_id>/leaderboard/', views.test_leaderboard, name='test-leaderboard'),
+
+    # Интервальное повторение вопросов
+    path('reviews/due/', views.due_reviews, name='reviews-due'),
+    path('reviews/<int:pk>/review/', views.review_item, name='review-item'),
+
+    # Экспорт и импорт курса архивом
+    path('<int:pk>/export/', views.export_course, name='course-export'),
+    path('import/', views.import_course, name='course-import'),
+
+    # Полнотекстовый поиск
+    path('search/', views.search_content, name='course-search'),
     
     # Уроки
     path('<int:course_id>/lessons/', views.LessonListCreateView.as_view(), name='lesson-list-create'),
+    path('<int:course_id>/lessons/reorder/', views.reorder_lessons, name='lesson-reorder'),
     path('<int:course_id>/lessons/<int:lesson_id>/', views.LessonDetailView.as_view(), name='lesson-detail'),
     
     # Секции уроков
     path('<int:course_id>/lessons/<int:lesson_id>/sections/', views.SectionListCreateView.as_view(), name='section-list-create'),
+    path('<int:course_id>/lessons/<int:lesson_id>/sections/reorder/', views.reorder_sections, name='section-reorder'),
     
     # Тесты
     path('<int:course_id>/lessons/<int:lesson_id>/tests/', views.TestListCreateView.as_view(), name='test-list-create'),
@@ -19,9 +41,13 @@ urlpatterns = [
     
     # Вопросы
     path('<int:course_id>/lessons/<int:lesson_id>/tests/<int:test_id>/questions/', views.QuestionListCreateView.as_view(), name='question-list-create'),
+    path('<int:course_id>/lessons/<int:lesson_id>/tests/<int:test_id>/questions/<int:question_id>/', views.QuestionDetailView.as_view(), name='question-detail'),
+    path('api/tests/<int:test_id>/questions/batch/', views.batch_questions, name='question-batch'),
+    path('api/tests/<int:test_id>/questions/import/', views.import_questions, name='question-import'),
     
     # Ответы
     path('<int:course_id>/lessons/<int:lesson_id>/tests/<int:test_id>/questions/<int:question_id>/answers/', views.AnswerListCreateView.as_view(), name='answer-list-create'),
+    path('<int:course_id>/lessons/<int:lesson_id>/tests/<int:test_id>/questions/<int:question_id>/answers/<int:answer_id>/', views.AnswerDetailView.as_view(), name='answer-detail'),
     
     # Дополнительные endpoints
     path('<int:course_id>/lessons/', views.get_lessons_for_course, name='get-lessons-for-course'),
@@ -37,6 +63,18 @@ urlpatterns = [
     # Отправка результата теста
     path('api/tests/<int:test_id>/submit/', views.submit_test_result, name='submit-test-result'),
     
+    # Попытки прохождения теста с автосохранением ответов
+    path('api/tests/<int:test_id>/attempts/', views.start_test_attempt, name='test-attempt-start'),
+    path('api/attempts/<int:attempt_id>/', views.get_test_attempt, name='test-attempt-detail'),
+    path('api/attempts/<int:attempt_id>/answers/<int:question_id>/', views.save_attempt_answer, name='test-attempt-answer'),
+    path('api/attempts/<int:attempt_id>/finish/', views.finish_test_attempt, name='test-attempt-finish'),
+
     # Получение результатов теста
     path('api/tests/<int:test_id>/results/', views.get_test_results, name='get-test-results'),
+
+    # Живая лента результатов теста (SSE)
+    path('api/tests/<int:test_id>/results/stream/', views.stream_test_results, name='stream-test-results'),
+
+    # Потоковая выгрузка результатов теста (CSV/JSONL)
+    path('api/tests/<int:test_id>/results/export/', views.export_test_results, name='export-test-results'),
 ] 
\ No newline at end of file
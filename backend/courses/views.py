@@ -1,12 +1,28 @@
+import datetime
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from .models import Course, Lesson, Section, Test, Question, Answer, TestResult
+from .models import (
+    Course, Enrollment, Lesson, Section, Test, Question, Answer, TestResult, TestAttempt, ReviewItem
+)
 from .serializers import (
     CourseSerializer, LessonSerializer, SectionSerializer,
-    TestSerializer, QuestionSerializer, AnswerSerializer, TestResultSerializer
+    TestSerializer, QuestionSerializer, AnswerSerializer, TestResultSerializer,
+    DashboardEntrySerializer, TestAttemptSerializer, ReviewItemSerializer, QuestionBatchSerializer
+)
+from . import (
+    archive, attempts, copying, counters, dashboard, exports, fieldsets, leaderboard, live, ordering, payloads,
+    question_bank, question_import, reviews, search as course_search
 )
 
 class IsTeacherOrAdmin(permissions.BasePermission):
@@ -23,9 +39,32 @@ class IsTeacherOrAdmin(permissions.BasePermission):
             return True
         return request.user.is_authenticated and request.user.role in ['teacher', 'admin']
 
+class IsTeacherOrAdminOnly(permissions.BasePermission):
+    """
+    Доступ (включая чтение) только для преподавателей и администраторов
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['teacher', 'admin']
+
+class SparseFieldsViewMixin:
+    """
+    Подстраивает queryset под ?fields= и ?expand= (only(), select/prefetch)
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return fieldsets.sparse_queryset(queryset, self.get_serializer_class(), self.request)
+
+class DeferredCountersDestroyMixin:
+    """
+    Каскадное удаление обновляет счётчики родителей одним UPDATE на объект
+    """
+    def perform_destroy(self, instance):
+        with transaction.atomic(), counters.deferred():
+            instance.delete()
+
 # Create your views here.
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsTeacherOrAdmin]
@@ -33,24 +72,37 @@ class CourseListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(SparseFieldsViewMixin, DeferredCountersDestroyMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsTeacherOrAdmin]
 
-class LessonListCreateView(generics.ListCreateAPIView):
+    def retrieve(self, request, *args, **kwargs):
+        if not payloads.cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            return Response(payloads.get(payloads.COURSE, self.kwargs['pk'], request))
+        except Course.DoesNotExist:
+            raise Http404
+
+class LessonListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        return Lesson.objects.filter(course_id=course_id)
+        return Lesson.objects.filter(course_id=course_id).order_by('order', 'id')
+
+    def list(self, request, *args, **kwargs):
+        if payloads.cacheable(request):
+            return Response(payloads.get(payloads.LESSONS, self.kwargs.get('course_id'), request))
+        return super().list(request, *args, **kwargs)
     
     def perform_create(self, serializer):
         course_id = self.kwargs.get('course_id')
         serializer.save(course_id=course_id)
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LessonDetailView(SparseFieldsViewMixin, DeferredCountersDestroyMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     lookup_url_kwarg = 'lesson_id'
@@ -65,7 +117,7 @@ class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
         print(f"Update request FILES: {request.FILES}")
         return super().update(request, *args, **kwargs)
 
-class SectionListCreateView(generics.ListCreateAPIView):
+class SectionListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = SectionSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
@@ -77,7 +129,7 @@ class SectionListCreateView(generics.ListCreateAPIView):
         lesson_id = self.kwargs.get('lesson_id')
         serializer.save(lesson_id=lesson_id)
 
-class TestListCreateView(generics.ListCreateAPIView):
+class TestListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = TestSerializer
     permission_classes = [IsTeacherOrAdmin]
     
@@ -89,7 +141,7 @@ class TestListCreateView(generics.ListCreateAPIView):
         lesson_id = self.kwargs.get('lesson_id')
         serializer.save(lesson_id=lesson_id)
 
-class TestDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TestDetailView(SparseFieldsViewMixin, DeferredCountersDestroyMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TestSerializer
     permission_classes = [IsTeacherOrAdmin]
     lookup_url_kwarg = 'test_id'
@@ -99,7 +151,7 @@ class TestDetailView(generics.RetrieveUpdateDestroyAPIView):
         test_id = self.kwargs.get('test_id')
         return Test.objects.filter(lesson_id=lesson_id, id=test_id)
 
-class QuestionListCreateView(generics.ListCreateAPIView):
+class QuestionListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = QuestionSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
@@ -111,6 +163,15 @@ class QuestionListCreateView(generics.ListCreateAPIView):
         test_id = self.kwargs.get('test_id')
         serializer.save(test_id=test_id)
 
+class QuestionDetailView(SparseFieldsViewMixin, DeferredCountersDestroyMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = QuestionSerializer
+    permission_classes = [IsTeacherOrAdmin]
+    lookup_url_kwarg = 'question_id'
+
+    def get_queryset(self):
+        test_id = self.kwargs.get('test_id')
+        return Question.objects.filter(test_id=test_id)
+
 class AnswerListCreateView(generics.ListCreateAPIView):
     serializer_class = AnswerSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -123,21 +184,69 @@ class AnswerListCreateView(generics.ListCreateAPIView):
         question_id = self.kwargs.get('question_id')
         serializer.save(question_id=question_id)
 
+class AnswerDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = AnswerSerializer
+    permission_classes = [IsTeacherOrAdmin]
+    lookup_url_kwarg = 'answer_id'
+
+    def get_queryset(self):
+        question_id = self.kwargs.get('question_id')
+        test_id = self.kwargs.get('test_id')
+        return Answer.objects.filter(question_id=question_id, question__test_id=test_id)
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def batch_questions(request, test_id):
+    try:
+        test = Test.objects.only('id').get(id=test_id)
+    except Test.DoesNotExist:
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    serializer = QuestionBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        result = question_bank.apply_batch(test, **serializer.validated_data)
+    except question_bank.BatchError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def import_questions(request, test_id):
+    # Параметр format занят DRF, поэтому формат файла передаётся в type
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'detail': 'file required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        test = Test.objects.only('id').get(id=test_id)
+    except Test.DoesNotExist:
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    kind = request.data.get('type') or question_import.detect(upload.name)
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+    try:
+        report = question_bank.import_questions(test, question_import.read(upload, kind), dry_run=dry_run)
+    except question_import.ImportFormatError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    created = report['created'] and not dry_run
+    return Response(report, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_lessons_for_course(request, course_id):
+    if payloads.cacheable(request):
+        return Response(payloads.get(payloads.LESSONS, course_id, request))
     lessons = Lesson.objects.filter(course_id=course_id).order_by('order')
-    serializer = LessonSerializer(lessons, many=True)
+    lessons = fieldsets.sparse_queryset(lessons, LessonSerializer, request)
+    serializer = LessonSerializer(lessons, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_tests_for_lesson(request, lesson_id):
-    tests = Test.objects.filter(lesson_id=lesson_id)
-    serializer = TestSerializer(tests, many=True)
+    tests = fieldsets.sparse_queryset(Test.objects.filter(lesson_id=lesson_id), TestSerializer, request)
+    serializer = TestSerializer(tests, many=True, context={'request': request})
     return Response(serializer.data)
 
-class CourseTestListCreateView(generics.ListCreateAPIView):
+class CourseTestListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = TestSerializer
     permission_classes = [IsTeacherOrAdmin]
 
@@ -150,7 +259,7 @@ class CourseTestListCreateView(generics.ListCreateAPIView):
         course = Course.objects.get(pk=course_id)
         serializer.save(course=course)
 
-class CourseTestDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseTestDetailView(SparseFieldsViewMixin, DeferredCountersDestroyMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TestSerializer
     permission_classes = [IsTeacherOrAdmin]
     lookup_url_kwarg = 'test_id'
@@ -162,20 +271,20 @@ class CourseTestDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['GET'])
 def get_test_by_id(request, test_id):
-    from .models import Test
+    if payloads.cacheable(request):
+        try:
+            return Response(payloads.get(payloads.TEST, test_id, request))
+        except Test.DoesNotExist:
+            return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-        test = Test.objects.get(id=test_id)
+        test = fieldsets.sparse_queryset(Test.objects.all(), TestSerializer, request).get(id=test_id)
     except Test.DoesNotExist:
         return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
-    from .serializers import TestSerializer
-    serializer = TestSerializer(test)
+    serializer = TestSerializer(test, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['POST'])
 def submit_test_result(request, test_id):
-    from .models import Test, TestResult
-    from .serializers import TestResultSerializer
-    from users.models import User
     user = request.user
     try:
         test = Test.objects.get(id=test_id)
@@ -190,10 +299,279 @@ def submit_test_result(request, test_id):
     serializer = TestResultSerializer(result)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+def _parse_moment(value):
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = day and datetime.datetime.combine(day, datetime.time.min)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
 @api_view(['GET'])
 def get_test_results(request, test_id):
-    from .models import TestResult
-    from .serializers import TestResultSerializer
     results = TestResult.objects.filter(test_id=test_id).order_by('-created_at')
+    bounds = {}
+    for param in ('since', 'until'):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        bounds[param] = _parse_moment(value)
+        if bounds[param] is None:
+            return Response({'detail': '{} must be an ISO date or datetime'.format(param)},
+                            status=status.HTTP_400_BAD_REQUEST)
+    # Условие на created_at позволяет PostgreSQL читать только секции нужных
+    # месяцев, поэтому until без since ограничивается TEST_RESULTS_WINDOW_DAYS
+    # днями до него. Без параметров отдаются все результаты.
+    if 'until' in bounds and 'since' not in bounds:
+        bounds['since'] = bounds['until'] - datetime.timedelta(days=getattr(settings, 'TEST_RESULTS_WINDOW_DAYS', 365))
+    if 'since' in bounds:
+        results = results.filter(created_at__gte=bounds['since'])
+    if 'until' in bounds:
+        results = results.filter(created_at__lt=bounds['until'])
     serializer = TestResultSerializer(results, many=True)
     return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdminOnly])
+def export_test_results(request, test_id):
+    if not Test.objects.filter(id=test_id).exists():
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Параметр format занят DRF под выбор рендерера, поэтому output
+    output = request.query_params.get('output', 'csv')
+    if output not in exports.FORMATS:
+        return Response({'detail': 'output must be one of: csv, jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+    details = request.query_params.get('details') in ('1', 'true')
+    content_type = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(exports.stream_results(test_id, output=output, details=details),
+                                     content_type='{}; charset=utf-8'.format(content_type))
+    response['Content-Disposition'] = 'attachment; filename="test-{}-results.{}"'.format(test_id, output)
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdminOnly])
+@renderer_classes([JSONRenderer, live.EventStreamRenderer])
+def stream_test_results(request, test_id):
+    if not Test.objects.filter(id=test_id).exists():
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Браузер при переподключении сам шлёт Last-Event-ID; last_id - для первого
+    # подключения, когда клиент уже загрузил список результатов
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return Response({'detail': 'Last-Event-ID must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    # Под WSGI долгий поток занял бы поток воркера, отдаём снимок и закрываем
+    feed = live.stream if isinstance(request._request, ASGIRequest) else live.snapshot
+    response = StreamingHttpResponse(feed(test_id, last_event_id=last_event_id),
+                                     content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _leaderboard_response(request, course_id, test_id=None):
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+    except ValueError:
+        return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(leaderboard.standings(course_id, test_id, user=request.user, limit=limit))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def course_leaderboard(request, pk):
+    if not Course.objects.filter(pk=pk).exists():
+        return Response({'detail': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    return _leaderboard_response(request, pk)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def test_leaderboard(request, test_id):
+    course_id = leaderboard.test_course_id(test_id)
+    if course_id is None:
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    return _leaderboard_response(request, course_id, test_id)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def due_reviews(request):
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    items = reviews.due_items(request.user, limit=limit) \
+        .select_related('question').prefetch_related('question__answers')
+    return Response(ReviewItemSerializer(items, many=True).data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def review_item(request, pk):
+    item = ReviewItem.objects.filter(pk=pk, user=request.user).select_related('question').first()
+    if item is None:
+        return Response({'detail': 'Review item not found'}, status=status.HTTP_404_NOT_FOUND)
+    quality = request.data.get('quality')
+    answers = request.data.get('answers')
+    if quality is not None:
+        if not isinstance(quality, int) or not 0 <= quality <= 5:
+            return Response({'detail': 'quality must be an integer from 0 to 5'}, status=status.HTTP_400_BAD_REQUEST)
+    elif not isinstance(answers, list):
+        return Response({'detail': 'answers or quality required'}, status=status.HTTP_400_BAD_REQUEST)
+    item = reviews.review(item, answer_ids=answers, quality=quality)
+    return Response(ReviewItemSerializer(item).data)
+
+
+def _attempt_response(attempt, status_code=status.HTTP_200_OK):
+    attempt.answers = attempts.current_answers(attempt)
+    return Response(TestAttemptSerializer(attempt).data, status=status_code)
+
+def _get_attempt(request, attempt_id):
+    # Чужая попытка выглядит так же, как несуществующая
+    return TestAttempt.objects.filter(pk=attempt_id, user=request.user).first()
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_test_attempt(request, test_id):
+    try:
+        test = Test.objects.only('id', 'time_limit').get(id=test_id)
+    except Test.DoesNotExist:
+        return Response({'detail': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+    attempt, created = attempts.start_attempt(request.user, test)
+    return _attempt_response(attempt, status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_test_attempt(request, attempt_id):
+    attempt = _get_attempt(request, attempt_id)
+    if attempt is None:
+        return Response({'detail': 'Attempt not found'}, status=status.HTTP_404_NOT_FOUND)
+    return _attempt_response(attempt)
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def save_attempt_answer(request, attempt_id, question_id):
+    attempt = _get_attempt(request, attempt_id)
+    if attempt is None:
+        return Response({'detail': 'Attempt not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        flushed = attempts.save_answer(attempt, question_id, request.data.get('answers'))
+    except attempts.AttemptError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'question': question_id, 'saved': True, 'flushed': flushed})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finish_test_attempt(request, attempt_id):
+    attempt = _get_attempt(request, attempt_id)
+    if attempt is None:
+        return Response({'detail': 'Attempt not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        attempt, result = attempts.finish_attempt(attempt)
+    except attempts.AttemptError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'attempt': TestAttemptSerializer(attempt).data,
+        'result': TestResultSerializer(result).data,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_content(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'detail': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = request.query_params.get('type')
+    kinds = kinds.split(',') if kinds else course_search.KINDS
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'query': query, 'results': course_search.search(query, kinds=kinds, limit=limit)})
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def copy_course(request, pk):
+    try:
+        course = Course.objects.select_related('author').get(pk=pk)
+    except Course.DoesNotExist:
+        return Response({'detail': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    new_course = copying.copy_course(course, author=request.user, title=request.data.get('title'))
+    return Response(CourseSerializer(new_course).data, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdminOnly])
+def export_course(request, pk):
+    try:
+        course = Course.objects.get(pk=pk)
+    except Course.DoesNotExist:
+        return Response({'detail': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    include_media = request.query_params.get('media') in ('1', 'true')
+    response = StreamingHttpResponse(archive.export_course(course, include_media=include_media),
+                                     content_type='application/x-tar')
+    response['Content-Disposition'] = 'attachment; filename="course-{}.tar"'.format(course.id)
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdminOnly])
+def import_course(request):
+    upload = request.FILES.get('archive')
+    if upload is None:
+        return Response({'detail': 'archive file required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        course = archive.import_course(upload, author=request.user, title=request.data.get('title'))
+    except archive.ArchiveError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(CourseSerializer(course).data, status=status.HTTP_201_CREATED)
+
+def _reorder_response(queryset, request, course_id):
+    if not isinstance(request.data, dict) or 'order' not in request.data:
+        return Response({'detail': 'Body must be an object with an order list'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        updated = ordering.reorder(queryset, request.data['order'])
+    except ordering.ReorderError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    # bulk_update не отправляет сигналы, поэтому кэш ответов сбрасываем сами
+    payloads.invalidate(course_id=course_id)
+    return Response({'updated': updated})
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def reorder_lessons(request, course_id):
+    return _reorder_response(Lesson.objects.filter(course_id=course_id), request, course_id)
+
+@api_view(['POST'])
+@permission_classes([IsTeacherOrAdmin])
+def reorder_sections(request, course_id, lesson_id):
+    return _reorder_response(Section.objects.filter(lesson_id=lesson_id, lesson__course_id=course_id), request,
+                             course_id)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_courses_dashboard(request):
+    entries = dashboard.dashboard_entries(request.user)
+    return Response(DashboardEntrySerializer(entries, many=True).data)
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def enroll(request, pk):
+    if not Course.objects.filter(pk=pk).exists():
+        return Response({'detail': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+    user = request.user
+    # progress["courses"] поддерживаем ради старых клиентов, которые читают его напрямую
+    progress = user.progress if isinstance(user.progress, dict) else {}
+    courses = [course_id for course_id in progress.get('courses') or [] if course_id != pk]
+    if request.method == 'DELETE':
+        Enrollment.objects.filter(user=user, course_id=pk).delete()
+        progress['courses'] = courses
+        user.progress = progress
+        user.save(update_fields=['progress'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    _, created = Enrollment.objects.get_or_create(user=user, course_id=pk)
+    progress['courses'] = courses + [pk]
+    user.progress = progress
+    user.save(update_fields=['progress'])
+    return Response({'course': pk, 'enrolled': True},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
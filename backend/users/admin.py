@@ -1,3 +1,34 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-# Register your models here.
+from courses.paginators import EstimatedCountPaginator
+from .models import User
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    list_display = ('id', 'username', 'email', 'full_name', 'role', 'is_staff', 'is_active')
+    list_filter = ('role', 'is_staff', 'is_active')
+    search_fields = ('username',)
+    search_help_text = 'id, начало имени пользователя или точный email'
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ('Профиль', {'fields': ('role', 'full_name', 'progress')}),
+    )
+    add_fieldsets = BaseUserAdmin.add_fieldsets + (
+        ('Профиль', {'fields': ('role', 'email', 'full_name')}),
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Без сканирования по подстроке: pk, начало username (на PostgreSQL
+        # у него есть индекс для LIKE 'abc%') или email целиком
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if '@' in term:
+            return queryset.filter(email__iexact=term), False
+        return queryset.filter(username__startswith=term), False
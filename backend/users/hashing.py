@@ -0,0 +1,179 @@
+"""
+Хэширование паролей вне воркера запросов.
+
+ConfigurablePBKDF2PasswordHasher считает PBKDF2 в ограниченном пуле
+процессов (PASSWORD_HASHING_WORKERS), поэтому через пул идёт всё, что
+проверяет или задаёт пароль стандартными средствами Django: authenticate()
+(с AUTHENTICATION_BACKENDS и сигналом user_login_failed), check_password(),
+set_password(). Вместе с очередью одновременно принимается не больше
+PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_QUEUE операций; сверх этого
+операция сразу завершается исключением HashingBusy, а не занимает воркер,
+пока другие эндпоинты ждут. PASSWORD_HASHING_WORKERS = 0 отключает пул -
+хэширование идёт в самом запросе.
+
+HashingBusy - обычное исключение, а не APIException: хэшер вызывают и вне DRF
+(вход в админку, смена пароля в ней, createsuperuser). В ответ 503 с
+Retry-After его превращают exception_handler (EXCEPTION_HANDLER в
+REST_FRAMEWORK) и HashingBusyMiddleware для остальных представлений.
+
+Процессы пула запускаются через forkserver (spawn там, где его нет), а не
+fork: копия многопоточного воркера с открытыми соединениями может зависнуть
+на унаследованной блокировке.
+
+Стоимость задаёт PASSWORD_HASH_ITERATIONS. Пароли, захэшированные с другим
+числом итераций, перехэшируются при входе (must_update).
+"""
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 с числом итераций из настроек, вычисляемый в пуле
+    процессов. Алгоритм и формат те же, что у стандартного хэшера, поэтому
+    существующие пароли остаются валидными.
+    """
+
+    @property
+    def iterations(self):
+        return _setting('PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        # verify() и harden_runtime() тоже идут через encode()
+        digest = pool.run(hashlib.pbkdf2_hmac, 'sha256', password.encode(), salt.encode(), iterations)
+        return '{}${}${}${}'.format(self.algorithm, iterations, salt, base64.b64encode(digest).decode('ascii'))
+
+
+class HashingBusy(Exception):
+    def __init__(self, message='Password hashing is busy, please retry shortly.'):
+        super().__init__(message)
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Authentication service is busy, please retry shortly.'
+    default_code = 'hashing_busy'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # DRF выставляет заголовок Retry-After по атрибуту wait
+        self.wait = _setting('PASSWORD_HASHING_RETRY_AFTER', 2)
+
+
+def exception_handler(exc, context):
+    if isinstance(exc, HashingBusy):
+        exc = HashingUnavailable()
+    return drf_exception_handler(exc, context)
+
+
+class HashingBusyMiddleware:
+    """
+    503 с Retry-After вместо 500, если HashingBusy вылетело из представления
+    вне DRF, например из входа в админку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(HashingUnavailable.default_detail, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = _setting('PASSWORD_HASHING_RETRY_AFTER', 2)
+        return response
+
+
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class _Pool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._in_flight = 0
+
+    @property
+    def workers(self):
+        return _setting('PASSWORD_HASHING_WORKERS', 2)
+
+    @property
+    def limit(self):
+        return self.workers + _setting('PASSWORD_HASHING_QUEUE', 32)
+
+    def _get(self):
+        with self._lock:
+            # После fork (например, gunicorn --preload) пул родителя не годится
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_context())
+                self._pid = os.getpid()
+                self._in_flight = 0
+            return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release(self, future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        executor = self._get()
+        if not self._acquire():
+            raise HashingBusy()
+        try:
+            future = executor.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._release()
+            self._reset()
+            raise HashingBusy()
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=_setting('PASSWORD_HASHING_TIMEOUT', 10))
+        except FutureTimeoutError:
+            raise HashingBusy()
+        except BrokenProcessPool:
+            self._reset()
+            raise HashingBusy()
+
+    def in_flight(self):
+        return self._in_flight
+
+
+pool = _Pool()
@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from users.models import User
+
+PASSWORD = 'bench-login-password'
+
+
+def _percentile(values, share):
+    return values[max(0, int(len(values) * share) - 1)] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность входа (логинов в секунду) и задержку '
+            'параллельных GET /courses/ под потоком логинов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--login-threads', type=int, default=16)
+        parser.add_argument('--get-threads', type=int, default=4)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='PASSWORD_HASHING_WORKERS на время замера (0 - хэширование в запросе)')
+        parser.add_argument('--iterations', type=int, default=None, help='PASSWORD_HASH_ITERATIONS на время замера')
+
+    def handle(self, *args, **options):
+        # Замеряется хэширование, а не ограничение частоты запросов
+        overrides = {'ROLE_THROTTLE_RATES': {}}
+        if options['workers'] is not None:
+            overrides['PASSWORD_HASHING_WORKERS'] = options['workers']
+        if options['iterations'] is not None:
+            overrides['PASSWORD_HASH_ITERATIONS'] = options['iterations']
+        with override_settings(**overrides):
+            self._run(options)
+
+    def _run(self, options):
+        # Потоки работают со своими соединениями, поэтому данные коммитятся
+        # и удаляются в конце, а не откатываются
+        encoded = make_password(PASSWORD)
+        User.objects.filter(username__startswith='bench-login-').delete()
+        users = User.objects.bulk_create(
+            User(username='bench-login-{}'.format(i), password=encoded) for i in range(options['users']))
+        try:
+            token = Client(HTTP_HOST='localhost').post(
+                '/auth/login/', {'username': users[0].username, 'password': PASSWORD},
+                content_type='application/json').json()['token']
+            self._measure(users, token, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def _measure(self, users, token, options):
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        statuses = Counter()
+        login_timings = []
+        get_timings = []
+
+        def login(index):
+            client = Client(HTTP_HOST='localhost')
+            username = users[index % len(users)].username
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = client.post('/auth/login/', {'username': username, 'password': PASSWORD},
+                                       content_type='application/json')
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    statuses[response.status_code] += 1
+                    login_timings.append(elapsed)
+                if response.status_code == 503:
+                    time.sleep(0.05)
+            connection.close()
+
+        def browse():
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION='Bearer ' + token)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                client.get('/courses/')
+                with lock:
+                    get_timings.append((time.perf_counter() - started) * 1000)
+            connection.close()
+
+        threads = [threading.Thread(target=login, args=(i,)) for i in range(options['login_threads'])]
+        threads += [threading.Thread(target=browse) for _ in range(options['get_threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        login_timings.sort()
+        get_timings.sort()
+        self.stdout.write('БД: {}, потоков входа: {}, потоков GET: {}, {:.1f} с'.format(
+            connection.vendor, options['login_threads'], options['get_threads'], elapsed))
+        self.stdout.write('Входов в секунду: {:.1f} (ответы: {})'.format(
+            statuses[200] / elapsed, dict(sorted(statuses.items()))))
+        if login_timings:
+            self.stdout.write('Вход: p50 {:.1f} мс, p95 {:.1f} мс, max {:.1f} мс'.format(
+                _percentile(login_timings, 0.5), _percentile(login_timings, 0.95), login_timings[-1]))
+        if get_timings:
+            self.stdout.write('GET /courses/: {} запросов, p50 {:.1f} мс, p95 {:.1f} мс, max {:.1f} мс, mean {:.1f} мс'.format(
+                len(get_timings), _percentile(get_timings, 0.5), _percentile(get_timings, 0.95),
+                get_timings[-1], statistics.mean(get_timings)))
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import resolve
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.models import User
+from users.throttling import CacheStore, LocalStore, RoleRateThrottle
+
+
+class Command(BaseCommand):
+    help = 'Замеряет накладные расходы ограничения частоты запросов (мкс на запрос)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--keys', type=int, default=1000, help='Разных пользователей/адресов')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def _measure(self, title, call, total, rounds):
+        per_request = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for index in range(total):
+                call(index)
+            per_request.append((time.perf_counter() - started) / total * 1e6)
+        self.stdout.write('{}: {:.2f} мкс на запрос (min {:.2f}, max {:.2f})'.format(
+            title, statistics.median(per_request), min(per_request), max(per_request)))
+
+    def handle(self, *args, **options):
+        total, keys, rounds = options['requests'], options['keys'], options['rounds']
+        now = time.time()
+        # Бюджет заведомо больше числа запросов, чтобы мерить обычный путь, а не отказы
+        limit = total * rounds + 1
+
+        local = LocalStore()
+        self._measure('LocalStore.hit', lambda i: local.hit('read:user:{}'.format(i % keys), limit, 60, now),
+                      total, rounds)
+        cache = CacheStore()
+        self._measure('CacheStore.hit ({})'.format(type(cache.cache).__name__),
+                      lambda i: cache.hit('read:user:{}'.format(i % keys), limit, 60, now), total // 10, rounds)
+
+        factory = APIRequestFactory()
+        users = [User(pk=i + 1, username='bench-{}'.format(i), role=User.Role.STUDENT) for i in range(keys)]
+        requests = []
+        for user in users[:100]:
+            request = factory.get('/courses/')
+            request.resolver_match = resolve('/courses/')
+            request = Request(request)
+            request.user = user
+            requests.append(request)
+        throttle = RoleRateThrottle()
+        with override_settings(ROLE_THROTTLE_RATES={'read': {User.Role.STUDENT: '{}/d'.format(limit)}},
+                               THROTTLE_STORE='users.throttling.LocalStore'):
+            self._measure('RoleRateThrottle.allow_request',
+                          lambda i: throttle.allow_request(requests[i % len(requests)], None), total, rounds)
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+# Только PostgreSQL: поиск в админке по email (email__iexact) сравнивает
+# UPPER(email) = UPPER(%s), а такому условию нужен индекс по выражению.
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS users_user_email_upper_idx ON users_user (UPPER(email))')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS users_user_email_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -7,6 +7,18 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'full_name', 'role', 'progress']
         read_only_fields = ['id']
 
+    # progress["courses"] - копия записей на курс (courses.Enrollment), её
+    # ведёт только запись на курс. Из профиля этот ключ не меняется, иначе
+    # список разошёлся бы с Enrollment
+    def validate_progress(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('progress must be an object.')
+        value = {key: item for key, item in value.items() if key != 'courses'}
+        current = self.instance.progress if self.instance is not None else None
+        if isinstance(current, dict) and 'courses' in current:
+            value['courses'] = current['courses']
+        return value
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     
@@ -1,3 +1,125 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from rest_framework.exceptions import APIException
+from rest_framework.test import APIClient
+
+from . import hashing, throttling
+from .models import User
+
+
+def make_user(username, password='password', role='student'):
+    return User.objects.create_user(username, username + '@example.com', password, role=role)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASHING_WORKERS=1, ROLE_THROTTLE_RATES={})
+class LoginTests(TestCase):
+
+    def _login(self, username, password):
+        return APIClient().post('/auth/login/', {'username': username, 'password': password}, format='json')
+
+    def test_login_goes_through_django_authenticate(self):
+        make_user('student')
+        self.assertEqual(self._login('student', 'password').status_code, 200)
+        failures = []
+        receiver = lambda sender, credentials, **kwargs: failures.append(credentials['username'])
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        self.assertEqual(self._login('student', 'wrong').status_code, 401)
+        self.assertEqual(self._login('nobody', 'password').status_code, 401)
+        self.assertEqual(failures, ['student', 'nobody'])
+
+    def test_password_is_rehashed_when_cost_changes(self):
+        user = make_user('student')
+        with override_settings(PASSWORD_HASH_ITERATIONS=1500):
+            self.assertEqual(self._login('student', 'password').status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1500$'))
+
+    def test_hashes_match_django_pbkdf2(self):
+        encoded = hashing.ConfigurablePBKDF2PasswordHasher().encode('secret', 'salt' * 6)
+        with override_settings(PASSWORD_HASHING_WORKERS=0):
+            self.assertEqual(hashing.ConfigurablePBKDF2PasswordHasher().encode('secret', 'salt' * 6), encoded)
+        self.assertEqual(hashing.pool.in_flight(), 0)
+        self.assertNotEqual(hashing._context().get_start_method(), 'fork')
+
+    def test_full_pool_answers_503(self):
+        user = make_user('student')
+        with mock.patch.object(hashing.pool, '_acquire', return_value=False):
+            response = self._login(user.username, 'password')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_full_pool_answers_503_outside_drf(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        with mock.patch.object(hashing.pool, '_acquire', return_value=False):
+            response = client.post('/admin/login/', {'username': 'admin', 'password': 'password'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        client.force_login(admin)
+        with mock.patch.object(hashing.pool, '_acquire', return_value=False):
+            response = client.post('/admin/users/user/{}/password/'.format(admin.pk),
+                                   {'password1': 'n3w-Passw0rd!', 'password2': 'n3w-Passw0rd!'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_busy_pool_is_a_plain_exception(self):
+        self.assertFalse(issubclass(hashing.HashingBusy, APIException))
+        with mock.patch.object(hashing.pool, '_acquire', return_value=False):
+            with self.assertRaises(hashing.HashingBusy):
+                make_user('student')
+
+
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def test_sliding_window_estimate(self):
+        # 10 запросов в прошлом интервале, прошла половина текущего
+        self.assertEqual(throttling._estimate(10, 4, 30, 10, 60), (9.0, None))
+        used, wait = throttling._estimate(10, 5, 30, 10, 60)
+        self.assertEqual(used, 10.0)
+        # Место появится, когда вклад прошлого интервала упадёт до 4
+        self.assertAlmostEqual(wait, 6.0)
+
+    @override_settings(THROTTLE_STORE='users.throttling.LocalStore',
+                       ROLE_THROTTLE_RATES={'auth': {'anon': '2/m'}, 'read': {'student': '3/m'}})
+    def test_budget_per_group_and_role(self):
+        for _ in range(2):
+            self.assertEqual(self._client().post('/auth/login/', {}, format='json').status_code, 400)
+        response = self._client().post('/auth/login/', {}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        student = make_user('student')
+        responses = [self._client(student).get('/auth/user/') for _ in range(4)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200, 429])
+        self.assertEqual(responses[0]['X-RateLimit-Limit'], '3')
+        self.assertEqual(responses[2]['X-RateLimit-Remaining'], '0')
+        # Другой пользователь считается отдельно
+        self.assertEqual(self._client(make_user('other')).get('/auth/user/').status_code, 200)
+
+    @override_settings(THROTTLE_STORE='users.throttling.CacheStore', ROLE_THROTTLE_RATES={'read': {'student': '2/m'}})
+    def test_cache_store_is_shared(self):
+        student = make_user('student')
+        self.assertEqual(self._client(student).get('/auth/user/').status_code, 200)
+        # Новый экземпляр хранилища, как в другом воркере, видит тот же счётчик
+        throttling.get_store.cache_clear()
+        self.assertEqual(self._client(student).get('/auth/user/').status_code, 200)
+        self.assertEqual(self._client(student).get('/auth/user/').status_code, 429)
+
+    def test_window_rolls_over(self):
+        store = throttling.LocalStore()
+        now = 600.0
+        self.assertEqual([store.hit('k', 2, 60, now)[0] for _ in range(3)], [True, True, False])
+        # Через два интервала прошлые запросы уже не учитываются
+        self.assertTrue(store.hit('k', 2, 60, now + 120)[0])
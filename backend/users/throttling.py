@@ -0,0 +1,186 @@
+"""
+Ограничение частоты запросов по роли пользователя и группе маршрутов.
+
+Бюджеты задаются в ROLE_THROTTLE_RATES: {группа: {роль: 'N/период'}}, где
+роль - значение User.Role или 'anon', а период - s, m, h или d. Группа
+запроса определяется по имени маршрута (THROTTLE_ROUTE_GROUPS), для
+остальных маршрутов это 'read' (GET/HEAD/OPTIONS) или 'write'. Если для
+группы или роли бюджета нет, запрос не ограничивается.
+
+Счётчики - скользящее окно из двух соседних интервалов: O(1) памяти и
+времени на ключ. По умолчанию они хранятся в памяти процесса (LocalStore);
+для нескольких воркеров - CacheStore поверх общего кэша (THROTTLE_STORE).
+Остаток бюджета попадает в заголовки X-RateLimit-* (RateLimitHeadersMiddleware).
+"""
+import functools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+ANON = 'anon'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    '30/m' -> (30, 60).
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0]]
+
+
+def _estimate(previous, current, elapsed, limit, duration):
+    """
+    Сколько запросов учтено в скользящем окне и через сколько секунд
+    появится место для следующего (None - место есть сейчас).
+    """
+    used = previous * (1 - elapsed / duration) + current
+    if used + 1 <= limit:
+        return used, None
+    if current + 1 > limit or not previous:
+        # Текущий интервал уже исчерпан - ждём следующего
+        return used, duration - elapsed
+    # Ждём, пока вклад предыдущего интервала уменьшится достаточно
+    share = (limit - current - 1) / previous
+    return used, max(0.0, (1 - share) * duration - elapsed)
+
+
+class LocalStore:
+    """
+    Счётчики в памяти процесса.
+    """
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._hits = 0
+
+    def hit(self, key, limit, duration, now):
+        """
+        Учитывает запрос, если он помещается в бюджет.
+        Возвращает (разрешён, осталось, секунд до сброса, секунд до повтора).
+        """
+        window = int(now // duration) * duration
+        with self._lock:
+            start, current, previous, _ = self._windows.get(key, (window, 0, 0, duration))
+            if start != window:
+                previous = current if window - start == duration else 0
+                current = 0
+            used, wait = _estimate(previous, current, now - window, limit, duration)
+            allowed = wait is None
+            if allowed:
+                current += 1
+                used += 1
+            self._windows[key] = (window, current, previous, duration)
+            self._hits += 1
+            if self._hits >= self.PRUNE_EVERY:
+                self._prune(now)
+        return allowed, max(0, int(limit - used)), window + duration - now, wait
+
+    def _prune(self, now):
+        # Ключи, не встречавшиеся два интервала, уже ничего не ограничивают
+        self._windows = {key: value for key, value in self._windows.items() if now - value[0] < 2 * value[3]}
+        self._hits = 0
+
+
+class CacheStore:
+    """
+    Счётчики в общем кэше (THROTTLE_CACHE) - для нескольких воркеров.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def hit(self, key, limit, duration, now):
+        index = int(now // duration)
+        window = index * duration
+        current_key = 'throttle:{}:{}'.format(key, index)
+        previous_key = 'throttle:{}:{}'.format(key, index - 1)
+        values = self.cache.get_many([current_key, previous_key])
+        current = values.get(current_key, 0)
+        used, wait = _estimate(values.get(previous_key, 0), current, now - window, limit, duration)
+        allowed = wait is None
+        if allowed:
+            self.cache.add(current_key, 0, timeout=2 * duration)
+            self.cache.incr(current_key)
+            used += 1
+        return allowed, max(0, int(limit - used)), window + duration - now, wait
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    return import_string(getattr(settings, 'THROTTLE_STORE', 'users.throttling.LocalStore'))()
+
+
+@functools.lru_cache(maxsize=None)
+def _groups_by_route():
+    groups = getattr(settings, 'THROTTLE_ROUTE_GROUPS', {})
+    return {name: group for group, names in groups.items() for name in names}
+
+
+@receiver(setting_changed)
+def _reload(setting, **kwargs):
+    if setting == 'THROTTLE_STORE':
+        get_store.cache_clear()
+    elif setting == 'THROTTLE_ROUTE_GROUPS':
+        _groups_by_route.cache_clear()
+
+
+def route_group(request):
+    match = request.resolver_match
+    group = _groups_by_route().get(match.url_name) if match else None
+    return group or ('read' if request.method in SAFE_METHODS else 'write')
+
+
+class RoleRateThrottle(BaseThrottle):
+    """
+    Бюджет по роли пользователя для группы маршрутов (см. описание модуля).
+    """
+
+    def allow_request(self, request, view):
+        group = route_group(request)
+        user = request.user
+        role = getattr(user, 'role', ANON) if user and user.is_authenticated else ANON
+        rate = getattr(settings, 'ROLE_THROTTLE_RATES', {}).get(group, {}).get(role)
+        if not rate:
+            return True
+        limit, duration = parse_rate(rate)
+        ident = 'user:{}'.format(user.pk) if role != ANON else 'ip:{}'.format(self.get_ident(request))
+        allowed, remaining, reset, self._wait = get_store().hit(
+            '{}:{}'.format(group, ident), limit, duration, time.time())
+        # Заголовки выставляет RateLimitHeadersMiddleware
+        request._request.rate_limit = (limit, remaining, math.ceil(reset))
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Добавляет к ответу X-RateLimit-Limit/-Remaining/-Reset, если запрос
+    прошёл через RoleRateThrottle.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, 'rate_limit', None)
+        if state is not None:
+            limit, remaining, reset = state
+            response['X-RateLimit-Limit'] = limit
+            response['X-RateLimit-Remaining'] = remaining
+            response['X-RateLimit-Reset'] = reset
+        return response
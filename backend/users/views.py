@@ -35,7 +35,8 @@ def login_view(request):
     if not username or not password:
         return Response({'detail': 'Username and password are required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    user = authenticate(username=username, password=password)
+    # Проверка пароля идёт в пуле хэширования; при перегрузке - 503 (hashing.exception_handler)
+    user = authenticate(request, username=username, password=password)
     
     if user:
         refresh = RefreshToken.for_user(user)
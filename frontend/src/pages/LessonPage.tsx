@@ -142,9 +142,15 @@ const LessonPage: React.FC = () => {
                 <Typography variant="h6" fontWeight={600} mb={2}>
                   {section.title}
                 </Typography>
-                <Typography variant="body1" fontSize={18} color="text.primary" sx={{ whiteSpace: 'pre-line' }}>
-                  {section.content}
-                </Typography>
+                {section.content_html ? (
+                  // HTML экранируется и собирается на сервере (courses.rendering)
+                  <Typography component="div" variant="body1" fontSize={18} color="text.primary"
+                    dangerouslySetInnerHTML={{ __html: section.content_html }} />
+                ) : (
+                  <Typography variant="body1" fontSize={18} color="text.primary" sx={{ whiteSpace: 'pre-line' }}>
+                    {section.content}
+                  </Typography>
+                )}
                 {section.video && (
                   <Box mt={2}>
                     <video src={section.video} controls style={{ maxWidth: '100%', borderRadius: 8, boxShadow: '0 2px 16px 0 rgba(80,80,120,0.10)' }} />
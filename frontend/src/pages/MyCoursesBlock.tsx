@@ -1,16 +1,14 @@
 import React, { useEffect, useState } from 'react';
 import { Typography, Card, CircularProgress, LinearProgress, Box, Avatar, Button, Grid, Fade } from '@mui/material';
 import { useTranslation } from 'react-i18next';
-import { getCurrentUser, getCourses, getLessons, User, Course, Lesson } from '../services/api';
+import { getDashboard, DashboardEntry } from '../services/api';
 import ArrowForwardIosIcon from '@mui/icons-material/ArrowForwardIos';
 import MenuBookIcon from '@mui/icons-material/MenuBook';
 import { Link } from 'react-router-dom';
 
 const MyCoursesBlock: React.FC = () => {
   const { t } = useTranslation();
-  const [user, setUser] = useState<User | null>(null);
-  const [courses, setCourses] = useState<Course[]>([]);
-  const [lessons, setLessons] = useState<Record<number, Lesson[]>>({});
+  const [entries, setEntries] = useState<DashboardEntry[] | null>(null);
   const [loading, setLoading] = useState(true);
   const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
 
@@ -19,38 +17,25 @@ const MyCoursesBlock: React.FC = () => {
       setLoading(false);
       return;
     }
-    Promise.all([
-      getCurrentUser().then(res => res.data),
-      getCourses().then(res => res.data),
-    ]).then(async ([userData, coursesData]) => {
-      setUser(userData);
-      setCourses(coursesData);
-      const userCourses = coursesData.filter((c: Course) => userData.progress?.courses?.includes(c.id));
-      const lessonsObj: Record<number, Lesson[]> = {};
-      for (const course of userCourses) {
-        const lessonsRes = await getLessons(course.id);
-        lessonsObj[course.id] = lessonsRes.data;
-      }
-      setLessons(lessonsObj);
-    }).finally(() => setLoading(false));
+    // Один запрос вместо загрузки всего каталога и уроков каждого курса
+    getDashboard()
+      .then(res => setEntries(res.data))
+      .finally(() => setLoading(false));
   }, [token]);
 
   if (loading) return <Box display="flex" justifyContent="center" mt={4}><CircularProgress size={40} /></Box>;
-  if (!token || !user) return null;
-
-  const userCourses = courses.filter(c => user.progress?.courses?.includes(c.id));
-  const completedLessons = (courseId: number) => lessons[courseId]?.length ? 1 : 0;
+  if (!token || !entries) return null;
 
   return (
     <Box>
       <Typography variant="h5" mb={3} fontWeight={600}>{t('myCourses') || 'Мои курсы'}</Typography>
-      {userCourses.length === 0 && (
+      {entries.length === 0 && (
         <Card sx={{ p: 3, mb: 2, borderRadius: 3, textAlign: 'center', color: 'text.secondary' }}>
           <Typography variant="body1">{t('noCourses') || 'Нет курсов'}</Typography>
         </Card>
       )}
       <Grid container spacing={3}>
-        {userCourses.map(course => (
+        {entries.map(({ course, lessons_count, completed_lessons }) => (
           <Grid key={course.id} size={{ xs: 12, sm: 6 }}>
             <Fade in timeout={500}>
               <Card sx={{
@@ -77,11 +62,11 @@ const MyCoursesBlock: React.FC = () => {
                 </Box>
                 <Box mb={1}>
                   <Typography variant="body2" color="text.secondary">
-                    {t('progress')}: {completedLessons(course.id)} / {lessons[course.id]?.length || 0}
+                    {t('progress')}: {completed_lessons} / {lessons_count}
                   </Typography>
                   <LinearProgress
                     variant="determinate"
-                    value={lessons[course.id]?.length ? (completedLessons(course.id) / lessons[course.id].length) * 100 : 0}
+                    value={lessons_count ? (completed_lessons / lessons_count) * 100 : 0}
                     sx={{ height: 8, borderRadius: 4, mt: 0.5 }}
                   />
                 </Box>
@@ -1,18 +1,34 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { getTestResults } from '../services/api';
+import { getTestResults, streamTestResults, TestResultAggregates } from '../services/api';
 import { Box, Typography, Paper, CircularProgress } from '@mui/material';
 
 const TestResultsPage: React.FC = () => {
   const { id } = useParams<{ id: string }>();
   const [results, setResults] = useState<any[]>([]);
+  const [aggregates, setAggregates] = useState<TestResultAggregates | null>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     if (!id) return;
+    let unsubscribe: (() => void) | undefined;
+    let cancelled = false;
     getTestResults(Number(id))
-      .then(res => setResults(res.data))
+      .then(res => {
+        if (cancelled) return;
+        setResults(res.data);
+        // Новые результаты приходят по SSE, начиная после последнего загруженного
+        const lastId = res.data.reduce((max: number, result: any) => Math.max(max, result.id), 0);
+        unsubscribe = streamTestResults(Number(id), {
+          onResult: result => setResults(prev => (prev.some(r => r.id === result.id) ? prev : [result, ...prev])),
+          onAggregates: setAggregates,
+        }, lastId);
+      })
       .finally(() => setLoading(false));
+    return () => {
+      cancelled = true;
+      unsubscribe?.();
+    };
   }, [id]);
 
   if (loading) return <Box display="flex" justifyContent="center" mt={6}><CircularProgress size={48} /></Box>;
@@ -20,6 +36,11 @@ const TestResultsPage: React.FC = () => {
   return (
     <Box maxWidth={700} mx="auto" mt={5}>
       <Typography variant="h4" fontWeight={700} mb={3}>Результаты теста</Typography>
+      {aggregates && aggregates.count > 0 && (
+        <Typography color="text.secondary" mb={2}>
+          Попыток: {aggregates.count} · Средний балл: {aggregates.avg} · Лучший: {aggregates.max}
+        </Typography>
+      )}
       {results.length === 0 ? (
         <Typography color="text.secondary">Нет попыток прохождения теста.</Typography>
       ) : (
@@ -37,4 +58,4 @@ const TestResultsPage: React.FC = () => {
   );
 };
 
-export default TestResultsPage; 
\ No newline at end of file
+export default TestResultsPage;
\ No newline at end of file
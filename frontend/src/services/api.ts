@@ -47,6 +47,8 @@ export interface Course {
   title: string;
   description: string;
   author: User;
+  lessons_count?: number;
+  tests_count?: number;
   created_at: string;
   updated_at: string;
 }
@@ -58,6 +60,8 @@ export interface Lesson {
   video?: string;
   order: number;
   sections: Section[];
+  sections_count?: number;
+  tests_count?: number;
   created_at: string;
   updated_at: string;
   content?: string; // Для обратной совместимости
@@ -67,6 +71,7 @@ export interface Section {
   id: number;
   title: string;
   content: string;
+  content_html?: string; // HTML, отрисованный на сервере
   video?: string;
   order: number;
 }
@@ -76,6 +81,9 @@ export interface Test {
   title: string;
   description: string;
   questions: Question[];
+  time_limit?: number | null;
+  questions_count?: number;
+  results_count?: number;
 }
 
 export interface Question {
@@ -107,6 +115,54 @@ export const getCourse = (id: number) => api.get<Course>(`/courses/${id}/`);
 export const createCourse = (data: Partial<Course>) => api.post<Course>('/courses/', data);
 export const updateCourse = (id: number, data: Partial<Course>) => api.put<Course>(`/courses/${id}/`, data);
 export const deleteCourse = (id: number) => api.delete(`/courses/${id}/`);
+export const enrollCourse = (id: number) => api.post(`/courses/${id}/enroll/`);
+export const unenrollCourse = (id: number) => api.delete(`/courses/${id}/enroll/`);
+
+export interface DashboardEntry {
+  course: Pick<Course, 'id' | 'title' | 'description'>;
+  enrolled_at: string;
+  lessons_count: number;
+  completed_lessons: number;
+  last_test_id: number | null;
+  last_score: number | null;
+  last_result_at: string | null;
+}
+
+export const getDashboard = () => api.get<DashboardEntry[]>('/courses/dashboard/');
+export interface Leaderboard {
+  total: number;
+  top: { rank: number; user: number; username: string; score: number }[];
+  me: { rank: number; score: number } | null;
+}
+
+export const getCourseLeaderboard = (courseId: number, limit = 10) =>
+  api.get<Leaderboard>(`/courses/${courseId}/leaderboard/`, { params: { limit } });
+export const getTestLeaderboard = (testId: number, limit = 10) =>
+  api.get<Leaderboard>(`/courses/api/tests/${testId}/leaderboard/`, { params: { limit } });
+export interface ReviewItem {
+  id: number;
+  question: Question;
+  test: number;
+  due_at: string;
+  interval: number;
+  repetitions: number;
+  lapses: number;
+  ease_factor: number;
+  last_reviewed_at: string | null;
+}
+
+export const getDueReviews = (limit = 20) => api.get<ReviewItem[]>('/courses/reviews/due/', { params: { limit } });
+export const reviewItem = (id: number, data: { answers?: number[]; quality?: number }) =>
+  api.post<ReviewItem>(`/courses/reviews/${id}/review/`, data);
+export const copyCourse = (id: number, title?: string) => api.post<Course>(`/courses/${id}/copy/`, { title });
+export const exportCourse = (id: number, media = false) =>
+  api.get<Blob>(`/courses/${id}/export/`, { params: { media: media ? 1 : 0 }, responseType: 'blob' });
+export const importCourse = (archive: File, title?: string) => {
+  const data = new FormData();
+  data.append('archive', archive);
+  if (title) data.append('title', title);
+  return api.post<Course>('/courses/import/', data);
+};
 
 export const getLessons = (courseId: number) => api.get<Lesson[]>(`/courses/${courseId}/lessons/`);
 export const getLesson = (courseId: number, lessonId: number) => api.get<Lesson>(`/courses/${courseId}/lessons/${lessonId}/`);
@@ -114,6 +170,8 @@ export const createLesson = (courseId: number, data: Partial<Lesson>) => api.pos
 export const updateLesson = (courseId: number, lessonId: number, data: Partial<Lesson>) =>
   api.put<Lesson>(`/courses/${courseId}/lessons/${lessonId}/`, data);
 export const deleteLesson = (courseId: number, lessonId: number) => api.delete(`/courses/${courseId}/lessons/${lessonId}/`);
+export const reorderLessons = (courseId: number, order: number[]) =>
+  api.post<{ updated: number }>(`/courses/${courseId}/lessons/reorder/`, { order });
 
 // Секции
 export const createSection = (courseId: number, lessonId: number, data: Partial<Section>) =>
@@ -122,6 +180,8 @@ export const updateSection = (courseId: number, lessonId: number, sectionId: num
   api.put<Section>(`/courses/${courseId}/lessons/${lessonId}/sections/${sectionId}/`, data);
 export const deleteSection = (courseId: number, lessonId: number, sectionId: number) =>
   api.delete(`/courses/${courseId}/lessons/${lessonId}/sections/${sectionId}/`);
+export const reorderSections = (courseId: number, lessonId: number, order: number[]) =>
+  api.post<{ updated: number }>(`/courses/${courseId}/lessons/${lessonId}/sections/reorder/`, { order });
 
 // Тесты
 export const getTests = (courseId: number, lessonId: number) => api.get<Test[]>(`/courses/${courseId}/lessons/${lessonId}/tests/`);
@@ -141,6 +201,29 @@ export const updateQuestion = (courseId: number, lessonId: number, testId: numbe
 export const deleteQuestion = (courseId: number, lessonId: number, testId: number, questionId: number) =>
   api.delete(`/courses/${courseId}/lessons/${lessonId}/tests/${testId}/questions/${questionId}/`);
 
+export interface QuestionBatch {
+  create?: { text: string; answers?: Omit<Answer, 'id'>[] }[];
+  // Ответы с id изменяются, без id создаются, не переданные удаляются
+  update?: { id: number; text: string; answers?: (Omit<Answer, 'id'> & { id?: number })[] }[];
+  delete?: number[];
+}
+
+export interface QuestionImportReport {
+  created: number;
+  error_count: number;
+  errors: { row: number; errors: Record<string, string[]> }[];
+}
+
+export const batchQuestions = (testId: number, batch: QuestionBatch) =>
+  api.post<{ created: number[]; updated: number; deleted: number }>(`/courses/api/tests/${testId}/questions/batch/`, batch);
+export const importQuestions = (testId: number, file: File, type?: 'csv' | 'gift' | 'xml', dryRun = false) => {
+  const data = new FormData();
+  data.append('file', file);
+  if (type) data.append('type', type);
+  if (dryRun) data.append('dry_run', '1');
+  return api.post<QuestionImportReport>(`/courses/api/tests/${testId}/questions/import/`, data);
+};
+
 // Ответы
 export const createAnswer = (courseId: number, lessonId: number, testId: number, questionId: number, data: Partial<Answer>) =>
   api.post<Answer>(`/courses/${courseId}/lessons/${lessonId}/tests/${testId}/questions/${questionId}/answers/`, data);
@@ -164,4 +247,111 @@ export const getTestById = (testId: number) => api.get<Test>(`/courses/api/tests
 
 export const submitTestResult = (testId: number, score: number, answers: any) => api.post(`/courses/api/tests/${testId}/submit/`, { score, answers });
 
-export const getTestResults = (testId: number) => api.get(`/courses/api/tests/${testId}/results/`); 
\ No newline at end of file
+// Без параметров - все результаты; until без since - за год до until
+export const getTestResults = (testId: number, period?: { since?: string; until?: string }) =>
+  api.get(`/courses/api/tests/${testId}/results/`, { params: period });
+
+export interface TestAttempt {
+  id: number;
+  test: number;
+  answers: Record<string, number[]>;
+  started_at: string;
+  expires_at: string | null;
+  saved_at: string | null;
+  finished_at: string | null;
+  result_id: number | null;
+}
+
+export const startTestAttempt = (testId: number) => api.post<TestAttempt>(`/courses/api/tests/${testId}/attempts/`);
+export const getTestAttempt = (attemptId: number) => api.get<TestAttempt>(`/courses/api/attempts/${attemptId}/`);
+export const saveAttemptAnswer = (attemptId: number, questionId: number, answers: number[]) =>
+  api.put(`/courses/api/attempts/${attemptId}/answers/${questionId}/`, { answers });
+export const finishTestAttempt = (attemptId: number) => api.post(`/courses/api/attempts/${attemptId}/finish/`);
+
+export interface TestResultEvent {
+  id: number;
+  user: number;
+  test: number;
+  score: number;
+  created_at: string;
+}
+
+export interface TestResultAggregates {
+  count: number;
+  avg: number | null;
+  max: number | null;
+}
+
+// Живая лента результатов (SSE). EventSource не умеет передавать заголовок
+// Authorization, поэтому поток читается через fetch и переподключается сам,
+// передавая id последнего полученного результата. Возвращает функцию отписки.
+export const streamTestResults = (
+  testId: number,
+  handlers: { onResult?: (result: TestResultEvent) => void; onAggregates?: (aggregates: TestResultAggregates) => void },
+  lastId?: number,
+) => {
+  const controller = new AbortController();
+  let lastEventId = lastId;
+
+  const dispatch = (block: string) => {
+    let event = 'message';
+    let data = '';
+    block.split('\n').forEach(line => {
+      if (line.startsWith('id: ')) lastEventId = Number(line.slice(4));
+      else if (line.startsWith('event: ')) event = line.slice(7);
+      else if (line.startsWith('data: ')) data += line.slice(6);
+    });
+    if (!data) return;
+    if (event === 'result') handlers.onResult?.(JSON.parse(data));
+    else if (event === 'aggregates') handlers.onAggregates?.(JSON.parse(data));
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const headers: Record<string, string> = { Accept: 'text/event-stream' };
+        const token = localStorage.getItem('token');
+        if (token) headers['Authorization'] = `Bearer ${token}`;
+        if (lastEventId !== undefined) headers['Last-Event-ID'] = String(lastEventId);
+        const response = await fetch(`${API_URL}/courses/api/tests/${testId}/results/stream/`, {
+          headers,
+          credentials: 'include',
+          signal: controller.signal,
+        });
+        if (!response.ok || !response.body) return;
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const blocks = buffer.split('\n\n');
+          buffer = blocks.pop() || '';
+          blocks.forEach(dispatch);
+        }
+      } catch (e) {
+        if (controller.signal.aborted) return;
+      }
+      await new Promise(resolve => setTimeout(resolve, 3000));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+};
+
+export const exportTestResults = (testId: number, output: 'csv' | 'jsonl' = 'csv', details = false) =>
+  api.get<Blob>(`/courses/api/tests/${testId}/results/export/`, { params: { output, details: details ? 1 : 0 }, responseType: 'blob' }); 
+export interface SearchResult {
+  type: 'course' | 'lesson' | 'section';
+  id: number;
+  course_id: number;
+  lesson_id: number | null;
+  title: string;
+  rank: number;
+  snippet: string;
+}
+
+export const searchContent = (q: string, type?: string, limit?: number) =>
+  api.get<{ query: string; results: SearchResult[] }>('/courses/search/', { params: { q, type, limit } });